@@ -1,7 +1,8 @@
 from sqlalchemy import (
     create_engine, Column, Integer, String, DateTime, ForeignKey,
-    Text, Boolean, Table, PrimaryKeyConstraint
+    Text, Boolean, Table, PrimaryKeyConstraint, Float, Date, LargeBinary, inspect
 )
+from sqlalchemy.sql import text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -44,6 +45,12 @@ class Room(Base):
         back_populates="room",
         cascade="all, delete-orphan"
     )
+    direct_pair = relationship(
+        "DirectRoom",
+        back_populates="room",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -85,6 +92,9 @@ class User(Base):
         cascade="all, delete-orphan"
     )
 
+    # Never reuse IDs after deletes, the registrations rollup reads users past its last ID
+    __table_args__ = {"sqlite_autoincrement": True}
+
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
@@ -96,6 +106,7 @@ class Message(Base):
     read = Column(Boolean, default=False)
     delivered_at = Column(DateTime, nullable=True)
     read_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True, index=True)  # Set on deleted messages (tombstones), content is blanked
     
     # Translation fields
     is_translated = Column(Boolean, default=False)
@@ -105,6 +116,62 @@ class Message(Base):
 
     room = relationship("Room", back_populates="messages")
     sender = relationship("User", back_populates="messages_sent")
+    audio_metadata = relationship(
+        "AudioMetadata",
+        back_populates="message",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
+    translations = relationship(
+        "MessageTranslation",
+        back_populates="message",
+        cascade="all, delete-orphan"
+    )
+
+    # Never reuse IDs after deletes, they are the sync cursor and the archive/rollup watermarks
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# Translations of a message, shared by every viewer who asks for the same language.
+# Kept apart from Message so translating never rewrites the message row itself.
+class MessageTranslation(Base):
+    __tablename__ = "message_translations"
+    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    lang = Column(String, nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    message = relationship("Message", back_populates="translations")
+
+    __table_args__ = (
+        PrimaryKeyConstraint('message_id', 'lang'),
+    )
+
+# Server-side metadata for voice messages, filled in by the audio processing stage
+class AudioMetadata(Base):
+    __tablename__ = "audio_metadata"
+    message_id = Column(Integer, ForeignKey("messages.id"), primary_key=True)
+    duration = Column(Float, nullable=True)           # Length in seconds
+    waveform = Column(Text, nullable=True)            # JSON array of peak levels (0-100)
+    transcoded_url = Column(String, nullable=True)    # Smaller Opus copy, if one was produced
+    original_size = Column(Integer, nullable=True)    # Bytes
+    transcoded_size = Column(Integer, nullable=True)  # Bytes
+    processed_at = Column(DateTime, default=datetime.utcnow)
+
+    message = relationship("Message", back_populates="audio_metadata")
+
+# Canonical pair -> room mapping for direct chats (user_low < user_high).
+# The primary key makes the pair unique, so two concurrent requests cannot both create a DM.
+class DirectRoom(Base):
+    __tablename__ = "direct_rooms"
+    user_low = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high = Column(Integer, ForeignKey("users.id"), nullable=False)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False, unique=True)
+
+    room = relationship("Room", back_populates="direct_pair")
+
+    __table_args__ = (
+        PrimaryKeyConstraint('user_low', 'user_high'),
+    )
 
 # If you still need group-specific metadata, map it onto Room
 class GroupChat(Base):
@@ -149,8 +216,209 @@ class BlockedUser(Base):
         PrimaryKeyConstraint('user_id', 'blocked_user_id'),
     )
 
+# Persistent tier of the translation cache, keyed by content hash and target language
+class TranslationCacheEntry(Base):
+    __tablename__ = "translation_cache"
+
+    text_hash = Column(String(64), nullable=False)   # sha256 of the source text
+    target_lang = Column(String, nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('text_hash', 'target_lang'),
+    )
+
+# Change feed for incremental sync: edits, deletes, read receipts, membership and profile changes.
+# Rows are visible to members of room_id, to user_id, or to contacts of subject_id.
+class SyncEvent(Base):
+    __tablename__ = "sync_events"
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    room_id = Column(Integer, nullable=True, index=True)
+    user_id = Column(Integer, nullable=True, index=True)     # Addressed to a single user
+    subject_id = Column(Integer, nullable=True, index=True)  # User whose profile changed
+    payload = Column(Text, nullable=False)                   # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # Never reuse IDs after purges, they are the sync cursor
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# Durable per-user log of WebSocket events, so clients can resume from their last sequence number
+class UserEvent(Base):
+    __tablename__ = "user_events"
+
+    user_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # The JSON frame as sent
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'seq'),
+    )
+
+# Last sequence number handed out per user (kept when old events are purged)
+class UserEventCounter(Base):
+    __tablename__ = "user_event_counters"
+
+    user_id = Column(Integer, primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
+
+# Per-room overrides of the global message retention and archival ages (None = use the global setting)
+class RoomRetentionPolicy(Base):
+    __tablename__ = "room_retention_policies"
+
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    retention_days = Column(Integer, nullable=True)      # Delete messages older than this, 0 = keep forever
+    archive_after_days = Column(Integer, nullable=True)  # Move messages older than this to cold storage, 0 = never
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # Direct chats: a change one member asked for, applied once the other member asks for the same
+    proposed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    proposed_retention_days = Column(Integer, nullable=True)
+    proposed_archive_after_days = Column(Integer, nullable=True)
+
+# Compressed file holding a contiguous run of a room's oldest messages, moved out of the messages table
+class MessageArchiveSegment(Base):
+    __tablename__ = "message_archive_segments"
+
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, nullable=False, index=True)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    oldest_at = Column(DateTime, nullable=False)
+    newest_at = Column(DateTime, nullable=False)
+    path = Column(String, nullable=False)  # Relative to the archive directory
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Background deletion of a room's messages, a whole room or a user, done in small batches
+class DeletionJob(Base):
+    __tablename__ = "deletion_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)        # "clear_room", "room" or "user"
+    target_id = Column(Integer, nullable=False)  # Room or user ID
+    watermark = Column(Integer, nullable=False, default=0)  # Highest message ID covered by a clear
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, running, done, failed
+    total = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    files_removed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    requested_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    lease_until = Column(DateTime, nullable=True)  # The worker running the job owns it until then
+
+# Rollups kept up to date by the stats aggregator, so the admin dashboard never scans messages or users.
+# Messages sent per room per hour (hour = timestamp truncated to the hour)
+class MessageHourlyRollup(Base):
+    __tablename__ = "rollup_messages_hourly"
+
+    room_id = Column(Integer, nullable=False)
+    hour = Column(DateTime, nullable=False, index=True)
+    message_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('room_id', 'hour'),
+    )
+
+# Messages sent per user per day; one row per user who sent anything that day
+class UserDailyRollup(Base):
+    __tablename__ = "rollup_user_daily"
+
+    day = Column(Date, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('day', 'user_id'),
+    )
+
+# Per-day totals: messages sent, distinct senders and registrations
+class DailyRollup(Base):
+    __tablename__ = "rollup_daily"
+
+    day = Column(Date, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)
+    registrations = Column(Integer, nullable=False, default=0)
+
+# How far each aggregator has read its source table
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Users active on a day as a bitmap (bit N set = user ID N was active), so DAU/WAU/MAU and
+# retention are popcounts over a few ORed/ANDed bitmaps instead of scans
+class DailyActiveSketch(Base):
+    __tablename__ = "daily_active_sketches"
+
+    day = Column(Date, primary_key=True)
+    bitmap = Column(LargeBinary, nullable=False)
+    user_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 Base.metadata.create_all(bind=engine)
 
+def missing_autoincrement(conn, table) -> bool:
+    """SQLite: whether `table` was created before its IDs became AUTOINCREMENT"""
+    created = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {"name": table.name}).scalar()
+    return created is not None and "AUTOINCREMENT" not in created.upper()
+
+def upgrade_schema(bind=engine):
+    """Add columns introduced after a table was first created (create_all only creates missing tables)"""
+    message_columns = {column["name"] for column in inspect(bind).get_columns("messages")}
+    job_columns = {column["name"] for column in inspect(bind).get_columns("deletion_jobs")}
+    policy_columns = {column["name"] for column in inspect(bind).get_columns("room_retention_policies")}
+    with bind.begin() as conn:
+        if "deleted_at" not in message_columns:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN deleted_at TIMESTAMP"))
+        if "lease_until" not in job_columns:
+            conn.execute(text("ALTER TABLE deletion_jobs ADD COLUMN lease_until TIMESTAMP"))
+        for column in ("proposed_by", "proposed_retention_days", "proposed_archive_after_days"):
+            if column not in policy_columns:
+                conn.execute(text(f"ALTER TABLE room_retention_policies ADD COLUMN {column} INTEGER"))
+        if bind.dialect.name == "sqlite":
+            for table in (Message.__table__, User.__table__):
+                if missing_autoincrement(conn, table):
+                    print(f"Warning: {table.name} IDs can be reused after deletes; run migrate_autoincrement.py")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_messages_deleted_at ON messages (deleted_at)"))
+        # Admin user list filters
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_country ON users (country)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_registration_date ON users (registration_date)"))
+
+upgrade_schema()
+
+def upsert(db, model, rows, keys, update=()):
+    """
+    INSERT rows into model's table in one statement; rows whose keys already exist get the
+    update columns overwritten, or are skipped when there are none (SQLite and PostgreSQL)
+    """
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(model.__table__)
+    if update:
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_={column: statement.excluded[column] for column in update}
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=keys)
+    db.execute(statement, rows)
+
 @contextmanager
 def get_db():
     """Dependency to provide a database session."""
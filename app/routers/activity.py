@@ -0,0 +1,123 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Set
+import threading
+import os
+
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, DailyActiveSketch
+
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))  # seconds
+
+def to_bitmap(user_ids: Set[int]) -> int:
+    bitmap = 0
+    for user_id in user_ids:
+        bitmap |= 1 << user_id
+    return bitmap
+
+def encode_bitmap(bitmap: int) -> bytes:
+    return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+def decode_bitmap(data: bytes) -> int:
+    return int.from_bytes(data, "little") if data else 0
+
+class ActivityTracker:
+    """
+    Records which users were active on each day
+
+    Recording only adds the user ID to an in-memory set; the sets are merged
+    into the per-day bitmaps in the database by a periodic flush.
+    """
+
+    def __init__(self):
+        self.pending: Dict[date, Set[int]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, user_id: int):
+        """Mark a user active today (WebSocket connects and message sends)"""
+        today = datetime.utcnow().date()
+        with self.lock:
+            self.pending.setdefault(today, set()).add(user_id)
+
+    def flush(self):
+        """OR the pending user IDs into the stored bitmaps"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        db = SessionLocal()
+        try:
+            for day, user_ids in pending.items():
+                row = db.query(DailyActiveSketch).filter(DailyActiveSketch.day == day).first()
+                bitmap = to_bitmap(user_ids)
+                if row is None:
+                    row = DailyActiveSketch(day=day)
+                    db.add(row)
+                else:
+                    bitmap |= decode_bitmap(row.bitmap)
+                row.bitmap = encode_bitmap(bitmap)
+                row.user_count = bitmap.bit_count()
+                row.updated_at = datetime.utcnow()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the IDs back so the next flush retries them
+            with self.lock:
+                for day, user_ids in pending.items():
+                    self.pending.setdefault(day, set()).update(user_ids)
+            raise
+        finally:
+            db.close()
+
+    def day_bitmaps(self, db: Session, start: date, end: date) -> Dict[date, int]:
+        """Bitmaps of every day in [start, end], including activity not flushed yet"""
+        bitmaps = {
+            row.day: decode_bitmap(row.bitmap)
+            for row in db.query(DailyActiveSketch).filter(
+                DailyActiveSketch.day >= start,
+                DailyActiveSketch.day <= end
+            ).all()
+        }
+        with self.lock:
+            for day, user_ids in self.pending.items():
+                if start <= day <= end:
+                    bitmaps[day] = bitmaps.get(day, 0) | to_bitmap(user_ids)
+        return bitmaps
+
+    def active_users(self, db: Session, start: date, end: date) -> int:
+        """Distinct users active at any point between start and end (inclusive)"""
+        combined = 0
+        for bitmap in self.day_bitmaps(db, start, end).values():
+            combined |= bitmap
+        return combined.bit_count()
+
+    def daily_counts(self, db: Session, start: date, end: date) -> Dict[date, int]:
+        """DAU for each day between start and end"""
+        bitmaps = self.day_bitmaps(db, start, end)
+        counts = {}
+        day = start
+        while day <= end:
+            counts[day] = bitmaps.get(day, 0).bit_count()
+            day += timedelta(days=1)
+        return counts
+
+    def retention(self, db: Session, cohort_day: date, days: int) -> List[dict]:
+        """Share of the users active on cohort_day who were active again 1..days days later"""
+        bitmaps = self.day_bitmaps(db, cohort_day, cohort_day + timedelta(days=days))
+        cohort = bitmaps.get(cohort_day, 0)
+        cohort_size = cohort.bit_count()
+        result = []
+        for offset in range(1, days + 1):
+            returning = (cohort & bitmaps.get(cohort_day + timedelta(days=offset), 0)).bit_count()
+            result.append({
+                "day": offset,
+                "users": returning,
+                "rate": round(returning / cohort_size, 3) if cohort_size else 0.0
+            })
+        return result
+
+# Shared instance fed by the chat WebSocket and the message endpoints
+activity_tracker = ActivityTracker()
+
+register_periodic_task("flush_activity", ACTIVITY_FLUSH_INTERVAL, activity_tracker.flush)
@@ -1,10 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func, distinct, and_, desc, extract, inspect
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
+from typing import Optional
 import calendar
 
-from ..database import SessionLocal, User, Message, Room, room_members, GroupMember, BlockedUser
+from ..database import (
+    SessionLocal, User, Message, Room, room_members, GroupMember, BlockedUser, DirectRoom, DeletionJob,
+    MessageHourlyRollup, UserDailyRollup, DailyRollup
+)
+from .direct_rooms import forget_user
+from .deletion_jobs import enqueue_deletion, serialize_job
+from .auth import get_password_hash
+from .stats_rollups import refresh_rollups
+from .activity import activity_tracker
+from .presence import presence_service
+from .contact_graph import contact_graph
+from .stats_cache import stats_cache, cached_stats
+from .user_listing import (
+    UserFilters, ordered, validate_sort, sort_key, encode_cursor, decode_cursor, count_users, invalidate_user_counts, iter_users_csv
+)
+from .session import get_current_user
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+import secrets
+import os
+
+# Unlocks the admin panel for a logged-in user's session; set it in production
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "shrek1234")
 
 # Define a proper dependency for database access
 def get_db():
@@ -14,55 +38,85 @@ def get_db():
     finally:
         db.close()
 
+def require_admin(request: Request, username: str = Depends(get_current_user)) -> str:
+    """Only sessions that unlocked the admin panel may use the admin API"""
+    if not request.session.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return username
+
+class AdminLoginRequest(BaseModel):
+    password: str
+
+# Unlocking the panel is the only admin route open to every logged-in user
+login_router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+)
+
+@login_router.post("/login")
+async def admin_login(
+    request: Request,
+    login: AdminLoginRequest,
+    username: str = Depends(get_current_user)
+):
+    """Unlock the admin API for the current session"""
+    if not secrets.compare_digest(login.password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Incorrect admin password")
+    request.session["is_admin"] = True
+    return {"success": True}
+
 router = APIRouter(
     prefix="/api/admin",
     tags=["admin"],
+    dependencies=[Depends(require_admin)],
 )
 
-@router.get("/stats/users")
-async def get_user_stats(db: Session = Depends(get_db)):
+@router.post("/stats/refresh")
+async def refresh_stats():
+    """
+    Bring the statistics rollups up to date now instead of waiting for the aggregator,
+    and drop the cached dashboard results
+    """
+    await run_in_threadpool(refresh_rollups)
+    stats_cache.invalidate()
+    return {"success": True}
+
+def compute_user_stats(db: Session) -> dict:
     """
-    Get user registration statistics
+    Get user registration statistics (from the daily rollups)
     """
     try:
         # Get current date for time-based queries
         now = datetime.utcnow()
-        today_start = datetime(now.year, now.month, now.day)
-        week_start = today_start - timedelta(days=today_start.weekday())
-        month_start = datetime(now.year, now.month, 1)
+        today = now.date()
+        week_start = today - timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
         
-        # Total users count
+        # Total users count (primary key count, no table scan of rows)
         total_users = db.query(func.count(User.id)).scalar()
         
-        # Get new users registered using registration_date
-        new_users_today = db.query(func.count(User.id)).filter(
-            User.registration_date >= today_start
-        ).scalar() or 0
-        
-        # New users registered this week
-        new_users_week = db.query(func.count(User.id)).filter(
-            User.registration_date >= week_start
-        ).scalar() or 0
+        # Registrations per day for the last 12 months, at most ~366 small rows
+        first_month = date(today.year, 1, 1) if today.month == 12 else date(today.year - 1, today.month + 1, 1)
+        registrations_by_day = dict(db.query(DailyRollup.day, DailyRollup.registrations).filter(
+            DailyRollup.day >= min(first_month, week_start)
+        ).all())
         
-        # New users registered this month
-        new_users_month = db.query(func.count(User.id)).filter(
-            User.registration_date >= month_start
-        ).scalar() or 0
+        new_users_today = registrations_by_day.get(today, 0)
+        new_users_week = sum(count for day, count in registrations_by_day.items() if day >= week_start)
+        new_users_month = sum(count for day, count in registrations_by_day.items() if day >= month_start)
         
         # Find most active user of the day
         most_active_user = db.query(
             User.id,
             User.username,
             User.avatar,
-            func.count(Message.id).label('message_count')
+            UserDailyRollup.message_count
         ).join(
-            Message, Message.sender_id == User.id
+            UserDailyRollup, UserDailyRollup.user_id == User.id
         ).filter(
-            Message.timestamp >= today_start
-        ).group_by(
-            User.id
+            UserDailyRollup.day == today
         ).order_by(
-            func.count(Message.id).desc()
+            UserDailyRollup.message_count.desc()
         ).first()
         
         # If we found an active user, format their data
@@ -83,51 +137,22 @@ async def get_user_stats(db: Session = Depends(get_db)):
             }
         
         # Monthly registration history for the chart (last 12 months)
-        monthly_registrations = []
-        
-        # Get current month and year
-        current_month = now.month
-        current_year = now.year
+        month_counts = {}
+        for day, count in registrations_by_day.items():
+            month_counts[(day.year, day.month)] = month_counts.get((day.year, day.month), 0) + count
         
-        # Get registration counts by month using registration_date for the last 12 months
-        for i in range(12):
-            # Calculate the month and year for this data point (going backward)
-            month_offset = i - 11  # -11, -10, -9, ... 0
-            target_month = current_month + month_offset
-            target_year = current_year
-            
-            # Adjust the year if the month wraps around
-            while target_month <= 0:
-                target_month += 12
-                target_year -= 1
-            while target_month > 12:
-                target_month -= 12
-                target_year += 1
-            
-            # Calculate the start and end of the month
-            month_start = datetime(target_year, target_month, 1)
-            
-            # Calculate the end of the month (1st day of next month)
-            if target_month == 12:
-                month_end = datetime(target_year + 1, 1, 1)
-            else:
-                month_end = datetime(target_year, target_month + 1, 1)
-            
-            # Count users registered in this specific month
-            month_count = db.query(func.count(User.id)).filter(
-                User.registration_date >= month_start,
-                User.registration_date < month_end
-            ).scalar() or 0
-            
-            # Create date object to get the month abbreviation
-            month_date = date(target_year, target_month, 1)
-            month_name = month_date.strftime("%b")
-            
+        monthly_registrations = []
+        target_year, target_month = first_month.year, first_month.month
+        for _ in range(12):
             monthly_registrations.append({
-                "month": month_name,
+                "month": date(target_year, target_month, 1).strftime("%b"),
                 "year": target_year,
-                "count": month_count
+                "count": month_counts.get((target_year, target_month), 0)
             })
+            target_month += 1
+            if target_month > 12:
+                target_month = 1
+                target_year += 1
         
         return {
             "success": True,
@@ -143,102 +168,66 @@ async def get_user_stats(db: Session = Depends(get_db)):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-@router.get("/stats/activity")
-async def get_activity_stats(db: Session = Depends(get_db)):
+@router.get("/stats/users")
+async def get_user_stats(response: Response):
+    return await cached_stats(response, "users", compute_user_stats)
+
+def compute_activity_stats(db: Session) -> dict:
     """
-    Get user activity statistics
+    Get user activity statistics (from the daily and hourly rollups)
     """
     try:
         # Current date for time-based queries
         now = datetime.utcnow()
+        today = now.date()
         today_start = datetime(now.year, now.month, now.day)
         
-        # Active users right now (online users) - This will work correctly
-        active_users_now = db.query(func.count(User.id)).filter(User.is_online == True).scalar()
-        
-        # Active users today (users who logged in today) - This should work if last_seen is updated
-        active_users_today = db.query(func.count(User.id)).filter(
-            User.last_seen >= today_start
-        ).scalar() or 0  # Default to 0 if None
+        # Active users right now (online users)
+        active_users_now = presence_service.online_count()
         
-        # Calculate average daily active users over the past week using actual login data
-        week_start = today_start - timedelta(days=7)
+        # Daily totals for this week and the 7 days before today
+        last_monday = today - timedelta(days=today.weekday())
+        daily = {
+            row.day: row
+            for row in db.query(DailyRollup).filter(
+                DailyRollup.day >= min(last_monday, today - timedelta(days=7))
+            ).all()
+        }
         
-        # For each of the past 7 days, count unique users who were active
-        daily_active_users = []
-        for i in range(7):
-            day_start = today_start - timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-            
-            # Count users who were seen on this day
-            day_active = db.query(func.count(distinct(User.id))).filter(
-                User.last_seen >= day_start,
-                User.last_seen < day_end
-            ).scalar() or 0
-            
-            daily_active_users.append(day_active)
+        # Real daily active users (connected or sent a message), from the activity sketches
+        dau = activity_tracker.daily_counts(db, min(last_monday, today - timedelta(days=7)), today)
+        active_users_today = dau[today]
+        wau = activity_tracker.active_users(db, today - timedelta(days=6), today)
+        mau = activity_tracker.active_users(db, today - timedelta(days=29), today)
         
-        # Calculate the average (exclude today if it's early in the day)
-        if len(daily_active_users) > 1:
-            avg_daily_active = round(sum(daily_active_users[1:]) / (len(daily_active_users) - 1), 1)
-        else:
-            avg_daily_active = daily_active_users[0] if daily_active_users else 0
+        # Average daily active users over the past week, excluding today
+        past_week = [today - timedelta(days=i) for i in range(1, 8)]
+        avg_daily_active = round(sum(dau[day] for day in past_week) / len(past_week), 1)
         
-        # Find peak activity hours based on message timestamps
-        week_start = today_start - timedelta(days=7)
-        hour_counts = db.query(
-            extract('hour', Message.timestamp).label('hour'),
-            func.count(Message.id).label('count')
-        ).filter(
-            Message.timestamp >= week_start
-        ).group_by(
-            extract('hour', Message.timestamp)
-        ).order_by(
-            func.count(Message.id).desc()
-        ).first()
+        # Find peak activity hour of day over the past week
+        hour_counts = {}
+        for hour, count in db.query(MessageHourlyRollup.hour, MessageHourlyRollup.message_count).filter(
+            MessageHourlyRollup.hour >= today_start - timedelta(days=7)
+        ).all():
+            hour_counts[hour.hour] = hour_counts.get(hour.hour, 0) + count
         
-        # If we have message data with timestamps, use it
         if hour_counts:
-            peak_hour = hour_counts.hour
-            peak_hour_formatted = f"{int(peak_hour)}:00 - {int(peak_hour)+1}:00"
+            peak_hour = max(hour_counts, key=hour_counts.get)
+            peak_hour_formatted = f"{peak_hour}:00 - {peak_hour + 1}:00"
         else:
             # Default to evening hours if no data
             peak_hour_formatted = "20:00 - 21:00"
         
-        # Get weekly activity pattern from actual messages
+        # Weekly activity pattern
         weekday_activity = []
         weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        
-        # Get the date for last Monday (start of the week)
-        last_monday = today_start - timedelta(days=today_start.weekday())
-        
         for i in range(7):
-            day_date = last_monday + timedelta(days=i)
-            day_end = day_date + timedelta(days=1)
-            
-            # Get actual message count for this day
-            message_count = db.query(func.count(Message.id)).filter(
-                Message.timestamp >= day_date,
-                Message.timestamp < day_end
-            ).scalar() or 0
-            
-            # Get unique active users for this day based on message sending
-            unique_active_users = db.query(func.count(distinct(Message.sender_id))).filter(
-                Message.timestamp >= day_date,
-                Message.timestamp < day_end
-            ).scalar() or 0
-            
-            # If we have no messages but have login data, use that
-            if unique_active_users == 0:
-                unique_active_users = db.query(func.count(distinct(User.id))).filter(
-                    User.last_seen >= day_date,
-                    User.last_seen < day_end
-                ).scalar() or 0
-            
+            day = last_monday + timedelta(days=i)
+            row = daily.get(day)
             weekday_activity.append({
                 "day": weekdays[i],
-                "active_users": unique_active_users,
-                "message_count": message_count
+                "active_users": dau.get(day, 0),
+                "message_count": row.message_count if row else 0
             })
         
         return {
@@ -246,6 +235,8 @@ async def get_activity_stats(db: Session = Depends(get_db)):
             "data": {
                 "active_users_now": active_users_now,
                 "active_users_today": active_users_today,
+                "weekly_active_users": wau,
+                "monthly_active_users": mau,
                 "avg_daily_active": avg_daily_active,
                 "peak_activity_time": peak_hour_formatted,
                 "weekday_activity": weekday_activity
@@ -253,40 +244,64 @@ async def get_activity_stats(db: Session = Depends(get_db)):
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
-        
 
-@router.get("/stats/messages")
-async def get_message_stats(db: Session = Depends(get_db)):
+@router.get("/stats/activity")
+async def get_activity_stats(response: Response):
+    return await cached_stats(response, "activity", compute_activity_stats)
+
+def compute_retention_stats(db: Session, cohort: date, days: int) -> dict:
+    """
+    Share of the users active on the cohort day who came back on each of the following days
+    """
+    try:
+        bitmaps = activity_tracker.day_bitmaps(db, cohort, cohort)
+        return {
+            "success": True,
+            "data": {
+                "cohort": cohort.isoformat(),
+                "cohort_size": bitmaps.get(cohort, 0).bit_count(),
+                "retention": activity_tracker.retention(db, cohort, days)
+            }
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@router.get("/stats/retention")
+async def get_retention_stats(response: Response, cohort: Optional[date] = None, days: int = 7):
+    """
+    Retention of a cohort (default: the users active `days` days ago)
+    """
+    days = max(1, min(days, 90))
+    cohort = cohort or datetime.utcnow().date() - timedelta(days=days)
+    return await cached_stats(
+        response,
+        f"retention:{cohort.isoformat()}:{days}",
+        lambda db: compute_retention_stats(db, cohort, days)
+    )
+
+def compute_message_stats(db: Session) -> dict:
     """
-    Get message statistics
+    Get message statistics (from the daily and hourly rollups)
     """
     try:
         # Current date for time-based queries
-        now = datetime.utcnow()
-        today_start = datetime(now.year, now.month, now.day)
-        
-        # Total messages - This will work correctly if we have message data
-        total_messages = db.query(func.count(Message.id)).scalar() or 0
+        today = datetime.utcnow().date()
         
-        # Messages sent today - This will work correctly if message timestamps exist
-        messages_today = db.query(func.count(Message.id)).filter(
-            Message.timestamp >= today_start
-        ).scalar() or 0
+        # Every message ever sent, including ones since archived or deleted
+        total_messages = db.query(func.coalesce(func.sum(DailyRollup.message_count), 0)).scalar() or 0
         
-        # Calculate average messages per day based on past week
-        week_start = today_start - timedelta(days=7)
-        messages_past_week = db.query(func.count(Message.id)).filter(
-            Message.timestamp >= week_start
-        ).scalar() or 0
+        daily_counts = dict(db.query(DailyRollup.day, DailyRollup.message_count).filter(
+            DailyRollup.day >= today - timedelta(days=7)
+        ).all())
+        messages_today = daily_counts.get(today, 0)
+        messages_past_week = sum(daily_counts.values())
         
         # Calculate the average daily messages over the past week
-        # If we have data for the past week, use that; otherwise, use today's data or a fallback
         if messages_past_week > 0:
             avg_messages_per_day = int(round(messages_past_week / 7))
         elif messages_today > 0:
             avg_messages_per_day = int(messages_today)
         else:
-            # Fallback if no message data at all
             avg_messages_per_day = 0
         
         # Find most active chat based on message count
@@ -294,13 +309,13 @@ async def get_message_stats(db: Session = Depends(get_db)):
             Room.id,
             Room.name,
             Room.is_group,
-            func.count(Message.id).label('message_count')
+            func.sum(MessageHourlyRollup.message_count).label('message_count')
         ).join(
-            Message, Message.room_id == Room.id
+            MessageHourlyRollup, MessageHourlyRollup.room_id == Room.id
         ).group_by(
             Room.id
         ).order_by(
-            func.count(Message.id).desc()
+            func.sum(MessageHourlyRollup.message_count).desc()
         ).first()
         
         # Format most active chat name
@@ -319,17 +334,14 @@ async def get_message_stats(db: Session = Depends(get_db)):
         else:
             most_active_chat_name = "No active chats"
         
-        # Get the most recent activity dates from the messages table
-        # We'll get the 24 most recent time slots with messages
+        # The 24 most recent hours that had messages
         recent_activity = db.query(
-            func.date(Message.timestamp).label('date'), 
-            func.strftime('%H', Message.timestamp).label('hour'),
-            func.count(Message.id).label('count')
+            MessageHourlyRollup.hour,
+            func.sum(MessageHourlyRollup.message_count).label('count')
         ).group_by(
-            'date', 'hour'
+            MessageHourlyRollup.hour
         ).order_by(
-            func.date(Message.timestamp).desc(),
-            func.strftime('%H', Message.timestamp)
+            MessageHourlyRollup.hour.desc()
         ).limit(24).all()
         
         # Create hourly distribution for charting
@@ -338,9 +350,7 @@ async def get_message_stats(db: Session = Depends(get_db)):
         if recent_activity:
             for activity in recent_activity:
                 # Format as readable label showing both date and hour
-                date_obj = datetime.strptime(str(activity.date), '%Y-%m-%d')
-                month_day = date_obj.strftime('%b %d')
-                hour_label = f"{month_day} {int(activity.hour):02d}:00"
+                hour_label = f"{activity.hour.strftime('%b %d')} {activity.hour.hour:02d}:00"
                 
                 hourly_distribution.append({
                     "hour": hour_label,
@@ -370,32 +380,44 @@ async def get_message_stats(db: Session = Depends(get_db)):
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
-        
+
+@router.get("/stats/messages")
+async def get_message_stats(response: Response):
+    return await cached_stats(response, "messages", compute_message_stats)
 
 @router.get("/users/list")
 async def get_registered_users(
-    page: int = 1, 
-    limit: int = 10, 
-    search: str = None,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+    search: Optional[str] = None,
+    online: Optional[bool] = None,
+    country: Optional[str] = None,
+    registered_from: Optional[date] = None,
+    registered_to: Optional[date] = None,
+    sort: str = "registered",
+    order: str = "asc",
     db: Session = Depends(get_db)
 ):
     """
-    Get a paginated list of registered users
+    Get a list of registered users, one page at a time
+
+    Pages are fetched with the opaque `cursor` returned as `next_cursor`, which costs
+    the same however deep the page. `page` is still accepted for older clients.
+    Search matches any part of usernames and emails, case-insensitively.
     """
     try:
-        # Base query - always include registration_date as it exists in the database
-        query = db.query(User)
-        
-        # Apply search filter if provided
-        if search:
-            query = query.filter(User.username.ilike(f"%{search}%"))
-        
-        # Get total count for pagination
-        total_count = query.count()
-        
-        # Apply pagination
-        offset = (page - 1) * limit
-        users = query.order_by(User.id).offset(offset).limit(limit).all()
+        limit = max(1, min(limit, 100))
+        filters = UserFilters(search, online, country, registered_from, registered_to)
+        after = decode_cursor(cursor) if cursor else None
+        
+        query = ordered(filters.apply(db.query(User)), sort, order, after)
+        if page and not cursor:
+            query = query.offset((page - 1) * limit)
+        # One extra row tells whether there is a next page
+        users = query.limit(limit + 1).all()
+        has_more = len(users) > limit
+        users = users[:limit]
         
         # Format user data
         user_list = []
@@ -408,27 +430,54 @@ async def get_registered_users(
                 "username": user.username,
                 "email": user.email,
                 "avatar": user.avatar or "/static/images/shrek.jpg",
-                "is_online": user.is_online,
+                "is_online": presence_service.is_online(user.id),
                 "last_seen": user.last_seen.isoformat() if user.last_seen else None,
                 "registered_date": registration_date,
                 "country": user.country
             })
         
+        total_count = count_users(db, filters)
         return {
             "success": True,
             "data": {
                 "users": user_list,
                 "pagination": {
                     "total": total_count,
-                    "page": page,
                     "limit": limit,
-                    "pages": (total_count + limit - 1) // limit  # Ceiling division
+                    "page": page or 1,
+                    "pages": (total_count + limit - 1) // limit,  # Ceiling division
+                    "next_cursor": encode_cursor(sort_key(users[-1], sort)) if has_more else None
                 }
             }
         }
+    except HTTPException as e:
+        return {"success": False, "error": e.detail}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@router.get("/users/export.csv")
+async def export_users(
+    search: Optional[str] = None,
+    online: Optional[bool] = None,
+    country: Optional[str] = None,
+    registered_from: Optional[date] = None,
+    registered_to: Optional[date] = None,
+    sort: str = "registered",
+    order: str = "asc"
+):
+    """
+    Stream every user matching the list filters as CSV
+    """
+    filters = UserFilters(search, online, country, registered_from, registered_to)
+    # Bad parameters must fail before the response starts
+    validate_sort(sort, order)
+    filename = f"shrekchat-users-{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    return StreamingResponse(
+        (chunk.encode("utf-8") for chunk in iter_users_csv(filters, sort, order)),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
@@ -449,6 +498,9 @@ async def delete_user(
         # Store username for return message
         username = user.username
         
+        # Only cheap bookkeeping happens here; messages, attachments, rooms and
+        # finally the user row are deleted in batches by background jobs
+        
         # 1. Find all direct chat rooms where the user is a member
         direct_rooms = db.query(Room).filter(
             Room.is_group == False,
@@ -460,6 +512,7 @@ async def delete_user(
         ).all()
         
         # Delete direct chat room memberships first
+        job_ids = []
         for room in direct_rooms:
             # Delete memberships for both users in the direct chat
             db.execute(
@@ -467,8 +520,10 @@ async def delete_user(
                     room_members.c.room_id == room.id
                 )
             )
-            # Then delete the room itself
-            db.delete(room)
+            # Free the pair so a new chat is not mapped to the room being deleted
+            db.query(DirectRoom).filter(DirectRoom.room_id == room.id).delete(synchronize_session=False)
+            # Then queue the room itself, with its messages and archived history
+            job_ids.append(enqueue_deletion(db, "room", room.id).id)
         
         # 2. Delete group chat memberships separately
         db.execute(
@@ -489,16 +544,42 @@ async def delete_user(
         db.query(BlockedUser).filter(BlockedUser.user_id == user_id).delete()
         db.query(BlockedUser).filter(BlockedUser.blocked_user_id == user_id).delete()
         
-        # 5. Finally delete the user
-        db.delete(user)
+        # 5. Tombstone the user: free the username and email and make the account unusable
+        user.username = f"deleted-{user.id}"
+        user.email = f"deleted-{user.id}@deleted.invalid"
+        user.hashed_password = get_password_hash(secrets.token_urlsafe(32))
+        user.is_online = False
+        job_ids.append(enqueue_deletion(db, "user", user.id).id)
         db.commit()
         
+        # Direct room mappings went with the rooms, drop any cached ones
+        forget_user(user_id)
+        presence_service.forget(user_id)
+        for room in direct_rooms:
+            contact_graph.remove_room(room.id)
+        contact_graph.remove_user(user_id)
+        invalidate_user_counts()
+        
         return {
             "success": True,
-            "message": f"User {username} and all associated data has been deleted successfully"
+            "message": f"User {username} has been deleted, associated data is being removed in the background",
+            "job_ids": job_ids
         }
     except Exception as e:
         db.rollback()
         if isinstance(e, HTTPException):
             raise e
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+@router.get("/deletion-jobs/{job_id}")
+async def get_deletion_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Progress of a background deletion
+    """
+    job = db.query(DeletionJob).filter(DeletionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deletion job not found"
+        )
+    return serialize_job(job)
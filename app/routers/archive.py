@@ -0,0 +1,465 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+from cachetools import LRUCache
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import BaseModel
+import threading
+import time
+import gzip
+import json
+import os
+
+from app.routers.session import get_db, get_current_user
+from app.routers.background import register_periodic_task
+from app.routers.audio_processing import serialize_audio_metadata
+from app.routers.attachments import attachment_refs, remove_files, message_files
+from app.database import (
+    SessionLocal, User, Room, Message, AudioMetadata, MessageTranslation,
+    RoomRetentionPolicy, MessageArchiveSegment, room_members
+)
+
+# Messages older than MESSAGE_ARCHIVE_AFTER_DAYS leave the messages table for gzip JSONL
+# segments; messages older than MESSAGE_RETENTION_DAYS are deleted (0 disables either one)
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "./data/archive")  # /app/data is the Docker volume
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", "0"))
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", "0"))
+MESSAGE_ARCHIVE_SEGMENT_SIZE = int(os.getenv("MESSAGE_ARCHIVE_SEGMENT_SIZE", "1000"))  # messages per file
+MESSAGE_ARCHIVE_MAX_BATCHES = int(os.getenv("MESSAGE_ARCHIVE_MAX_BATCHES", "200"))     # per compaction run
+MESSAGE_ARCHIVE_CACHE_SEGMENTS = int(os.getenv("MESSAGE_ARCHIVE_CACHE_SEGMENTS", "64"))
+MESSAGE_ARCHIVE_INTERVAL = int(os.getenv("MESSAGE_ARCHIVE_INTERVAL", "3600"))  # seconds
+MESSAGE_RETENTION_BATCH = int(os.getenv("MESSAGE_RETENTION_BATCH", "500"))  # messages deleted per transaction
+
+# Files no segment row points to are removed once they are this old
+ORPHAN_GRACE_SECONDS = 3600
+
+router = APIRouter(prefix="/api")
+
+# Decoded segments, keyed by (segment ID, path) so a rewritten tail segment is never served stale
+segment_cache = LRUCache(maxsize=MESSAGE_ARCHIVE_CACHE_SEGMENTS)
+segment_cache_lock = threading.Lock()
+
+class RetentionPolicyRequest(BaseModel):
+    retention_days: Optional[int] = None
+    archive_after_days: Optional[int] = None
+
+def serialize_archived_message(message: Message, audio: Optional[AudioMetadata]) -> dict:
+    """Snapshot of a message as stored in an archive segment"""
+    record = {
+        "id": message.id,
+        "content": message.content,
+        "sender_id": message.sender_id,
+        "timestamp": message.timestamp.isoformat(),
+        "time": message.timestamp.strftime("%H:%M"),
+        "delivered": message.delivered,
+        "read": message.read,
+        "is_translated": message.is_translated,
+        "original_content": message.original_content,
+        "translated_to": message.translated_to
+    }
+    if audio is not None:
+        record["audio"] = serialize_audio_metadata(audio)
+    return record
+
+def write_segment(room_id: int, records: List[dict]) -> str:
+    """Write records to a new segment file and return its path relative to the archive directory"""
+    relative_path = os.path.join(
+        "rooms", str(room_id), f"{records[0]['id']}-{records[-1]['id']}-{int(time.time())}.jsonl.gz"
+    )
+    full_path = os.path.join(MESSAGE_ARCHIVE_DIR, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    # Written under a temporary name so a crash never leaves a truncated segment behind
+    tmp_path = full_path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+    os.replace(tmp_path, full_path)
+    return relative_path
+
+def read_segment(segment: MessageArchiveSegment) -> List[dict]:
+    """Records of a segment in message ID order"""
+    key = (segment.id, segment.path)
+    with segment_cache_lock:
+        records = segment_cache.get(key)
+    if records is not None:
+        return records
+
+    with gzip.open(os.path.join(MESSAGE_ARCHIVE_DIR, segment.path), "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    with segment_cache_lock:
+        segment_cache[key] = records
+    return records
+
+def iter_archived_records(db: Session, room_id: int) -> Iterator[dict]:
+    """All archived records of a room in ID order, read one line at a time and without caching"""
+    segments = db.query(MessageArchiveSegment.path).filter(
+        MessageArchiveSegment.room_id == room_id
+    ).order_by(MessageArchiveSegment.first_message_id).all()
+
+    for segment in segments:
+        try:
+            with gzip.open(os.path.join(MESSAGE_ARCHIVE_DIR, segment.path), "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except OSError as e:
+            print(f"Error reading archive segment {segment.path}: {e}")
+
+def load_archived_messages(db: Session, room_id: int, before_id: Optional[int], limit: int,
+                           after_id: int = 0) -> List[dict]:
+    """
+    Archived messages of a room with an ID below before_id (and above after_id), newest first
+
+    Only messages older than everything still in the messages table are archived,
+    so history paging simply continues here once the table runs out.
+    """
+    query = db.query(MessageArchiveSegment).filter(MessageArchiveSegment.room_id == room_id)
+    if before_id:
+        query = query.filter(MessageArchiveSegment.first_message_id < before_id)
+    if after_id:
+        query = query.filter(MessageArchiveSegment.last_message_id > after_id)
+
+    result = []
+    for segment in query.order_by(MessageArchiveSegment.last_message_id.desc()).all():
+        try:
+            records = read_segment(segment)
+        except OSError as e:
+            print(f"Error reading archive segment {segment.path}: {e}")
+            continue
+        for record in reversed(records):
+            if before_id and record["id"] >= before_id:
+                continue
+            if record["id"] <= after_id:
+                return result
+            result.append(record)
+            if len(result) >= limit:
+                return result
+    return result
+
+def delete_messages(db: Session, message_ids: List[int]):
+    """Delete messages together with the rows that hang off them, without committing"""
+    for start in range(0, len(message_ids), 500):
+        chunk = message_ids[start:start + 500]
+        db.query(AudioMetadata).filter(AudioMetadata.message_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(MessageTranslation).filter(MessageTranslation.message_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(Message).filter(Message.id.in_(chunk)).delete(synchronize_session=False)
+
+def archive_room_batch(db: Session, room_id: int, cutoff: datetime) -> int:
+    """
+    Move up to one segment's worth of a room's messages older than cutoff into cold storage
+
+    A room's last segment is topped up until it is full, so hourly runs do not
+    leave a trail of tiny files behind.
+
+    Returns:
+        Number of messages archived
+    """
+    # Never archive past the first message that is still hot, so archived IDs stay below hot ones
+    boundary = db.query(func.min(Message.id)).filter(
+        Message.room_id == room_id,
+        Message.timestamp >= cutoff
+    ).scalar()
+
+    tail = db.query(MessageArchiveSegment).filter(
+        MessageArchiveSegment.room_id == room_id
+    ).order_by(MessageArchiveSegment.last_message_id.desc()).first()
+    if tail is not None and tail.message_count >= MESSAGE_ARCHIVE_SEGMENT_SIZE:
+        tail = None
+
+    query = db.query(Message).filter(Message.room_id == room_id, Message.timestamp < cutoff)
+    if boundary is not None:
+        query = query.filter(Message.id < boundary)
+    capacity = MESSAGE_ARCHIVE_SEGMENT_SIZE - (tail.message_count if tail is not None else 0)
+    messages = query.order_by(Message.id).limit(capacity).all()
+    if not messages:
+        return 0
+
+    message_ids = [message.id for message in messages]
+    # Tombstones are dropped rather than archived
+    live_messages = [message for message in messages if message.deleted_at is None]
+    audio_by_message_id = {
+        row.message_id: row
+        for row in db.query(AudioMetadata).filter(AudioMetadata.message_id.in_(message_ids)).all()
+    }
+    records = [serialize_archived_message(message, audio_by_message_id.get(message.id)) for message in live_messages]
+    if not records:
+        delete_messages(db, message_ids)
+        db.commit()
+        return len(messages)
+    if tail is not None:
+        records = read_segment(tail) + records
+
+    path = write_segment(room_id, records)
+    try:
+        if tail is None:
+            tail = MessageArchiveSegment(room_id=room_id, first_message_id=records[0]["id"])
+            db.add(tail)
+        tail.last_message_id = records[-1]["id"]
+        tail.message_count = len(records)
+        tail.oldest_at = datetime.fromisoformat(records[0]["timestamp"])
+        tail.newest_at = datetime.fromisoformat(records[-1]["timestamp"])
+        tail.path = path
+        tail.size_bytes = os.path.getsize(os.path.join(MESSAGE_ARCHIVE_DIR, path))
+        tail.created_at = datetime.utcnow()
+
+        delete_messages(db, message_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(os.path.join(MESSAGE_ARCHIVE_DIR, path))
+        raise
+    return len(messages)
+
+def segment_files(segment: MessageArchiveSegment) -> Set[str]:
+    """Upload URLs referenced by a segment's records, including voice messages (empty if unreadable)"""
+    try:
+        records = read_segment(segment)
+    except OSError:
+        return set()
+    urls = {url for record in records for url, _ in attachment_refs(record["content"])}
+    urls.update(record["audio"]["url"] for record in records if (record.get("audio") or {}).get("url"))
+    return urls
+
+def expire_messages(db: Session, query) -> int:
+    """Delete the (id, content) rows matched by query in batches, then the files they referenced"""
+    deleted = 0
+    for _ in range(MESSAGE_ARCHIVE_MAX_BATCHES):
+        messages = query.order_by(Message.id).limit(MESSAGE_RETENTION_BATCH).all()
+        if not messages:
+            break
+        urls = message_files(db, messages)
+        delete_messages(db, [message_id for message_id, _ in messages])
+        db.commit()
+
+        # Files go only once the rows referencing them are gone
+        remove_files(urls)
+        deleted += len(messages)
+    return deleted
+
+def expire_segments(db: Session, query) -> int:
+    """Drop the archive segments matched by query one at a time, with their files"""
+    deleted = 0
+    for segment in query.all():
+        urls = segment_files(segment)
+        path = segment.path
+        deleted += segment.message_count
+        db.delete(segment)
+        db.commit()
+
+        remove_files(urls)
+        try:
+            os.remove(os.path.join(MESSAGE_ARCHIVE_DIR, path))
+        except OSError:
+            pass
+    return deleted
+
+def apply_retention(db: Session, policies: Dict[int, RoomRetentionPolicy], now: datetime) -> int:
+    """Delete hot messages and whole archive segments that are past their room's retention age"""
+    overridden = [room_id for room_id, policy in policies.items() if policy.retention_days is not None]
+    cutoffs = [
+        (room_id, now - timedelta(days=policy.retention_days))
+        for room_id, policy in policies.items() if policy.retention_days
+    ]
+
+    deleted = 0
+    if MESSAGE_RETENTION_DAYS > 0:
+        global_cutoff = now - timedelta(days=MESSAGE_RETENTION_DAYS)
+        query = db.query(Message.id, Message.content).filter(Message.timestamp < global_cutoff)
+        segments = db.query(MessageArchiveSegment).filter(MessageArchiveSegment.newest_at < global_cutoff)
+        if overridden:
+            query = query.filter(Message.room_id.notin_(overridden))
+            segments = segments.filter(MessageArchiveSegment.room_id.notin_(overridden))
+        deleted += expire_messages(db, query) + expire_segments(db, segments)
+
+    for room_id, cutoff in cutoffs:
+        query = db.query(Message.id, Message.content).filter(
+            Message.room_id == room_id,
+            Message.timestamp < cutoff
+        )
+        segments = db.query(MessageArchiveSegment).filter(
+            MessageArchiveSegment.room_id == room_id,
+            MessageArchiveSegment.newest_at < cutoff
+        )
+        deleted += expire_messages(db, query) + expire_segments(db, segments)
+
+    return deleted
+
+def sweep_orphan_segments(db: Session) -> int:
+    """Remove segment files that no row points to any more (rewritten, expired or dropped)"""
+    rooms_dir = os.path.join(MESSAGE_ARCHIVE_DIR, "rooms")
+    if not os.path.isdir(rooms_dir):
+        return 0
+
+    referenced = {os.path.normpath(row.path) for row in db.query(MessageArchiveSegment.path).all()}
+    removed = 0
+    for dirpath, _, filenames in os.walk(rooms_dir):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            relative_path = os.path.normpath(os.path.relpath(full_path, MESSAGE_ARCHIVE_DIR))
+            if relative_path in referenced:
+                continue
+            try:
+                if time.time() - os.path.getmtime(full_path) > ORPHAN_GRACE_SECONDS:
+                    os.remove(full_path)
+                    removed += 1
+            except OSError as e:
+                print(f"Error removing archive file {full_path}: {e}")
+    return removed
+
+def compact_messages():
+    """Background job: apply retention, archive aged messages and clean up unused segment files"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        policies = {policy.room_id: policy for policy in db.query(RoomRetentionPolicy).all()}
+
+        deleted = apply_retention(db, policies, now)
+
+        # Archive age per room: its own policy if it has one, else the global setting
+        ages = {room_id: policy.archive_after_days for room_id, policy in policies.items()
+                if policy.archive_after_days is not None}
+        candidate_ages = [age for age in list(ages.values()) + [MESSAGE_ARCHIVE_AFTER_DAYS] if age > 0]
+
+        archived = 0
+        if candidate_ages:
+            earliest_cutoff = now - timedelta(days=min(candidate_ages))
+            room_ids = [row.room_id for row in db.query(Message.room_id).filter(
+                Message.timestamp < earliest_cutoff
+            ).distinct().all()]
+
+            batches = 0
+            for room_id in room_ids:
+                age = ages.get(room_id, MESSAGE_ARCHIVE_AFTER_DAYS)
+                if age <= 0:
+                    continue
+                cutoff = now - timedelta(days=age)
+                while batches < MESSAGE_ARCHIVE_MAX_BATCHES:
+                    count = archive_room_batch(db, room_id, cutoff)
+                    batches += 1
+                    archived += count
+                    if count == 0:
+                        break
+
+        removed = sweep_orphan_segments(db)
+        if deleted or archived or removed:
+            print(f"Message compaction: {archived} archived, {deleted} expired, {removed} old segment files removed")
+    finally:
+        db.close()
+
+register_periodic_task("compact_messages", MESSAGE_ARCHIVE_INTERVAL, compact_messages)
+
+def get_managed_room(db: Session, room_id: int, username: str) -> Tuple[Room, User]:
+    """
+    Room whose retention the user may manage, with the user
+
+    Admins manage a group; in a direct chat each member may propose a change,
+    which set_retention_policy only applies once both agree.
+    """
+    current_user = db.query(User).filter(User.username == username).first()
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
+
+    membership = db.query(room_members).filter(
+        and_(
+            room_members.c.room_id == room_id,
+            room_members.c.user_id == current_user.id
+        )
+    ).first()
+    if membership is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have access to this room")
+    if room.is_group and not membership.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can change retention in group chats"
+        )
+    return room, current_user
+
+def serialize_policy(room_id: int, policy: Optional[RoomRetentionPolicy], db: Session) -> dict:
+    archived = db.query(
+        func.count(MessageArchiveSegment.id),
+        func.coalesce(func.sum(MessageArchiveSegment.message_count), 0)
+    ).filter(MessageArchiveSegment.room_id == room_id).first()
+    return {
+        "room_id": room_id,
+        "retention_days": policy.retention_days if policy else None,
+        "archive_after_days": policy.archive_after_days if policy else None,
+        "default_retention_days": MESSAGE_RETENTION_DAYS,
+        "default_archive_after_days": MESSAGE_ARCHIVE_AFTER_DAYS,
+        "archived_segments": archived[0],
+        "archived_messages": archived[1],
+        "proposal": {
+            "proposed_by": policy.proposed_by,
+            "retention_days": policy.proposed_retention_days,
+            "archive_after_days": policy.proposed_archive_after_days
+        } if policy and policy.proposed_by is not None else None
+    }
+
+# Retention settings of a room
+@router.get("/rooms/{room_id}/retention")
+async def get_retention_policy(
+    room_id: int,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    get_managed_room(db, room_id, username)
+    policy = db.query(RoomRetentionPolicy).filter(RoomRetentionPolicy.room_id == room_id).first()
+    return serialize_policy(room_id, policy, db)
+
+@router.put("/rooms/{room_id}/retention")
+async def set_retention_policy(
+    room_id: int,
+    request: RetentionPolicyRequest,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Override the global retention/archive ages for a room (null falls back to the global setting)
+
+    In a direct chat the change deletes the other member's history too, so it is only
+    stored as a proposal until the other member asks for the same values.
+    """
+    room, current_user = get_managed_room(db, room_id, username)
+
+    for value in (request.retention_days, request.archive_after_days):
+        if value is not None and value < 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Days must be 0 or more")
+
+    policy = db.query(RoomRetentionPolicy).filter(RoomRetentionPolicy.room_id == room_id).first()
+    if not room.is_group:
+        requested = (request.retention_days, request.archive_after_days)
+        agreed = policy is not None and policy.proposed_by not in (None, current_user.id) and (
+            policy.proposed_retention_days, policy.proposed_archive_after_days
+        ) == requested
+        if not agreed:
+            if policy is None:
+                policy = RoomRetentionPolicy(room_id=room_id)
+                db.add(policy)
+            policy.proposed_by = current_user.id
+            policy.proposed_retention_days, policy.proposed_archive_after_days = requested
+            db.commit()
+            return serialize_policy(room_id, policy, db)
+        policy.proposed_by = None
+        policy.proposed_retention_days = policy.proposed_archive_after_days = None
+
+    if request.retention_days is None and request.archive_after_days is None:
+        if policy is not None:
+            db.delete(policy)
+            db.commit()
+        return serialize_policy(room_id, None, db)
+
+    if policy is None:
+        policy = RoomRetentionPolicy(room_id=room_id)
+        db.add(policy)
+    policy.retention_days = request.retention_days
+    policy.archive_after_days = request.archive_after_days
+    policy.updated_at = datetime.utcnow()
+    db.commit()
+    return serialize_policy(room_id, policy, db)
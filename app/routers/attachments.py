@@ -0,0 +1,52 @@
+from sqlalchemy.orm import Session
+from pathlib import Path
+from typing import List, Optional, Set
+import re
+
+from app.database import AudioMetadata
+
+# Uploaded files are served from app/static/uploads and referenced from message content
+# as <img-attachment src='/static/uploads/...' filename='...'> and similar tags
+UPLOADS_DIR = Path("app/static/uploads")
+ATTACHMENT_PATTERN = re.compile(r"<(?:img|video|audio|doc)-attachment src='(/static/uploads/[^']+)' filename='([^']*)'>")
+
+def attachment_refs(content: str) -> List[tuple]:
+    """(url, original filename) of every attachment referenced by a message"""
+    if not content or "-attachment" not in content:
+        return []
+    return ATTACHMENT_PATTERN.findall(content)
+
+def attachment_path(url: str) -> Optional[Path]:
+    """Local file behind an attachment URL, or None if it points outside the uploads directory"""
+    if not url.startswith("/static/uploads/"):
+        return None
+    path = (UPLOADS_DIR / url[len("/static/uploads/"):]).resolve()
+    if UPLOADS_DIR.resolve() not in path.parents:
+        return None
+    return path
+
+def remove_files(paths: Set[str]) -> int:
+    """Delete the local files behind attachment URLs; returns how many were removed"""
+    removed = 0
+    for url in paths:
+        path = attachment_path(url)
+        if path is None:
+            continue
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing attachment {path}: {e}")
+    return removed
+
+def message_files(db: Session, messages: List[tuple]) -> Set[str]:
+    """Upload URLs referenced by (id, content) rows, including transcoded voice messages"""
+    urls = {url for _, content in messages for url, _ in attachment_refs(content)}
+    transcoded = db.query(AudioMetadata.transcoded_url).filter(
+        AudioMetadata.message_id.in_([message_id for message_id, _ in messages]),
+        AudioMetadata.transcoded_url.isnot(None)
+    ).all()
+    urls.update(row.transcoded_url for row in transcoded)
+    return urls
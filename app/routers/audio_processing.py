@@ -0,0 +1,222 @@
+from datetime import datetime
+from pathlib import Path
+from array import array
+from typing import List, Optional
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+
+from app.database import SessionLocal, User, Message, AudioMetadata, room_members
+from app.routers.session import active_connections
+
+# ffmpeg/ffprobe are optional - without them voice messages are stored as uploaded
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+# Number of peaks in the downsampled waveform sent to clients
+AUDIO_WAVEFORM_POINTS = int(os.getenv("AUDIO_WAVEFORM_POINTS", "64"))
+# Sample rate used when decoding audio for waveform extraction
+AUDIO_WAVEFORM_SAMPLE_RATE = 8000
+# Transcode voice messages to a smaller Opus file ("true"/"false")
+AUDIO_TRANSCODE = os.getenv("AUDIO_TRANSCODE", "true").lower() == "true"
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+# Give up on a single ffmpeg/ffprobe run after this many seconds
+AUDIO_PROCESS_TIMEOUT = int(os.getenv("AUDIO_PROCESS_TIMEOUT", "60"))
+
+def ffmpeg_available() -> bool:
+    """Check whether ffmpeg and ffprobe can be found on this machine"""
+    return shutil.which(FFMPEG_BIN) is not None and shutil.which(FFPROBE_BIN) is not None
+
+def probe_duration(file_path: Path) -> Optional[float]:
+    """Read the duration of an audio file in seconds using ffprobe"""
+    result = subprocess.run(
+        [
+            FFPROBE_BIN, "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "json",
+            str(file_path)
+        ],
+        capture_output=True,
+        timeout=AUDIO_PROCESS_TIMEOUT
+    )
+    if result.returncode != 0:
+        return None
+
+    try:
+        duration = json.loads(result.stdout)["format"]["duration"]
+        return round(float(duration), 2)
+    except (KeyError, ValueError, TypeError):
+        # Browser-recorded webm often has no duration in the container header
+        return None
+
+def compute_waveform(file_path: Path, points: int = AUDIO_WAVEFORM_POINTS):
+    """
+    Decode audio to mono PCM and downsample it to a list of peak levels
+
+    Returns:
+        Tuple of (peaks scaled to 0-100, duration in seconds from the decoded samples)
+    """
+    result = subprocess.run(
+        [
+            FFMPEG_BIN, "-v", "error",
+            "-i", str(file_path),
+            "-ac", "1",
+            "-ar", str(AUDIO_WAVEFORM_SAMPLE_RATE),
+            "-f", "s16le",
+            "-"
+        ],
+        capture_output=True,
+        timeout=AUDIO_PROCESS_TIMEOUT
+    )
+    if result.returncode != 0:
+        return [], None
+
+    samples = array("h")
+    samples.frombytes(result.stdout[:len(result.stdout) - len(result.stdout) % 2])
+    if not samples:
+        return [], 0.0
+
+    duration = round(len(samples) / AUDIO_WAVEFORM_SAMPLE_RATE, 2)
+
+    # Take the peak of each bucket so short loud syllables stay visible
+    bucket_size = max(1, len(samples) // points)
+    peaks: List[int] = []
+    for start in range(0, len(samples), bucket_size):
+        bucket = samples[start:start + bucket_size]
+        peaks.append(max(max(bucket), -min(bucket)))
+        if len(peaks) == points:
+            break
+
+    loudest = max(peaks) or 1
+    return [round(peak * 100 / loudest) for peak in peaks], duration
+
+def transcode_to_opus(file_path: Path) -> Optional[Path]:
+    """Transcode an audio file to a mono Opus file next to the original"""
+    target_path = file_path.with_suffix(".ogg")
+    result = subprocess.run(
+        [
+            FFMPEG_BIN, "-v", "error", "-y",
+            "-i", str(file_path),
+            "-ac", "1",
+            "-c:a", "libopus",
+            "-b:a", AUDIO_OPUS_BITRATE,
+            "-application", "voip",
+            str(target_path)
+        ],
+        capture_output=True,
+        timeout=AUDIO_PROCESS_TIMEOUT
+    )
+    if result.returncode != 0 or not target_path.exists():
+        return None
+    return target_path
+
+def process_audio_file(file_path: Path) -> dict:
+    """Extract duration and waveform and optionally transcode an audio file (blocking)"""
+    waveform, decoded_duration = compute_waveform(file_path)
+    duration = probe_duration(file_path) or decoded_duration
+
+    result = {
+        "duration": duration,
+        "waveform": waveform,
+        "original_size": file_path.stat().st_size,
+        "transcoded_path": None,
+        "transcoded_size": None
+    }
+
+    if AUDIO_TRANSCODE:
+        transcoded_path = transcode_to_opus(file_path)
+        if transcoded_path:
+            transcoded_size = transcoded_path.stat().st_size
+            # Only keep the transcoded copy if it actually saves bytes
+            if transcoded_size < result["original_size"]:
+                result["transcoded_path"] = transcoded_path
+                result["transcoded_size"] = transcoded_size
+            else:
+                transcoded_path.unlink(missing_ok=True)
+
+    return result
+
+def serialize_audio_metadata(metadata: AudioMetadata, fallback_url: str = None) -> dict:
+    """Format audio metadata for API and WebSocket responses"""
+    return {
+        "duration": metadata.duration,
+        "waveform": json.loads(metadata.waveform) if metadata.waveform else [],
+        "url": metadata.transcoded_url or fallback_url,
+        "size": metadata.transcoded_size or metadata.original_size
+    }
+
+async def process_audio_message(message_id: int, file_path: str, file_url: str):
+    """
+    Background stage for voice messages: extract metadata, store it with the
+    message and let room members know it is available
+
+    Args:
+        message_id: ID of the message holding the audio attachment
+        file_path: Path of the uploaded file on disk
+        file_url: Public URL of the uploaded file
+    """
+    if not ffmpeg_available():
+        print("Skipping audio processing: ffmpeg/ffprobe not found")
+        return
+
+    try:
+        # ffmpeg runs in a worker thread so the event loop keeps serving sockets
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, process_audio_file, Path(file_path))
+    except Exception as e:
+        print(f"Error processing audio message {message_id}: {str(e)}")
+        return
+
+    transcoded_url = None
+    if result["transcoded_path"]:
+        transcoded_url = file_url.rsplit("/", 1)[0] + "/" + result["transcoded_path"].name
+
+    db = SessionLocal()
+    try:
+        message = db.query(Message).filter(Message.id == message_id).first()
+        if not message:
+            # Message was deleted while we were processing it
+            if result["transcoded_path"]:
+                result["transcoded_path"].unlink(missing_ok=True)
+            return
+
+        metadata = AudioMetadata(
+            message_id=message_id,
+            duration=result["duration"],
+            waveform=json.dumps(result["waveform"]),
+            transcoded_url=transcoded_url,
+            original_size=result["original_size"],
+            transcoded_size=result["transcoded_size"],
+            processed_at=datetime.utcnow()
+        )
+        db.merge(metadata)
+        db.commit()
+
+        notification = {
+            "type": "audio_processed",
+            "message_id": message_id,
+            "room_id": message.room_id,
+            "audio": serialize_audio_metadata(metadata, file_url)
+        }
+
+        # Let every online member of the room (including the sender) update the player
+        members = db.query(User.username).join(
+            room_members, User.id == room_members.c.user_id
+        ).filter(
+            room_members.c.room_id == message.room_id
+        ).all()
+
+        for (member_username,) in members:
+            if member_username in active_connections:
+                for ws in active_connections[member_username]:
+                    try:
+                        await ws.send_json(notification)
+                    except Exception as e:
+                        print(f"Error sending audio_processed notification: {e}")
+    except Exception as e:
+        db.rollback()
+        print(f"Error saving audio metadata for message {message_id}: {str(e)}")
+    finally:
+        db.close()
@@ -15,6 +15,8 @@ from app.database import SessionLocal, User, get_db, BlockedUser
 from app.routers.session import get_current_user_from_session as get_current_user
 from sqlalchemy.orm import Session
 from app.routers.session import manager
+from app.routers.sync import record_event
+from app.routers.presence import presence_service
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")  # In production, use a secure key
@@ -143,18 +145,8 @@ async def login(request: Request, username: str = Form(...), password: str = For
     # Generate WebSocket token using the manager
     ws_token = manager.create_token(user.username, user.id)
     
-    # Update user's online status
-    db = SessionLocal()
-    try:
-        db_user = db.query(User).filter(User.username == user.username).first()
-        if db_user:
-            db_user.is_online = True
-            db_user.last_seen = datetime.utcnow()
-            db.commit()
-    except:
-        db.rollback()
-    finally:
-        db.close()
+    # The user goes online with their first socket; until then just record the login
+    presence_service.seen(user.id, user.username)
     
     # Store tokens and user data in session
     request.session["access_token"] = access_token
@@ -200,20 +192,9 @@ async def register(request: Request, username: str = Form(...), email: str = For
 
 @router.get("/logout")
 async def logout(request: Request):
-    # Update user's online status to offline
-    if "username" in request.session:
-        db = SessionLocal()
-        try:
-            username = request.session["username"]
-            user = db.query(User).filter(User.username == username).first()
-            if user:
-                user.is_online = False
-                user.last_seen = datetime.utcnow()
-                db.commit()
-        except:
-            db.rollback()
-        finally:
-            db.close()
+    # Record the logout; the user goes offline once their last socket closes
+    if "username" in request.session and "user_id" in request.session:
+        presence_service.seen(request.session["user_id"], request.session["username"])
     
     # Clear session
     request.session.clear()
@@ -432,6 +413,13 @@ async def update_profile(
         if bio is not None:
             user.bio = bio
 
+        record_event(db, "profile_updated", {
+            "username": user.username,
+            "full_name": user.full_name,
+            "avatar": user.avatar,
+            "bio": user.bio
+        }, subject_id=user.id)
+
         # Save changes
         db.commit()
 
@@ -539,6 +527,12 @@ async def upload_avatar(request: Request, file: UploadFile = File(...)):
         
         # Update user in database
         user.avatar = avatar_path
+        record_event(db, "profile_updated", {
+            "username": user.username,
+            "full_name": user.full_name,
+            "avatar": user.avatar,
+            "bio": user.bio
+        }, subject_id=user.id)
         db.commit()
         
         print(f"Avatar updated successfully for user {user.id} at path {avatar_path}")
@@ -0,0 +1,41 @@
+from typing import Callable, List, Tuple
+import asyncio
+
+# Maintenance jobs run by the application for its whole lifetime: (name, interval seconds, function)
+periodic_tasks: List[Tuple[str, float, Callable]] = []
+running_tasks: List[asyncio.Task] = []
+
+def register_periodic_task(name: str, interval: float, func: Callable):
+    """
+    Run func every `interval` seconds once the application has started
+
+    Plain functions run in the default executor so database work does not block
+    the event loop; coroutine functions are awaited directly.
+    """
+    periodic_tasks.append((name, interval, func))
+
+async def _run_periodic(name: str, interval: float, func: Callable):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if asyncio.iscoroutinefunction(func):
+                await func()
+            else:
+                await loop.run_in_executor(None, func)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in periodic task {name}: {e}")
+
+def start_periodic_tasks():
+    """Start every registered task (called on application startup)"""
+    for name, interval, func in periodic_tasks:
+        running_tasks.append(asyncio.create_task(_run_periodic(name, interval, func)))
+
+async def stop_periodic_tasks():
+    """Cancel running tasks (called on application shutdown)"""
+    for task in running_tasks:
+        task.cancel()
+    await asyncio.gather(*running_tasks, return_exceptions=True)
+    running_tasks.clear()
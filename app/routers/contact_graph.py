@@ -0,0 +1,146 @@
+from sqlalchemy import select
+from typing import Dict, Iterable, Set
+import threading
+import os
+
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, Room, room_members
+
+# Full reload from room_members, which also repairs any update a code path missed
+CONTACT_GRAPH_REBUILD_INTERVAL = int(os.getenv("CONTACT_GRAPH_REBUILD_INTERVAL", "600"))  # seconds
+
+class ContactGraph:
+    """
+    Who shares a room with whom, kept in memory
+
+    Each user maps to their co-members with the number of rooms they share, once
+    over direct chats only (presence) and once over all rooms (profile updates), so
+    fan-out is a dictionary lookup. Loaded on first use; the places that change
+    room_members update it after committing.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.room_users: Dict[int, Set[int]] = {}
+        self.room_is_group: Dict[int, bool] = {}
+        self.contacts_all: Dict[int, Dict[int, int]] = {}
+        self.contacts_direct: Dict[int, Dict[int, int]] = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def _link(self, room_id: int, user_id: int, is_group: bool):
+        members = self.room_users.setdefault(room_id, set())
+        if user_id in members:
+            return
+        self.room_is_group[room_id] = is_group
+        for other in members:
+            for graph in (self.contacts_all,) if is_group else (self.contacts_all, self.contacts_direct):
+                for a, b in ((user_id, other), (other, user_id)):
+                    contacts = graph.setdefault(a, {})
+                    contacts[b] = contacts.get(b, 0) + 1
+        members.add(user_id)
+
+    def _unlink(self, room_id: int, user_id: int):
+        members = self.room_users.get(room_id)
+        if not members or user_id not in members:
+            return
+        members.discard(user_id)
+        is_group = self.room_is_group.get(room_id, True)
+        for other in members:
+            for graph in (self.contacts_all,) if is_group else (self.contacts_all, self.contacts_direct):
+                for a, b in ((user_id, other), (other, user_id)):
+                    contacts = graph.get(a)
+                    if contacts is None or b not in contacts:
+                        continue
+                    contacts[b] -= 1
+                    if contacts[b] <= 0:
+                        del contacts[b]
+                    if not contacts:
+                        del graph[a]
+        if not members:
+            self.room_users.pop(room_id, None)
+            self.room_is_group.pop(room_id, None)
+
+    def rebuild(self):
+        """Reload the whole graph from room_members"""
+        with self.lock:
+            version = self.version
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(room_members.c.room_id, room_members.c.user_id, Room.is_group).join(
+                    Room, Room.id == room_members.c.room_id
+                )
+            ).all()
+        finally:
+            db.close()
+
+        fresh = ContactGraph()
+        for room_id, user_id, is_group in rows:
+            fresh._link(room_id, user_id, bool(is_group))
+        with self.lock:
+            # A change committed while the rows were read could be missing from them; keep the live graph
+            if self.loaded and self.version != version:
+                return
+            self.room_users = fresh.room_users
+            self.room_is_group = fresh.room_is_group
+            self.contacts_all = fresh.contacts_all
+            self.contacts_direct = fresh.contacts_direct
+            self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.rebuild()
+
+    def add_members(self, room_id: int, user_ids: Iterable[int], is_group: bool):
+        """Record users joining a room (call after the commit)"""
+        if not self.loaded:
+            return  # The first lookup loads the committed state
+        with self.lock:
+            self.version += 1
+            for user_id in user_ids:
+                self._link(room_id, user_id, is_group)
+
+    def remove_member(self, room_id: int, user_id: int):
+        if not self.loaded:
+            return
+        with self.lock:
+            self.version += 1
+            self._unlink(room_id, user_id)
+
+    def remove_room(self, room_id: int):
+        if not self.loaded:
+            return
+        with self.lock:
+            self.version += 1
+            for user_id in list(self.room_users.get(room_id, ())):
+                self._unlink(room_id, user_id)
+
+    def remove_user(self, user_id: int):
+        """Drop a user from every room (account deletion)"""
+        if not self.loaded:
+            return
+        with self.lock:
+            self.version += 1
+            for room_id in [room_id for room_id, members in self.room_users.items() if user_id in members]:
+                self._unlink(room_id, user_id)
+
+    def contacts(self, user_id: int, direct_only: bool = False) -> Set[int]:
+        """Users sharing a room with user_id (only direct chats if direct_only)"""
+        self.ensure_loaded()
+        with self.lock:
+            graph = self.contacts_direct if direct_only else self.contacts_all
+            return set(graph.get(user_id, ()))
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "rooms": len(self.room_users),
+                "users": len(self.contacts_all),
+                "edges": sum(len(contacts) for contacts in self.contacts_all.values()) // 2
+            }
+
+# Shared instance for presence and profile fan-out
+contact_graph = ContactGraph()
+
+register_periodic_task("rebuild_contact_graph", CONTACT_GRAPH_REBUILD_INTERVAL, contact_graph.rebuild)
@@ -0,0 +1,342 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, not_
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+import threading
+import time
+import os
+
+from app.routers.session import get_db, get_current_user
+from app.routers.background import register_periodic_task
+from app.routers.attachments import remove_files, message_files
+from app.routers.archive import MESSAGE_ARCHIVE_DIR, segment_files, delete_messages
+from app.database import (
+    SessionLocal, User, Room, Message, DeletionJob, DirectRoom, GroupChat, GroupMember, BlockedUser,
+    MessageArchiveSegment, RoomRetentionPolicy, SyncEvent, UserEvent, UserEventCounter, UserDailyRollup,
+    room_members
+)
+
+# Stands in for the watermark of rooms removed outright: everything in them is hidden and deleted
+WHOLE_ROOM = 2 ** 62
+
+# Rows deleted per transaction, and the pause between batches that lets other writers in
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "500"))
+DELETION_BATCH_PAUSE = float(os.getenv("DELETION_BATCH_PAUSE", "0.05"))  # seconds
+DELETION_POLL_INTERVAL = float(os.getenv("DELETION_POLL_INTERVAL", "2"))  # seconds
+DELETION_RETRY_DELAY = int(os.getenv("DELETION_RETRY_DELAY", "300"))  # seconds before a failed job is retried
+# A running job whose worker stopped renewing its lease for this long is taken over by another worker
+DELETION_LEASE = int(os.getenv("DELETION_LEASE", "300"))  # seconds
+
+router = APIRouter(prefix="/api")
+
+# Tombstones for deletions not done yet, so the data disappears as soon as it is requested:
+# room ID -> highest message ID being removed, and users whose messages are being removed.
+# They mirror the unfinished DeletionJob rows and are reloaded periodically, so every worker
+# hides the same data. The job runner thread updates them, hence the lock.
+hidden_rooms: Dict[int, int] = {}
+hidden_senders: Set[int] = set()
+tombstone_lock = threading.Lock()
+
+def job_watermark(job: DeletionJob) -> int:
+    """Highest message ID a room job removes"""
+    return WHOLE_ROOM if job.kind == "room" else job.watermark
+
+def load_tombstones():
+    """Rebuild the tombstones from every job that is not done, failed ones included (they are retried)"""
+    db = SessionLocal()
+    try:
+        jobs = db.query(DeletionJob.kind, DeletionJob.target_id, DeletionJob.watermark).filter(
+            DeletionJob.status != "done"
+        ).all()
+    finally:
+        db.close()
+
+    rooms: Dict[int, int] = {}
+    senders: Set[int] = set()
+    for job in jobs:
+        if job.kind == "user":
+            senders.add(job.target_id)
+        else:
+            rooms[job.target_id] = max(rooms.get(job.target_id, 0), job_watermark(job))
+    with tombstone_lock:
+        hidden_rooms.clear()
+        hidden_rooms.update(rooms)
+        hidden_senders.clear()
+        hidden_senders.update(senders)
+
+def add_tombstone(job: DeletionJob):
+    with tombstone_lock:
+        if job.kind == "user":
+            hidden_senders.add(job.target_id)
+        else:
+            hidden_rooms[job.target_id] = max(hidden_rooms.get(job.target_id, 0), job_watermark(job))
+
+def tombstones() -> Tuple[Dict[int, int], FrozenSet[int]]:
+    """Snapshot of (hidden rooms, hidden senders) that is safe to iterate"""
+    with tombstone_lock:
+        return dict(hidden_rooms), frozenset(hidden_senders)
+
+def hidden_room_watermark(room_id: int) -> int:
+    """Highest hidden message ID of a room, 0 when none is"""
+    with tombstone_lock:
+        return hidden_rooms.get(room_id, 0)
+
+def hidden_sender_ids() -> FrozenSet[int]:
+    with tombstone_lock:
+        return frozenset(hidden_senders)
+
+def hidden_messages_filter(room_id: Optional[int] = None):
+    """Condition excluding messages whose deletion is in progress, or None when nothing is hidden"""
+    rooms, senders = tombstones()
+    conditions = []
+    for hidden_room_id, watermark in (rooms.items() if room_id is None else [(room_id, rooms.get(room_id))]):
+        if watermark:
+            conditions.append(and_(Message.room_id == hidden_room_id, Message.id <= watermark))
+    if senders:
+        conditions.append(Message.sender_id.in_(list(senders)))
+    if not conditions:
+        return None
+    return not_(or_(*conditions))
+
+def is_message_hidden(room_id: int, message_id: int, sender_id: int) -> bool:
+    with tombstone_lock:
+        return message_id <= hidden_rooms.get(room_id, 0) or sender_id in hidden_senders
+
+def enqueue_deletion(db: Session, kind: str, target_id: int, requested_by: Optional[str] = None) -> DeletionJob:
+    """
+    Queue a background deletion, without committing
+
+    kind is "clear_room" (a room's messages up to now), "room" (the room itself
+    as well) or "user" (a user's messages, then the user row).
+    """
+    watermark = 0
+    if kind != "user":
+        # Archived IDs are always below the hot ones, so this covers the archive as well
+        latest = db.query(Message.id).filter(Message.room_id == target_id).order_by(Message.id.desc()).first()
+        latest_archived = db.query(MessageArchiveSegment.last_message_id).filter(
+            MessageArchiveSegment.room_id == target_id
+        ).order_by(MessageArchiveSegment.last_message_id.desc()).first()
+        watermark = max(latest.id if latest else 0, latest_archived[0] if latest_archived else 0)
+
+    job = DeletionJob(
+        kind=kind,
+        target_id=target_id,
+        watermark=watermark,
+        status="pending",
+        requested_by=requested_by,
+        created_at=datetime.utcnow()
+    )
+    db.add(job)
+    db.flush()
+    add_tombstone(job)
+    return job
+
+def delete_archived(db: Session, job: DeletionJob) -> bool:
+    """Drop one of the room's archive segments covered by the job; False once there are none left"""
+    segment = db.query(MessageArchiveSegment).filter(
+        MessageArchiveSegment.room_id == job.target_id,
+        MessageArchiveSegment.last_message_id <= job_watermark(job)
+    ).first()
+    if segment is None:
+        return False
+
+    urls = segment_files(segment)
+    count = segment.message_count
+    path = segment.path
+
+    db.delete(segment)
+    job.deleted += count
+    db.commit()
+
+    job.files_removed += remove_files(urls)
+    try:
+        os.remove(os.path.join(MESSAGE_ARCHIVE_DIR, path))
+    except OSError:
+        pass
+    return True
+
+def delete_batch(db: Session, job: DeletionJob) -> bool:
+    """Delete one batch of the job's messages; False once there are none left"""
+    query = db.query(Message.id, Message.content)
+    if job.kind == "user":
+        query = query.filter(Message.sender_id == job.target_id)
+    else:
+        query = query.filter(Message.room_id == job.target_id, Message.id <= job_watermark(job))
+    messages = query.order_by(Message.id).limit(DELETION_BATCH_SIZE).all()
+    if not messages:
+        return False
+
+    urls = message_files(db, messages)
+    delete_messages(db, [message_id for message_id, _ in messages])
+    job.deleted += len(messages)
+    db.commit()
+
+    # Files go only once the rows referencing them are gone
+    job.files_removed += remove_files(urls)
+    return True
+
+def delete_room_rows(db: Session, room_id: int):
+    """Delete a room and every row that refers to it, without committing"""
+    # Bulk deletes skip the ORM cascades, so each dependent table is cleared explicitly
+    db.execute(room_members.delete().where(room_members.c.room_id == room_id))
+    db.query(DirectRoom).filter(DirectRoom.room_id == room_id).delete(synchronize_session=False)
+    db.query(GroupMember).filter(GroupMember.group_id == room_id).delete(synchronize_session=False)
+    db.query(GroupChat).filter(GroupChat.id == room_id).delete(synchronize_session=False)
+    db.query(RoomRetentionPolicy).filter(RoomRetentionPolicy.room_id == room_id).delete(synchronize_session=False)
+    db.query(SyncEvent).filter(SyncEvent.room_id == room_id).delete(synchronize_session=False)
+    db.query(Room).filter(Room.id == room_id).delete(synchronize_session=False)
+
+def delete_user_rows(db: Session, user_id: int):
+    """Delete a user and every row that refers to them, without committing"""
+    db.execute(room_members.delete().where(room_members.c.user_id == user_id))
+    db.query(DirectRoom).filter(
+        or_(DirectRoom.user_low == user_id, DirectRoom.user_high == user_id)
+    ).delete(synchronize_session=False)
+    db.query(GroupMember).filter(GroupMember.user_id == user_id).delete(synchronize_session=False)
+    db.query(RoomRetentionPolicy).filter(RoomRetentionPolicy.proposed_by == user_id).update({
+        "proposed_by": None, "proposed_retention_days": None, "proposed_archive_after_days": None
+    }, synchronize_session=False)
+    db.query(BlockedUser).filter(
+        or_(BlockedUser.user_id == user_id, BlockedUser.blocked_user_id == user_id)
+    ).delete(synchronize_session=False)
+    db.query(UserEvent).filter(UserEvent.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserEventCounter).filter(UserEventCounter.user_id == user_id).delete(synchronize_session=False)
+    db.query(SyncEvent).filter(
+        or_(SyncEvent.user_id == user_id, SyncEvent.subject_id == user_id)
+    ).delete(synchronize_session=False)
+    db.query(UserDailyRollup).filter(UserDailyRollup.user_id == user_id).delete(synchronize_session=False)
+    db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+
+def finish_job(db: Session, job: DeletionJob):
+    """Remove what is left once all messages are gone"""
+    if job.kind == "room":
+        delete_room_rows(db, job.target_id)
+    elif job.kind == "user":
+        delete_user_rows(db, job.target_id)
+    job.status = "done"
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+    # Lookups made while the job ran may have cached the pair again
+    from app.routers.direct_rooms import forget_room, forget_user  # direct_rooms -> sync -> this module
+    if job.kind == "room":
+        forget_room(job.target_id)
+    elif job.kind == "user":
+        forget_user(job.target_id)
+
+def claimable(now: datetime):
+    """Jobs no worker is running: new ones, failed ones due for a retry, and running ones whose lease ran out"""
+    return or_(
+        DeletionJob.status == "pending",
+        and_(DeletionJob.status == "failed", DeletionJob.finished_at < now - timedelta(seconds=DELETION_RETRY_DELAY)),
+        and_(
+            DeletionJob.status == "running",
+            or_(DeletionJob.lease_until.is_(None), DeletionJob.lease_until < now)
+        )
+    )
+
+def claim_job(db: Session, job_id: int) -> bool:
+    """
+    Take a job for this worker
+
+    The conditional UPDATE lets exactly one worker win when several see the same job.
+    """
+    now = datetime.utcnow()
+    claimed = db.query(DeletionJob).filter(DeletionJob.id == job_id, claimable(now)).update(
+        {"status": "running", "lease_until": now + timedelta(seconds=DELETION_LEASE)},
+        synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+def renew_lease(job: DeletionJob):
+    """Extend the lease; saved with the next batch"""
+    job.lease_until = datetime.utcnow() + timedelta(seconds=DELETION_LEASE)
+
+def run_deletion_jobs():
+    """Background job: work through queued deletions in small batches"""
+    db = SessionLocal()
+    try:
+        job_ids = [
+            job_id for (job_id,) in
+            db.query(DeletionJob.id).filter(claimable(datetime.utcnow())).order_by(DeletionJob.id).all()
+        ]
+        db.rollback()
+
+        for job_id in job_ids:
+            if not claim_job(db, job_id):
+                continue  # Another worker got it first
+            job = db.query(DeletionJob).filter(DeletionJob.id == job_id).one()
+            try:
+                if job.started_at is None:
+                    job.started_at = datetime.utcnow()
+                    job.total = job.deleted + (
+                        db.query(Message).filter(Message.sender_id == job.target_id).count() if job.kind == "user"
+                        else db.query(Message).filter(
+                            Message.room_id == job.target_id, Message.id <= job_watermark(job)
+                        ).count()
+                    )
+                    if job.kind != "user":
+                        for (count,) in db.query(MessageArchiveSegment.message_count).filter(
+                            MessageArchiveSegment.room_id == job.target_id,
+                            MessageArchiveSegment.last_message_id <= job_watermark(job)
+                        ).all():
+                            job.total += count
+                    db.commit()
+
+                renew_lease(job)
+                while job.kind != "user" and delete_archived(db, job):
+                    renew_lease(job)
+                    time.sleep(DELETION_BATCH_PAUSE)
+                while delete_batch(db, job):
+                    renew_lease(job)
+                    time.sleep(DELETION_BATCH_PAUSE)
+
+                finish_job(db, job)
+                # Another unfinished job may still cover the same room or user
+                load_tombstones()
+                print(f"Deletion job {job.id} ({job.kind} {job.target_id}) done: "
+                      f"{job.deleted} messages, {job.files_removed} files")
+            except Exception as e:
+                db.rollback()
+                job.status = "failed"
+                job.error = str(e)[:500]
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                print(f"Deletion job {job.id} failed: {e}")
+    finally:
+        db.close()
+
+load_tombstones()
+register_periodic_task("run_deletion_jobs", DELETION_POLL_INTERVAL, run_deletion_jobs)
+# Picks up jobs queued or finished by other workers
+register_periodic_task("refresh_tombstones", DELETION_POLL_INTERVAL, load_tombstones)
+
+def serialize_job(job: DeletionJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "target_id": job.target_id,
+        "status": job.status,
+        "total": job.total,
+        "deleted": job.deleted,
+        "files_removed": job.files_removed,
+        "progress": round(job.deleted / job.total, 3) if job.total else (1.0 if job.status == "done" else 0.0),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+# Progress of a deletion the current user requested
+@router.get("/deletion-jobs/{job_id}")
+async def get_deletion_job(
+    job_id: int,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(DeletionJob).filter(DeletionJob.id == job_id).first()
+    if not job or job.requested_by != username:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found")
+    return serialize_job(job)
@@ -0,0 +1,139 @@
+from sqlalchemy import update, bindparam, and_, tuple_
+from datetime import datetime
+from typing import Dict, List, Tuple
+import asyncio
+import os
+
+from app.routers.session import active_connections
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, User, Message, room_members
+
+# How often buffered acks are written, and the buffer size that forces an early write
+DELIVERY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "1.0"))  # seconds
+DELIVERY_MAX_PENDING = int(os.getenv("DELIVERY_MAX_PENDING", "5000"))
+
+class DeliveryTracker:
+    """
+    Buffers client delivery acks and writes them in bulk
+
+    Acks only touch memory; every flush validates the whole batch with two
+    queries, sets delivered/delivered_at with one executemany UPDATE and sends
+    each sender a single message_delivered frame per room.
+    """
+
+    def __init__(self):
+        # (message ID, acking user ID) -> time of the ack
+        self.pending: Dict[Tuple[int, int], datetime] = {}
+        self.lock = asyncio.Lock()
+        self.acks_received = 0
+        self.messages_marked = 0
+        self.flushes = 0
+
+    async def ack(self, user_id: int, message_ids: List[int]):
+        """Record that a recipient's socket received these messages"""
+        now = datetime.utcnow()
+        for message_id in message_ids:
+            if isinstance(message_id, int):
+                self.pending.setdefault((message_id, user_id), now)
+        self.acks_received += len(message_ids)
+
+        if len(self.pending) >= DELIVERY_MAX_PENDING:
+            await self.flush()
+
+    def _write(self, batch: Dict[Tuple[int, int], datetime]) -> Dict[Tuple[str, int], List[int]]:
+        """Persist a batch; returns newly delivered message IDs grouped by (sender username, room ID)"""
+        acks_by_message = {}
+        for (message_id, user_id), acked_at in batch.items():
+            acks_by_message.setdefault(message_id, []).append((user_id, acked_at))
+
+        db = SessionLocal()
+        try:
+            messages = db.query(Message.id, Message.sender_id, Message.room_id).filter(
+                Message.id.in_(list(acks_by_message.keys())),
+                Message.delivered_at.is_(None)
+            ).all()
+
+            # Acks only count from members of the message's room, and not from its sender
+            pairs = {
+                (room_id, user_id)
+                for message_id, _, room_id in messages
+                for user_id, _ in acks_by_message[message_id]
+            }
+            memberships = set()
+            if pairs:
+                memberships = set(db.query(room_members.c.room_id, room_members.c.user_id).filter(
+                    tuple_(room_members.c.room_id, room_members.c.user_id).in_(list(pairs))
+                ).all())
+
+            rows = []
+            delivered = {}
+            for message_id, sender_id, room_id in messages:
+                valid = [
+                    acked_at for user_id, acked_at in acks_by_message[message_id]
+                    if user_id != sender_id and (room_id, user_id) in memberships
+                ]
+                if not valid:
+                    continue
+                # In groups the first recipient to receive it marks the message delivered
+                rows.append({"message_id": message_id, "acked_at": min(valid)})
+                delivered.setdefault((sender_id, room_id), []).append(message_id)
+
+            if rows:
+                db.execute(
+                    update(Message.__table__).where(
+                        and_(
+                            Message.__table__.c.id == bindparam("message_id"),
+                            Message.__table__.c.delivered_at.is_(None)
+                        )
+                    ).values(delivered=True, delivered_at=bindparam("acked_at")),
+                    rows
+                )
+                db.commit()
+                self.messages_marked += len(rows)
+
+            # Resolve sender usernames for the notifications while the session is open
+            if delivered:
+                sender_ids = {sender_id for sender_id, _ in delivered}
+                usernames = dict(db.query(User.id, User.username).filter(User.id.in_(sender_ids)).all())
+                delivered = {
+                    (usernames.get(sender_id), room_id): message_ids
+                    for (sender_id, room_id), message_ids in delivered.items()
+                }
+            return delivered
+        finally:
+            db.close()
+
+    async def flush(self):
+        """Write buffered acks and tell online senders which messages were delivered"""
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            self.flushes += 1
+
+            loop = asyncio.get_running_loop()
+            delivered = await loop.run_in_executor(None, self._write, batch)
+
+        for (username, room_id), message_ids in delivered.items():
+            for ws in list(active_connections.get(username, ())):
+                try:
+                    await ws.send_json({
+                        "type": "message_delivered",
+                        "room_id": room_id,
+                        "message_ids": message_ids
+                    })
+                except Exception as e:
+                    print(f"Error sending delivery notification to {username}: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "acks_received": self.acks_received,
+            "messages_marked": self.messages_marked,
+            "flushes": self.flushes
+        }
+
+# Shared instance fed by the chat WebSocket
+delivery_tracker = DeliveryTracker()
+
+register_periodic_task("flush_delivery_acks", DELIVERY_FLUSH_INTERVAL, delivery_tracker.flush)
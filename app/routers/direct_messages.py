@@ -8,8 +8,19 @@ from datetime import datetime
 from pydantic import BaseModel
 
 from app.routers.session import get_db, get_current_user
-from app.database import User, Room, Message, room_members, GroupChat, BlockedUser
+from app.database import User, Room, Message, room_members, GroupChat, BlockedUser, AudioMetadata, MessageTranslation
 from app.routers.websockets import notify_new_room  # Import the new notification function
+from app.routers.audio_processing import serialize_audio_metadata
+from app.routers.user_search import search_user_ids
+from app.routers.direct_rooms import get_or_create_direct_room, get_direct_room_ids
+from app.routers.sync import record_event
+from app.routers.presence import presence_service
+from app.routers.event_log import deliver_event
+from app.routers.archive import load_archived_messages
+from app.routers.tombstones import soft_delete_message, serialize_tombstone
+from app.routers.deletion_jobs import (
+    enqueue_deletion, hidden_messages_filter, hidden_room_watermark, hidden_sender_ids, is_message_hidden, remove_files
+)
 
 # Add Pydantic model for request validation
 class DirectMessageRequest(BaseModel):
@@ -40,7 +51,8 @@ async def get_rooms(username: str = Depends(get_current_user), db: Session = Dep
     for room in rooms:
         # Get latest message in the room
         latest_message = db.query(Message).filter(
-            Message.room_id == room.id
+            Message.room_id == room.id,
+            Message.deleted_at.is_(None)
         ).order_by(desc(Message.timestamp)).first()
         
         # For group chats
@@ -55,7 +67,8 @@ async def get_rooms(username: str = Depends(get_current_user), db: Session = Dep
                 and_(
                     Message.room_id == room.id,
                     Message.sender_id != current_user.id,
-                    Message.read == False
+                    Message.read == False,
+                    Message.deleted_at.is_(None)
                 )
             ).scalar()
             
@@ -94,7 +107,8 @@ async def get_rooms(username: str = Depends(get_current_user), db: Session = Dep
                 and_(
                     Message.room_id == room.id,
                     Message.sender_id != current_user.id,
-                    Message.read == False
+                    Message.read == False,
+                    Message.deleted_at.is_(None)
                 )
             ).scalar()
             
@@ -111,7 +125,7 @@ async def get_rooms(username: str = Depends(get_current_user), db: Session = Dep
                 "last_message": latest_message.content if latest_message else "Click to start chatting!",
                 "last_message_time": latest_message.timestamp.strftime("%H:%M") if latest_message else "Now",
                 "unread_count": unread_count,
-                "status": "online" if other_user.is_online else "offline"
+                "status": presence_service.status(other_user.id)
             })
     
     # Sort by latest message time
@@ -166,65 +180,29 @@ async def create_direct_room_by_username(
             detail="Cannot create chat with this user"
         )
 
-    # Check if a direct room already exists between these users
-    existing_room = db.query(Room).filter(Room.is_group == False).filter(
-        Room.id.in_(
-            db.query(room_members.c.room_id).filter(
-                room_members.c.user_id == current_user.id
-            ).intersect(
-                db.query(room_members.c.room_id).filter(
-                    room_members.c.user_id == target_user.id
-                )
-            )
-        )
-    ).first()
+    # Find the direct room for this pair, creating it if there is none yet
+    room_id, created = get_or_create_direct_room(
+        db, current_user.id, target_user.id,
+        name=f"DM: {current_user.username} - {target_user.username}"  # Internal name
+    )
 
-    if existing_room:
-        print("[DEBUG] Existing room found:", existing_room.id)
+    if not created:
+        print("[DEBUG] Existing room found:", room_id)
         return {
-            "id": existing_room.id,
+            "id": room_id,
             "name": target_user.full_name or target_user.username,
             "username": target_user.username,
             "avatar": target_user.avatar,
             "is_group": False
         }
 
-    # Create new direct message room
-    print("[DEBUG] Creating new direct message room")
-    new_room = Room(
-        name=f"DM: {current_user.username} - {target_user.username}",  # Internal name
-        is_group=False,
-        created_at=datetime.utcnow()
-    )
-    db.add(new_room)
-    db.flush()  # Get ID of new room
-
-    # Add both users to the room
-    from sqlalchemy import insert
-    db.execute(
-        insert(room_members).values(
-            room_id=new_room.id,
-            user_id=current_user.id,
-            joined_at=datetime.utcnow()
-        )
-    )
-    db.execute(
-        insert(room_members).values(
-            room_id=new_room.id,
-            user_id=target_user.id,
-            joined_at=datetime.utcnow()
-        )
-    )
-
-    db.commit()
-
     # Notify the target user about the new room
     print("[DEBUG] Notifying target user about the new room")
-    await notify_new_room(new_room.id, target_user.id, current_user, db)
+    await notify_new_room(room_id, target_user.id, current_user, db)
 
     print("[DEBUG] Direct message room created successfully")
     return {
-        "id": new_room.id,
+        "id": room_id,
         "name": target_user.full_name or target_user.username,
         "username": target_user.username,
         "avatar": target_user.avatar,
@@ -237,10 +215,11 @@ async def get_room_messages(
     room_id: int, 
     before_id: Optional[int] = None,
     limit: int = 20,
+    lang: Optional[str] = None,
     username: str = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    """Get messages from a specific room with pagination"""
+    """Get messages from a specific room with pagination, with translations for `lang` if given"""
     # Get current user
     current_user = db.query(User).filter(User.username == username).first()
     if not current_user:
@@ -271,14 +250,68 @@ async def get_room_messages(
     if before_id:
         query = query.filter(Message.id < before_id)
     
+    # Skip messages whose deletion is still running
+    hidden = hidden_messages_filter(room_id)
+    if hidden is not None:
+        query = query.filter(hidden)
+    
     messages = query.order_by(desc(Message.timestamp)).limit(limit).all()
     
-    # Format messages
+    # Once the messages table runs out, keep paging through the room's archive segments
+    archived_messages = []
+    if len(messages) < limit:
+        oldest_id = min(message.id for message in messages) if messages else before_id
+        archived_messages = load_archived_messages(
+            db, room_id, oldest_id, limit - len(messages), after_id=hidden_room_watermark(room_id)
+        )
+        archived_messages = [
+            record for record in archived_messages
+            if not is_message_hidden(room_id, record["id"], record["sender_id"])
+        ]
+    
+    # Load voice message metadata for the whole page in one query
+    audio_by_message_id = {}
+    if messages:
+        audio_rows = db.query(AudioMetadata).filter(
+            AudioMetadata.message_id.in_([message.id for message in messages])
+        ).all()
+        audio_by_message_id = {row.message_id: row for row in audio_rows}
+    
+    # Stored translations for the viewer's language, also in one query
+    translation_by_message_id = {}
+    if messages and lang:
+        translation_rows = db.query(MessageTranslation).filter(
+            MessageTranslation.message_id.in_([message.id for message in messages]),
+            MessageTranslation.lang == lang.upper()
+        ).all()
+        translation_by_message_id = {row.message_id: row for row in translation_rows}
+    
+    # Format messages (deleted ones stay in history as tombstones)
     result = []
+    if archived_messages:
+        archived_sender_ids = {record["sender_id"] for record in archived_messages}
+        archived_senders = {
+            sender.id: sender
+            for sender in db.query(User).filter(User.id.in_(archived_sender_ids)).all()
+        }
+        for record in reversed(archived_messages):
+            sender = archived_senders.get(record["sender_id"])
+            result.append({
+                **record,
+                "sender": "user" if record["sender_id"] == current_user.id else sender.username if sender else "unknown",
+                "sender_name": sender.full_name or sender.username if sender else "Unknown",
+                "sender_avatar": sender.avatar or "/static/images/shrek.jpg" if sender else "/static/images/shrek.jpg",
+                "archived": True  # Read-only, cannot be edited or deleted
+            })
+    
     for message in reversed(messages):  # Reverse to get chronological order
+        if message.deleted_at is not None:
+            result.append(serialize_tombstone(message))
+            continue
+        
         sender = db.query(User).filter(User.id == message.sender_id).first()
         
-        result.append({
+        message_data = {
             "id": message.id,
             "content": message.content,
             "sender_id": message.sender_id,
@@ -293,7 +326,17 @@ async def get_room_messages(
             "is_translated": message.is_translated,
             "original_content": message.original_content,
             "translated_to": message.translated_to
-        })
+        }
+        
+        # Duration, waveform and the smaller transcoded file for voice messages
+        if message.id in audio_by_message_id:
+            message_data["audio"] = serialize_audio_metadata(audio_by_message_id[message.id])
+        
+        if message.id in translation_by_message_id:
+            translation = translation_by_message_id[message.id]
+            message_data["translation"] = {"lang": translation.lang, "text": translation.translated_text}
+        
+        result.append(message_data)
     
     # Mark unread messages as read
     unread_messages = db.query(Message).filter(
@@ -314,24 +357,23 @@ async def get_room_messages(
             sender_to_messages[msg.sender_id] = []
         sender_to_messages[msg.sender_id].append(msg.id)
     
+    if unread_messages:
+        record_event(db, "message_read", {
+            "reader_id": current_user.id,
+            "message_ids": [msg.id for msg in unread_messages]
+        }, room_id=room_id)
+    
     db.commit()
     
     # Send WebSocket notifications to senders
-    from app.routers.session import active_connections
     for sender_id, message_ids in sender_to_messages.items():
-        sender = db.query(User).filter(User.id == sender_id).first()
-        if sender and sender.username in active_connections:
-            for sender_ws in active_connections[sender.username]:
-                try:
-                    await sender_ws.send_json({
-                        "type": "message_read",
-                        "room_id": room_id,
-                        "reader_id": current_user.id,
-                        "reader": current_user.username,
-                        "message_ids": message_ids
-                    })
-                except Exception as e:
-                    print(f"Error sending read notification to {sender.username}: {e}")
+        await deliver_event(db, [sender_id], {
+            "type": "message_read",
+            "room_id": room_id,
+            "reader_id": current_user.id,
+            "reader": current_user.username,
+            "message_ids": message_ids
+        })
     
     return result
 
@@ -350,7 +392,7 @@ async def update_message(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     # Get the message
-    message = db.query(Message).filter(Message.id == message_id).first()
+    message = db.query(Message).filter(Message.id == message_id, Message.deleted_at.is_(None)).first()
     if not message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
     
@@ -384,11 +426,17 @@ async def update_message(
     message.content = new_content
     message.edited = True
     message.edited_at = datetime.utcnow()
+    # Stored translations are of the old text
+    db.query(MessageTranslation).filter(MessageTranslation.message_id == message.id).delete()
+    record_event(db, "message_updated", {
+        "message_id": message.id,
+        "content": new_content,
+        "edited_at": message.edited_at.isoformat()
+    }, room_id=message.room_id)
     db.commit()
     
     # Broadcast the edit to other users in the room
-    from app.routers.session import active_connections
-    room_members_query = db.query(User.username).join(
+    room_members_query = db.query(User.id).join(
         room_members, User.id == room_members.c.user_id
     ).filter(
         and_(
@@ -397,22 +445,14 @@ async def update_message(
         )
     ).all()
     
-    room_member_usernames = [member[0] for member in room_members_query]
-    
-    for member_username in room_member_usernames:
-        if member_username in active_connections:
-            for ws in active_connections[member_username]:
-                try:
-                    await ws.send_json({
-                        "type": "message_updated",
-                        "message_id": message.id,
-                        "room_id": message.room_id,
-                        "content": new_content,
-                        "edited": True,
-                        "edited_at": message.edited_at.isoformat()
-                    })
-                except Exception as e:
-                    print(f"Error sending message_updated notification: {e}")
+    await deliver_event(db, [member.id for member in room_members_query], {
+        "type": "message_updated",
+        "message_id": message.id,
+        "room_id": message.room_id,
+        "content": new_content,
+        "edited": True,
+        "edited_at": message.edited_at.isoformat()
+    })
     
     return {
         "id": message.id,
@@ -435,7 +475,7 @@ async def delete_message(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     # Get the message
-    message = db.query(Message).filter(Message.id == message_id).first()
+    message = db.query(Message).filter(Message.id == message_id, Message.deleted_at.is_(None)).first()
     if not message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
     
@@ -463,13 +503,14 @@ async def delete_message(
     # Store room ID for notifications
     room_id = message.room_id
     
-    # Delete the message
-    db.delete(message)
+    # Leave a tombstone, purged after the retention window
+    removed_files = soft_delete_message(db, message)
+    record_event(db, "message_deleted", {"message_id": message_id, "deleted_by": username}, room_id=room_id)
     db.commit()
+    remove_files(removed_files)
     
     # Broadcast the deletion to other users in the room
-    from app.routers.session import active_connections
-    room_members_query = db.query(User.username).join(
+    room_members_query = db.query(User.id).join(
         room_members, User.id == room_members.c.user_id
     ).filter(
         and_(
@@ -478,20 +519,12 @@ async def delete_message(
         )
     ).all()
     
-    room_member_usernames = [member[0] for member in room_members_query]
-    
-    for member_username in room_member_usernames:
-        if member_username in active_connections:
-            for ws in active_connections[member_username]:
-                try:
-                    await ws.send_json({
-                        "type": "message_deleted",
-                        "message_id": message_id,
-                        "room_id": room_id,
-                        "deleted_by": username
-                    })
-                except Exception as e:
-                    print(f"Error sending message_deleted notification: {e}")
+    await deliver_event(db, [member.id for member in room_members_query], {
+        "type": "message_deleted",
+        "message_id": message_id,
+        "room_id": room_id,
+        "deleted_by": username
+    })
     
     return {"success": True, "id": message_id}
 
@@ -543,8 +576,9 @@ async def clear_chat(
                 detail="Only admins can clear messages in group chats"
             )
     
-    # Delete all messages from this room
-    deleted_count = db.query(Message).filter(Message.room_id == room_id).delete()
+    # Hide the messages now and delete them (with their attachments) in the background
+    job = enqueue_deletion(db, "clear_room", room_id, current_user.username)
+    record_event(db, "chat_cleared", {"cleared_by": current_user.username}, room_id=room_id)
     
     db.commit()
     
@@ -559,24 +593,18 @@ async def clear_chat(
         )
     ).all()
     
-    # Send a websocket notification to all online members
-    from app.routers.session import active_connections
-    for member in members:
-        if member.username in active_connections:
-            for ws in active_connections[member.username]:
-                try:
-                    await ws.send_json({
-                        "type": "chat_cleared",
-                        "room_id": room_id,
-                        "cleared_by": current_user.username,
-                        "cleared_at": datetime.utcnow().isoformat()
-                    })
-                except Exception as e:
-                    print(f"Error sending chat_cleared notification: {e}")
+    # Send a websocket notification to all members, logged for the ones offline
+    await deliver_event(db, [member.id for member in members], {
+        "type": "chat_cleared",
+        "room_id": room_id,
+        "cleared_by": current_user.username,
+        "cleared_at": datetime.utcnow().isoformat()
+    })
     
     return {
         "status": "success",
-        "message": f"Chat cleared successfully. {deleted_count} messages deleted."
+        "message": "Chat cleared successfully.",
+        "job_id": job.id
     }
 
 # Search for users
@@ -603,49 +631,32 @@ async def search_users(
     # Combine all blocked IDs
     all_blocked_ids = set(blocked_ids + blocked_by_ids)
     
-    # Search for users
-    search_pattern = f"%{query}%"
-    users = db.query(User).filter(
-        and_(
-            or_(
-                User.username.ilike(search_pattern),
-                User.full_name.ilike(search_pattern)
-            ),
-            User.id != current_user.id,  # Exclude current user
-            not_(User.id.in_(all_blocked_ids))  # Exclude blocked/blocking users
-        )
-    ).limit(10).all()
+    # Search for users through the search index
+    all_blocked_ids.add(current_user.id)  # Exclude current user
+    all_blocked_ids.update(hidden_sender_ids())  # And accounts being deleted
+    user_ids = search_user_ids(db, query, all_blocked_ids)
+    if not user_ids:
+        return []
+    
+    users_by_id = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids)).all()}
+    
+    # Existing direct chats with all results, from the pair -> room index
+    room_id_by_user_id = get_direct_room_ids(db, current_user.id, user_ids)
     
     result = []
-    for user in users:
-        # Check if direct chat room exists with this user
-        # Using aliases to avoid ambiguous column references
-        from sqlalchemy.orm import aliased
-        
-        rm1 = aliased(room_members)
-        rm2 = aliased(room_members)
-        
-        direct_room = db.query(Room).join(
-            rm1, Room.id == rm1.c.room_id
-        ).filter(
-            and_(
-                Room.is_group == False,
-                rm1.c.user_id == current_user.id
-            )
-        ).join(
-            rm2, and_(
-                rm2.c.room_id == Room.id, 
-                rm2.c.user_id == user.id
-            )
-        ).first()
+    for user_id in user_ids:
+        user = users_by_id.get(user_id)
+        if not user:
+            continue
         
+        direct_room_id = room_id_by_user_id.get(user.id)
         result.append({
             "id": user.id,
             "username": user.username,
             "full_name": user.full_name,
             "avatar": user.avatar or "/static/images/shrek.jpg",  # Default avatar if none
-            "has_chat": direct_room is not None,
-            "room_id": direct_room.id if direct_room else None
+            "has_chat": direct_room_id is not None,
+            "room_id": direct_room_id
         })
     
     return result
\ No newline at end of file
@@ -0,0 +1,133 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import text
+from sqlalchemy import insert
+from cachetools import TTLCache
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import os
+
+from app.database import engine, Room, DirectRoom, room_members
+from app.routers.sync import record_event
+from app.routers.contact_graph import contact_graph
+
+# Pair -> room ID cache in front of the direct_rooms table
+DIRECT_ROOM_CACHE_SIZE = int(os.getenv("DIRECT_ROOM_CACHE_SIZE", "50000"))
+DIRECT_ROOM_CACHE_TTL = int(os.getenv("DIRECT_ROOM_CACHE_TTL", "3600"))  # 1 hour
+
+direct_room_cache = TTLCache(maxsize=DIRECT_ROOM_CACHE_SIZE, ttl=DIRECT_ROOM_CACHE_TTL)
+
+def pair_key(user_a: int, user_b: int) -> Tuple[int, int]:
+    """Order a user pair so (a, b) and (b, a) map to the same row"""
+    return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+def backfill_direct_rooms(bind=engine):
+    """Populate direct_rooms from existing two-member direct chats (oldest room wins)"""
+    with bind.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM direct_rooms LIMIT 1")).first() is not None:
+            return
+        conn.execute(text("""
+            INSERT INTO direct_rooms (user_low, user_high, room_id)
+            SELECT user_low, user_high, MIN(room_id) FROM (
+                SELECT rm.room_id AS room_id, MIN(rm.user_id) AS user_low, MAX(rm.user_id) AS user_high
+                FROM room_members rm JOIN rooms r ON r.id = rm.room_id
+                WHERE r.is_group = :is_group
+                GROUP BY rm.room_id
+                HAVING COUNT(*) = 2
+            ) pairs
+            GROUP BY user_low, user_high
+        """), {"is_group": False})
+
+backfill_direct_rooms()
+
+def get_direct_room_id(db: Session, user_a: int, user_b: int) -> Optional[int]:
+    """Room ID of the direct chat between two users, or None"""
+    key = pair_key(user_a, user_b)
+    room_id = direct_room_cache.get(key)
+    if room_id is not None:
+        return room_id
+
+    row = db.query(DirectRoom.room_id).filter(
+        DirectRoom.user_low == key[0],
+        DirectRoom.user_high == key[1]
+    ).first()
+    if row is None:
+        return None
+
+    direct_room_cache[key] = row.room_id
+    return row.room_id
+
+def get_direct_room_ids(db: Session, user_id: int, other_ids: List[int]) -> Dict[int, int]:
+    """Direct chat room IDs between one user and several others, keyed by the other user's ID"""
+    result = {}
+    missing = []
+    for other_id in other_ids:
+        room_id = direct_room_cache.get(pair_key(user_id, other_id))
+        if room_id is not None:
+            result[other_id] = room_id
+        else:
+            missing.append(other_id)
+
+    if missing:
+        rows = db.query(DirectRoom).filter(
+            (DirectRoom.user_low == user_id) & DirectRoom.user_high.in_(missing)
+            | (DirectRoom.user_high == user_id) & DirectRoom.user_low.in_(missing)
+        ).all()
+        for row in rows:
+            other_id = row.user_high if row.user_low == user_id else row.user_low
+            direct_room_cache[(row.user_low, row.user_high)] = row.room_id
+            result[other_id] = row.room_id
+
+    return result
+
+def get_or_create_direct_room(db: Session, user_a: int, user_b: int, name: str) -> Tuple[int, bool]:
+    """
+    Return the direct chat between two users, creating it if needed
+
+    Returns:
+        (room ID, whether the room was created by this call)
+    """
+    room_id = get_direct_room_id(db, user_a, user_b)
+    if room_id is not None:
+        return room_id, False
+
+    key = pair_key(user_a, user_b)
+    try:
+        new_room = Room(name=name, is_group=False, created_at=datetime.utcnow())
+        db.add(new_room)
+        db.flush()  # Get ID of new room
+
+        # Add both users to the room
+        for user_id in key:
+            db.execute(
+                insert(room_members).values(
+                    room_id=new_room.id,
+                    user_id=user_id,
+                    joined_at=datetime.utcnow()
+                )
+            )
+
+        # Fails on the primary key if another request created this DM first
+        db.add(DirectRoom(user_low=key[0], user_high=key[1], room_id=new_room.id))
+        record_event(db, "room_created", {"is_group": False, "user_ids": list(key)}, room_id=new_room.id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        room_id = get_direct_room_id(db, user_a, user_b)
+        if room_id is None:
+            raise
+        return room_id, False
+
+    direct_room_cache[key] = new_room.id
+    contact_graph.add_members(new_room.id, key, is_group=False)
+    return new_room.id, True
+
+def forget_user(user_id: int):
+    """Drop cached pairs involving a user whose direct rooms were deleted"""
+    for key in [key for key in list(direct_room_cache.keys()) if user_id in key]:
+        direct_room_cache.pop(key, None)
+
+def forget_room(room_id: int):
+    """Drop the cached pair of a direct room that was deleted"""
+    for key in [key for key, cached_room_id in list(direct_room_cache.items()) if cached_room_id == room_id]:
+        direct_room_cache.pop(key, None)
@@ -0,0 +1,125 @@
+from fastapi import WebSocket
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+import json
+import os
+
+from app.routers.session import active_connections
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, User, UserEvent, UserEventCounter
+
+# Events older than this are purged; clients further behind get a resync_required frame
+EVENT_LOG_RETENTION_DAYS = int(os.getenv("EVENT_LOG_RETENTION_DAYS", "7"))
+EVENT_LOG_REPLAY_LIMIT = int(os.getenv("EVENT_LOG_REPLAY_LIMIT", "500"))
+EVENT_LOG_PURGE_INTERVAL = int(os.getenv("EVENT_LOG_PURGE_INTERVAL", "3600"))  # seconds
+
+def append_events(db: Session, user_ids: Iterable[int], frame: dict) -> Dict[int, int]:
+    """
+    Add a frame to the log of each user, without committing
+
+    Returns:
+        The sequence number assigned to each user
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    counters = {
+        counter.user_id: counter
+        for counter in db.query(UserEventCounter).filter(
+            UserEventCounter.user_id.in_(user_ids)
+        ).with_for_update().all()
+    }
+
+    now = datetime.utcnow()
+    payload = json.dumps(frame)
+    seqs = {}
+    for user_id in user_ids:
+        counter = counters.get(user_id)
+        if counter is None:
+            counter = UserEventCounter(user_id=user_id, last_seq=0)
+            db.add(counter)
+        counter.last_seq += 1
+        seqs[user_id] = counter.last_seq
+        db.add(UserEvent(
+            user_id=user_id,
+            seq=counter.last_seq,
+            type=frame.get("type", ""),
+            payload=payload,
+            created_at=now
+        ))
+    return seqs
+
+async def deliver_event(db: Session, user_ids: Iterable[int], frame: dict):
+    """
+    Log a frame for each user and push it to the ones that are online
+
+    Each copy carries the recipient's sequence number in "seq", so a client that
+    was offline or disconnected can resume from the last one it saw.
+    """
+    seqs = append_events(db, user_ids, frame)
+    if not seqs:
+        return
+    db.commit()
+
+    online = db.query(User.id, User.username).filter(
+        User.id.in_(list(seqs.keys())),
+        User.username.in_(list(active_connections.keys()))
+    ).all()
+
+    for user_id, username in online:
+        for ws in list(active_connections.get(username, ())):
+            try:
+                await ws.send_json({**frame, "seq": seqs[user_id]})
+            except Exception as e:
+                print(f"Error sending {frame.get('type')} event to {username}: {e}")
+
+def last_seq(db: Session, user_id: int) -> int:
+    counter = db.query(UserEventCounter).filter(UserEventCounter.user_id == user_id).first()
+    return counter.last_seq if counter else 0
+
+async def replay_events(websocket: WebSocket, db: Session, user_id: int, since: Optional[int]) -> int:
+    """
+    Send a reconnecting client the events it missed after `since`
+
+    A client without a position is told the current one. If the gap was purged
+    or is too large to replay, the client is asked to do a full reload instead.
+
+    Returns:
+        The last sequence number sent
+    """
+    current = last_seq(db, user_id)
+    if since is None:
+        await websocket.send_json({"type": "event_seq", "seq": current})
+        return current
+    if since >= current:
+        return current
+
+    events = db.query(UserEvent).filter(
+        UserEvent.user_id == user_id,
+        UserEvent.seq > since
+    ).order_by(UserEvent.seq).limit(EVENT_LOG_REPLAY_LIMIT + 1).all()
+
+    if not events or events[0].seq != since + 1 or len(events) > EVENT_LOG_REPLAY_LIMIT:
+        await websocket.send_json({"type": "resync_required", "seq": current})
+        return current
+
+    for event in events:
+        await websocket.send_json({**json.loads(event.payload), "seq": event.seq})
+    return events[-1].seq
+
+def purge_user_events():
+    """Delete logged events older than the retention window"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(UserEvent).filter(
+            UserEvent.created_at < datetime.utcnow() - timedelta(days=EVENT_LOG_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            print(f"Purged {deleted} logged user events")
+    finally:
+        db.close()
+
+register_periodic_task("purge_user_events", EVENT_LOG_PURGE_INTERVAL, purge_user_events)
@@ -0,0 +1,270 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+import html
+import json
+import os
+import zipfile
+
+from app.routers.session import get_db, get_current_user
+from app.routers.archive import iter_archived_records
+from app.routers.deletion_jobs import is_message_hidden
+from app.routers.attachments import attachment_refs, attachment_path
+from app.database import SessionLocal, User, Room, Message, room_members
+
+# Messages fetched per query; each batch runs in its own short read transaction
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_FILE_CHUNK = 64 * 1024
+
+router = APIRouter(prefix="/api")
+
+HTML_HEADER = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 800px; margin: 2em auto; }}
+.message {{ padding: 4px 0; border-bottom: 1px solid #eee; }}
+.time {{ color: #888; font-size: 0.85em; margin-right: 0.5em; }}
+.sender {{ font-weight: bold; margin-right: 0.5em; }}
+.content {{ white-space: pre-wrap; }}
+</style></head><body>
+<h1>{title}</h1>
+<p>Exported {exported_at} UTC</p>
+"""
+HTML_FOOTER = "</body></html>\n"
+
+class ZipStream:
+    """Write-only file object that collects zip output so it can be yielded piece by piece"""
+
+    def __init__(self):
+        self.chunks = []
+        self.buffered = 0
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.buffered += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.buffered = 0
+        return data
+
+def iter_room_messages(room_id: int, viewer_id: int) -> Iterator[dict]:
+    """
+    Every message of a room in chronological order, archived ones first
+
+    Uses its own session: the request's session is closed before the response body is sent.
+    Messages are read in keyset batches rather than through one long-lived cursor, since an
+    open SQLite read transaction would hold off writers for as long as the download takes.
+    """
+    db = SessionLocal()
+    try:
+        senders: Dict[int, Optional[User]] = {}
+
+        def sender_of(sender_id: int) -> Optional[User]:
+            if sender_id not in senders:
+                senders[sender_id] = db.query(User).filter(User.id == sender_id).first()
+            return senders[sender_id]
+
+        def export_record(message_id, sender_id, content, timestamp, read, archived) -> dict:
+            sender = sender_of(sender_id)
+            return {
+                "id": message_id,
+                "timestamp": timestamp,
+                "sender_id": sender_id,
+                "sender": sender.username if sender else "unknown",
+                "sender_name": (sender.full_name or sender.username) if sender else "Unknown",
+                "is_own": sender_id == viewer_id,
+                "content": content,
+                "read": read,
+                "archived": archived,
+                "attachments": [{"url": url, "filename": filename} for url, filename in attachment_refs(content)]
+            }
+
+        for record in iter_archived_records(db, room_id):
+            if is_message_hidden(room_id, record["id"], record["sender_id"]):
+                continue
+            yield export_record(record["id"], record["sender_id"], record["content"],
+                                record["timestamp"], record["read"], True)
+        db.rollback()
+
+        last_id = 0
+        while True:
+            batch = db.query(
+                Message.id, Message.sender_id, Message.content, Message.timestamp, Message.read
+            ).filter(
+                Message.room_id == room_id,
+                Message.id > last_id,
+                Message.deleted_at.is_(None)
+            ).order_by(Message.id).limit(EXPORT_BATCH_SIZE).all()
+            db.rollback()  # End the read transaction before handing rows to the client
+            if not batch:
+                break
+
+            for message_id, sender_id, content, timestamp, read in batch:
+                if is_message_hidden(room_id, message_id, sender_id):
+                    continue
+                yield export_record(message_id, sender_id, content, timestamp.isoformat(), read, False)
+            last_id = batch[-1].id
+    finally:
+        db.close()
+
+def ndjson_lines(room: dict, messages: Iterator[dict]) -> Iterator[str]:
+    yield json.dumps({"type": "room", **room}, ensure_ascii=False) + "\n"
+    for message in messages:
+        yield json.dumps({"type": "message", **message}, ensure_ascii=False) + "\n"
+
+def html_lines(room: dict, messages: Iterator[dict], attachment_prefix: Optional[str] = None) -> Iterator[str]:
+    """HTML transcript; attachment links point into the zip when attachment_prefix is given"""
+    yield HTML_HEADER.format(title=html.escape(room["name"]), exported_at=html.escape(room["exported_at"]))
+    for message in messages:
+        if message["attachments"]:
+            links = []
+            for attachment in message["attachments"]:
+                href = attachment["url"]
+                if attachment_prefix is not None:
+                    href = attachment_prefix + href.rsplit("/", 1)[-1]
+                links.append(f'<a href="{html.escape(href)}">{html.escape(attachment["filename"] or "attachment")}</a>')
+            body = " ".join(links)
+        else:
+            body = html.escape(message["content"])
+        yield (
+            f'<div class="message" id="m{message["id"]}">'
+            f'<span class="time">{html.escape(message["timestamp"][:16].replace("T", " "))}</span>'
+            f'<span class="sender">{html.escape(message["sender_name"])}</span>'
+            f'<span class="content">{body}</span></div>\n'
+        )
+    yield HTML_FOOTER
+
+def zip_stream(room: dict, messages: Iterator[dict], format: str) -> Iterator[bytes]:
+    """Zip with the transcript plus every attachment it references, produced without seeking"""
+    stream = ZipStream()
+    referenced = {}
+
+    def collect(messages: Iterator[dict]) -> Iterator[dict]:
+        for message in messages:
+            for attachment in message["attachments"]:
+                referenced[attachment["url"]] = True
+            yield message
+
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        transcript_name = "messages.html" if format == "html" else "messages.ndjson"
+        lines = html_lines(room, collect(messages), "attachments/") if format == "html" else ndjson_lines(room, collect(messages))
+
+        with archive.open(transcript_name, mode="w", force_zip64=True) as dest:
+            for line in lines:
+                dest.write(line.encode("utf-8"))
+                if stream.buffered >= EXPORT_FILE_CHUNK:
+                    yield stream.drain()
+        yield stream.drain()
+
+        # Media is already compressed, store it as is
+        written = set()
+        for url in referenced:
+            path = attachment_path(url)
+            if path is None or not path.is_file() or path.name in written:
+                continue
+            written.add(path.name)
+            info = zipfile.ZipInfo("attachments/" + path.name, date_time=datetime.utcnow().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, "rb") as src, archive.open(info, mode="w", force_zip64=True) as dest:
+                while True:
+                    data = src.read(EXPORT_FILE_CHUNK)
+                    if not data:
+                        break
+                    dest.write(data)
+                    yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
+
+def encode_lines(lines: Iterator[str]) -> Iterator[bytes]:
+    for line in lines:
+        yield line.encode("utf-8")
+
+# Download the full history of a room
+@router.get("/rooms/{room_id}/export")
+async def export_room(
+    room_id: int,
+    format: str = "ndjson",
+    attachments: bool = False,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream a room's whole history as NDJSON or HTML
+
+    With attachments=true the transcript and the files it references are sent
+    as one zip. Memory use does not depend on the size of the room.
+    """
+    if format not in ("ndjson", "html"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be ndjson or html")
+
+    current_user = db.query(User).filter(User.username == username).first()
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
+
+    is_member = db.query(room_members).filter(
+        and_(
+            room_members.c.room_id == room_id,
+            room_members.c.user_id == current_user.id
+        )
+    ).first() is not None
+
+    if not is_member:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this room"
+        )
+
+    room_name = room.name
+    if not room.is_group:
+        other = db.query(User).join(room_members, User.id == room_members.c.user_id).filter(
+            room_members.c.room_id == room_id,
+            User.id != current_user.id
+        ).first()
+        room_name = f"Chat with {other.full_name or other.username}" if other else room.name
+    exported_at = datetime.utcnow()
+    room_info = {
+        "id": room.id,
+        "name": room_name or f"Room {room.id}",
+        "is_group": room.is_group,
+        "exported_by": current_user.username,
+        "exported_at": exported_at.isoformat()
+    }
+
+    messages = iter_room_messages(room_id, current_user.id)
+    filename = f"shrekchat-room-{room_id}-{exported_at.strftime('%Y%m%d')}"
+
+    if attachments:
+        return StreamingResponse(
+            zip_stream(room_info, messages, format),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'}
+        )
+    if format == "html":
+        return StreamingResponse(
+            encode_lines(html_lines(room_info, messages)),
+            media_type="text/html; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.html"'}
+        )
+    return StreamingResponse(
+        encode_lines(ndjson_lines(room_info, messages)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    )
@@ -12,6 +12,10 @@ from pathlib import Path
 from app.routers.session import get_db, get_current_user
 from app.database import User, Room, Message, room_members, GroupChat
 from app.routers.websockets import notify_new_group
+from app.routers.sync import record_event
+from app.routers.presence import presence_service
+from app.routers.contact_graph import contact_graph
+from app.routers.deletion_jobs import enqueue_deletion
 
 router = APIRouter(prefix="/api")
 
@@ -84,7 +88,7 @@ async def get_room_details(
             "avatar": other_user.avatar,
             "is_group": False,
             "user_id": other_user.id,
-            "status": "online" if other_user.is_online else "offline",
+            "status": presence_service.status(other_user.id),
             "created_at": room.created_at.isoformat(),
             "email": other_user.email,
         }
@@ -167,7 +171,9 @@ async def create_group(
                 is_admin=is_admin
             )
         )
+    record_event(db, "room_created", {"is_group": True, "user_ids": member_id_list}, room_id=new_room.id)
     db.commit()
+    contact_graph.add_members(new_room.id, member_id_list, is_group=True)
     
     # Notify members about the new group
     await notify_new_group(new_room.id, member_id_list, db)
@@ -305,7 +311,11 @@ async def add_group_members(
             )
             added_members.append(user_id)
     
+    if added_members:
+        record_event(db, "members_added", {"user_ids": added_members}, room_id=room_id)
+    
     db.commit()
+    contact_graph.add_members(room_id, added_members, is_group=True)
     
     # Notify new members about being added to the group
     if added_members:
@@ -419,8 +429,12 @@ async def remove_group_member(
             )
         )
     )
+    # Visible to the remaining members through the room and to the removed user directly
+    record_event(db, "member_removed", {"user_id": user_id, "removed_by": current_user.id},
+                 room_id=room_id, user_id=user_id)
     
     db.commit()
+    contact_graph.remove_member(room_id, user_id)
     
     # Check if this was the last member, delete group if empty
     members_count = db.query(func.count(room_members.c.user_id)).filter(
@@ -523,8 +537,10 @@ async def leave_group(
             )
         )
     )
+    record_event(db, "member_left", {"user_id": current_user.id}, room_id=room_id, user_id=current_user.id)
     
     db.commit()
+    contact_graph.remove_member(room_id, current_user.id)
     
     # Check if this was the last member, delete group if empty
     members_count = db.query(func.count(room_members.c.user_id)).filter(
@@ -585,28 +601,29 @@ async def delete_group(
         )
     ).all()]
     
-    # Delete all messages from this room
-    db.query(Message).filter(Message.room_id == room_id).delete()
-    
-    # Delete all room memberships
+    # Delete all room memberships, which hides the group from everyone right away
     db.execute(
         room_members.delete().where(
             room_members.c.room_id == room_id
         )
     )
     
-    # Delete group info and room
-    db.query(GroupChat).filter(GroupChat.id == room_id).delete()
-    db.query(Room).filter(Room.id == room_id).delete()
+    # Messages, attachments, group info and the room itself are removed in the background
+    job = enqueue_deletion(db, "room", room_id, current_user.username)
+    
+    # Membership is gone, so address the event to each former member
+    for member_id in member_ids + [current_user.id]:
+        record_event(db, "room_deleted", {"room_id": room_id}, user_id=member_id)
     
     db.commit()
+    contact_graph.remove_room(room_id)
     
     # Notify all members that the group has been deleted
     from app.routers.websockets import notify_group_deleted
     if member_ids:
         await notify_group_deleted(room_id, member_ids, db)
     
-    return {"status": "success", "message": "Group has been deleted"}
+    return {"status": "success", "message": "Group has been deleted", "job_id": job.id}
 
 # Make a user an admin of a group
 @router.post("/rooms/{room_id}/members/{user_id}/make-admin")
@@ -749,6 +766,10 @@ async def update_group(
         # Update avatar path
         group_chat.avatar = avatar_path
     
+    record_event(db, "room_updated", {
+        "description": group_chat.description,
+        "avatar": group_chat.avatar
+    }, room_id=room_id)
     db.commit()
     
     return {
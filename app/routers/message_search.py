@@ -0,0 +1,185 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from typing import List, Optional
+import re
+
+from app.routers.session import get_db, get_current_user
+from app.routers.deletion_jobs import is_message_hidden
+from app.database import engine, User, Message
+
+router = APIRouter(prefix="/api")
+
+SEARCH_MAX_TERMS = 8
+SEARCH_MAX_LIMIT = 100
+
+# SQLite: external-content FTS5 table over messages.content. The triggers keep it in sync
+# for every write path - new messages, edits, single deletes and bulk deletes (clear chat,
+# group deletion) - without the endpoints having to know about the index.
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+# PostgreSQL: an expression GIN index is maintained by the database itself
+POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages USING GIN (to_tsvector('simple', content))",
+]
+
+def ensure_search_index(bind=engine):
+    """Create the full-text index for the current backend, backfilling existing messages"""
+    dialect = bind.dialect.name
+    with bind.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            )).first() is not None
+            for statement in SQLITE_SEARCH_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index messages written before the FTS table existed
+                conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_SEARCH_DDL:
+                conn.execute(text(statement))
+        else:
+            print(f"Message search: no full-text index for {dialect}, falling back to LIKE")
+
+ensure_search_index()
+
+def search_terms(query: str) -> List[str]:
+    """Split a user query into plain word tokens, so no FTS syntax reaches the database"""
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+def search_message_ids(
+    db: Session,
+    user_id: int,
+    query: str,
+    room_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20
+) -> List[int]:
+    """
+    Find messages matching every term (as a prefix) in rooms the user belongs to
+
+    Returns:
+        Message IDs, newest first
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    params = {"user_id": user_id, "limit": limit}
+    filters = ""
+    if room_id is not None:
+        filters += " AND m.room_id = :room_id"
+        params["room_id"] = room_id
+    if before_id is not None:
+        filters += " AND m.id < :before_id"
+        params["before_id"] = before_id
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params["match"] = " ".join(f'"{term}"*' for term in terms)
+        sql = f"""
+            SELECT m.id FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN room_members rm ON rm.room_id = m.room_id AND rm.user_id = :user_id
+            WHERE messages_fts MATCH :match{filters}
+            ORDER BY m.id DESC LIMIT :limit
+        """
+    elif dialect == "postgresql":
+        params["tsquery"] = " & ".join(f"{term}:*" for term in terms)
+        sql = f"""
+            SELECT m.id FROM messages m
+            JOIN room_members rm ON rm.room_id = m.room_id AND rm.user_id = :user_id
+            WHERE to_tsvector('simple', m.content) @@ to_tsquery('simple', :tsquery){filters}
+            ORDER BY m.id DESC LIMIT :limit
+        """
+    else:
+        like_filters = ""
+        for i, term in enumerate(terms):
+            like_filters += f" AND LOWER(m.content) LIKE :term{i}"
+            params[f"term{i}"] = f"%{term}%"
+        sql = f"""
+            SELECT m.id FROM messages m
+            JOIN room_members rm ON rm.room_id = m.room_id AND rm.user_id = :user_id
+            WHERE 1 = 1{like_filters}{filters}
+            ORDER BY m.id DESC LIMIT :limit
+        """
+
+    return [row[0] for row in db.execute(text(sql), params)]
+
+# Search messages in the current user's rooms
+@router.get("/search/messages")
+async def search_messages(
+    q: str,
+    room_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Full-text search over messages in rooms the current user is a member of"""
+    current_user = db.query(User).filter(User.username == username).first()
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    if not search_terms(q):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must contain at least one word"
+        )
+
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    message_ids = search_message_ids(db, current_user.id, q, room_id, before_id, limit)
+    if not message_ids:
+        return {"results": [], "next_before_id": None}
+
+    messages = db.query(Message).filter(Message.id.in_(message_ids)).all()
+    messages_by_id = {message.id: message for message in messages}
+    senders = db.query(User).filter(User.id.in_({message.sender_id for message in messages})).all()
+    senders_by_id = {sender.id: sender for sender in senders}
+
+    results = []
+    for message_id in message_ids:
+        message = messages_by_id.get(message_id)
+        if not message or message.deleted_at is not None or is_message_hidden(message.room_id, message.id, message.sender_id):
+            continue
+        sender = senders_by_id.get(message.sender_id)
+        results.append({
+            "id": message.id,
+            "room_id": message.room_id,
+            "content": message.content,
+            "sender_id": message.sender_id,
+            "sender": sender.username if sender else "unknown",
+            "sender_name": sender.full_name or sender.username if sender else "Unknown",
+            "timestamp": message.timestamp.isoformat(),
+            "time": message.timestamp.strftime("%H:%M")
+        })
+
+    return {
+        "results": results,
+        # Pass as before_id to fetch the next (older) page
+        "next_before_id": message_ids[-1] if len(message_ids) == limit else None
+    }
@@ -0,0 +1,177 @@
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session
+from cachetools import LRUCache
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import threading
+import os
+
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, User
+
+PRESENCE_FLUSH_INTERVAL = int(os.getenv("PRESENCE_FLUSH_INTERVAL", "10"))  # seconds
+# Usernames and last_seen of recently looked up users, for the status endpoint
+PRESENCE_CACHE_SIZE = int(os.getenv("PRESENCE_CACHE_SIZE", "10000"))
+
+class PresenceService:
+    """
+    Authoritative online state, kept in memory
+
+    A user is online while at least one of their sockets (chat or presence) is
+    open. users.is_online and users.last_seen are written by a periodic flush,
+    in one batch, for whoever changed since the previous one.
+    """
+
+    def __init__(self):
+        self.sockets: Dict[int, int] = {}
+        self.online_usernames: Dict[int, str] = {}
+        self.users = LRUCache(maxsize=PRESENCE_CACHE_SIZE)  # user ID -> (username, last_seen)
+        self.pending: Dict[int, Tuple[bool, datetime]] = {}  # user ID -> state not yet written
+        self.lock = threading.Lock()
+
+    def _remember(self, user_id: int, username: str, last_seen: Optional[datetime]):
+        self.users[user_id] = (username, last_seen)
+
+    def connect(self, user_id: int, username: str) -> bool:
+        """Count a new socket; True when it brought the user online"""
+        now = datetime.utcnow()
+        with self.lock:
+            count = self.sockets.get(user_id, 0) + 1
+            self.sockets[user_id] = count
+            self.online_usernames[user_id] = username
+            self._remember(user_id, username, now)
+            self.pending[user_id] = (True, now)
+        return count == 1
+
+    def disconnect(self, user_id: int, username: str) -> bool:
+        """Count a closed socket; True when it was the user's last one"""
+        now = datetime.utcnow()
+        with self.lock:
+            count = self.sockets.get(user_id, 0) - 1
+            if count > 0:
+                self.sockets[user_id] = count
+                return False
+            self.sockets.pop(user_id, None)
+            self.online_usernames.pop(user_id, None)
+            self._remember(user_id, username, now)
+            self.pending[user_id] = (False, now)
+        return True
+
+    def seen(self, user_id: int, username: str):
+        """Record activity outside a socket (login, logout) without changing the online state"""
+        now = datetime.utcnow()
+        with self.lock:
+            self._remember(user_id, username, now)
+            self.pending[user_id] = (user_id in self.sockets, now)
+
+    def forget(self, user_id: int):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.sockets
+
+    def status(self, user_id: int) -> str:
+        return "online" if user_id in self.sockets else "offline"
+
+    def online_username(self, user_id: int) -> Optional[str]:
+        """Username of a connected user, None when offline"""
+        return self.online_usernames.get(user_id)
+
+    def online_count(self) -> int:
+        return len(self.sockets)
+
+    def lookup(self, user_id: int) -> Optional[dict]:
+        """Status of a user, answered from memory once the user has been seen or looked up"""
+        with self.lock:
+            known = self.users.get(user_id)
+        if known is None:
+            db = SessionLocal()
+            try:
+                row = db.query(User.username, User.last_seen).filter(User.id == user_id).first()
+            finally:
+                db.close()
+            if row is None:
+                return None
+            with self.lock:
+                known = self.users.setdefault(user_id, (row.username, row.last_seen))
+        username, last_seen = known
+        return {
+            "user_id": user_id,
+            "username": username,
+            "status": self.status(user_id),
+            "last_seen": last_seen.isoformat() if last_seen else None
+        }
+
+    def changed_since(self, db: Session, users, since: datetime) -> Dict[int, Tuple[bool, Optional[datetime]]]:
+        """
+        Online state and last_seen of the users matching the users condition that changed after since
+
+        Includes changes the periodic flush has not written yet.
+        """
+        changes = {
+            user_id: (self.is_online(user_id), last_seen)
+            for user_id, last_seen in db.query(User.id, User.last_seen).filter(users, User.last_seen >= since).all()
+        }
+        with self.lock:
+            recent = {user_id: state for user_id, state in self.pending.items() if state[1] >= since}
+        if recent:
+            for (user_id,) in db.query(User.id).filter(users, User.id.in_(list(recent))).all():
+                changes[user_id] = recent[user_id]
+        return changes
+
+    def flush(self):
+        """Write the pending online state and last_seen values in one batch"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        db = SessionLocal()
+        try:
+            # One executemany; rows of users deleted meanwhile simply match nothing
+            users = User.__table__
+            db.execute(
+                update(users).where(users.c.id == bindparam("user_id")).values(
+                    is_online=bindparam("online"),
+                    last_seen=bindparam("seen")
+                ),
+                [
+                    {"user_id": user_id, "online": online, "seen": last_seen}
+                    for user_id, (online, last_seen) in pending.items()
+                ]
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Keep the changes for the next flush unless newer ones arrived meanwhile
+            with self.lock:
+                for user_id, state in pending.items():
+                    self.pending.setdefault(user_id, state)
+            raise
+        finally:
+            db.close()
+
+    def reset(self):
+        """Mark everyone offline; no sockets survive a restart, whatever the database says"""
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.is_online == True).update({"is_online": False}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def shutdown(self):
+        """Record every connected user as offline as of now, then write everything out"""
+        now = datetime.utcnow()
+        with self.lock:
+            for user_id in self.sockets:
+                self.pending[user_id] = (False, now)
+            self.sockets.clear()
+            self.online_usernames.clear()
+        self.flush()
+
+# Shared instance fed by the chat and presence WebSockets
+presence_service = PresenceService()
+
+register_periodic_task("flush_presence", PRESENCE_FLUSH_INTERVAL, presence_service.flush)
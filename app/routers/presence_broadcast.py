@@ -0,0 +1,160 @@
+from fastapi.concurrency import run_in_threadpool
+from fastapi import WebSocket
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+
+from app.routers.session import active_connections
+from app.routers.presence import presence_service
+from app.routers.contact_graph import contact_graph
+
+# A user whose last socket closes is announced offline only if they stay away this long,
+# so page reloads and tab switches never reach their contacts
+PRESENCE_OFFLINE_GRACE = float(os.getenv("PRESENCE_OFFLINE_GRACE", "5"))  # seconds
+# Status changes are collected for this long and sent as one frame per recipient
+PRESENCE_BATCH_WINDOW = float(os.getenv("PRESENCE_BATCH_WINDOW", "0.5"))  # seconds
+# Most users one socket can watch at a time
+PRESENCE_MAX_SUBSCRIPTIONS = int(os.getenv("PRESENCE_MAX_SUBSCRIPTIONS", "500"))
+
+def status_recipients(user_ids: List[int]) -> Dict[str, Set[int]]:
+    """Username of every connected direct chat contact of the given users -> which of those users they share a chat with"""
+    recipients: Dict[str, Set[int]] = {}
+    for user_id in user_ids:
+        for contact_id in contact_graph.contacts(user_id, direct_only=True):
+            username = presence_service.online_username(contact_id)
+            if username is not None:
+                recipients.setdefault(username, set()).add(user_id)
+    return recipients
+
+class PresenceBroadcaster:
+    """
+    Tells contacts about status changes, debounced and batched
+
+    Going offline waits out PRESENCE_OFFLINE_GRACE, and coming back within it
+    cancels the change. What survives is collected for PRESENCE_BATCH_WINDOW and
+    sent as one status_batch frame per connected contact, so a reconnect storm
+    costs one frame per recipient per window rather than one per user and contact.
+
+    A socket that sends presence_subscribe only hears about the users it listed;
+    clients that never subscribe get every direct contact's changes, as before.
+    Must be called from the event loop.
+    """
+
+    def __init__(self):
+        self.changes: Dict[int, Tuple[str, str]] = {}  # user ID -> (username, status) not sent yet
+        self.announced_online: Set[int] = set()
+        self.offline_timers: Dict[int, asyncio.TimerHandle] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.subscriptions: Dict[WebSocket, Set[int]] = {}  # socket -> users it watches
+        self.subscribers: Dict[int, Set[WebSocket]] = {}  # user ID -> sockets watching them
+
+    def visible_status(self, user_id: int) -> str:
+        """Status as contacts see it: users inside the offline grace period still count as online"""
+        return "online" if presence_service.is_online(user_id) or user_id in self.offline_timers else "offline"
+
+    def subscribe(self, websocket: WebSocket, subscriber_id: int, user_ids: List[int]) -> List[dict]:
+        """
+        Replace the users a socket watches and return their current status
+
+        Only users who share a room with the subscriber can be watched, and only the
+        first PRESENCE_MAX_SUBSCRIPTIONS of them.
+        """
+        self.unsubscribe(websocket)
+        allowed = contact_graph.contacts(subscriber_id)
+        watched: Set[int] = set()
+        for user_id in user_ids:
+            if len(watched) >= PRESENCE_MAX_SUBSCRIPTIONS:
+                break
+            if user_id in allowed:
+                watched.add(user_id)
+        self.subscriptions[websocket] = watched
+        for user_id in watched:
+            self.subscribers.setdefault(user_id, set()).add(websocket)
+        return [{"user_id": user_id, "status": self.visible_status(user_id)} for user_id in sorted(watched)]
+
+    def unsubscribe(self, websocket: WebSocket):
+        for user_id in self.subscriptions.pop(websocket, ()):
+            sockets = self.subscribers.get(user_id)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.subscribers[user_id]
+
+    def online(self, user_id: int, username: str):
+        timer = self.offline_timers.pop(user_id, None)
+        if timer is not None:
+            # Back within the grace period: contacts never saw the user leave
+            timer.cancel()
+            return
+        self._queue(user_id, username, "online")
+
+    def offline(self, user_id: int, username: str):
+        if user_id not in self.offline_timers:
+            self.offline_timers[user_id] = asyncio.get_running_loop().call_later(
+                PRESENCE_OFFLINE_GRACE, self._grace_expired, user_id, username
+            )
+
+    def _grace_expired(self, user_id: int, username: str):
+        self.offline_timers.pop(user_id, None)
+        self._queue(user_id, username, "offline")
+
+    def _queue(self, user_id: int, username: str, status: str):
+        if (status == "online") == (user_id in self.announced_online):
+            # Flapped back to what contacts were last told before the batch went out
+            self.changes.pop(user_id, None)
+        else:
+            self.changes[user_id] = (username, status)
+        if self.changes and (self.flush_task is None or self.flush_task.done()):
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(PRESENCE_BATCH_WINDOW)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error broadcasting status changes: {e}")
+
+    async def flush(self):
+        changes, self.changes = self.changes, {}
+        if not changes:
+            return
+        for user_id, (_, status) in changes.items():
+            if status == "online":
+                self.announced_online.add(user_id)
+            else:
+                self.announced_online.discard(user_id)
+
+        entries = {
+            user_id: {"user_id": user_id, "username": username, "status": status}
+            for user_id, (username, status) in changes.items()
+        }
+        frames: Dict[WebSocket, List[dict]] = {}
+        for user_id, entry in entries.items():
+            for ws in self.subscribers.get(user_id, ()):
+                frames.setdefault(ws, []).append(entry)
+
+        # Users none of whose sockets subscribed still get every direct contact's changes
+        if not contact_graph.loaded:
+            await run_in_threadpool(contact_graph.ensure_loaded)
+        for recipient, user_ids in status_recipients(list(changes)).items():
+            sockets = list(active_connections.get(recipient) or ())
+            if any(ws in self.subscriptions for ws in sockets):
+                continue
+            for ws in sockets:
+                frames.setdefault(ws, []).extend(entries[user_id] for user_id in user_ids)
+
+        for ws, statuses in frames.items():
+            try:
+                await ws.send_json({"type": "status_batch", "statuses": statuses})
+            except Exception as e:
+                print(f"Error sending status batch: {e}")
+
+    def close(self):
+        for timer in self.offline_timers.values():
+            timer.cancel()
+        self.offline_timers.clear()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+
+# Shared instance, fed by the chat and presence WebSockets through broadcast_status
+presence_broadcaster = PresenceBroadcaster()
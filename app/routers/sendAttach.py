@@ -11,6 +11,7 @@ from pathlib import Path
 from app.database import User, Room, Message, room_members
 from app.routers.session import get_db
 from app.routers.websockets import notify_new_message
+from app.routers.activity import activity_tracker
 import pytz
 
 router = APIRouter()
@@ -115,13 +116,14 @@ async def upload_attachment(
             sender_id=user.id,
             room_id=room_id,
             timestamp=datetime.now(pytz.timezone('Asia/Bishkek')),
-            delivered=True,
+            delivered=False,  # Set once a recipient's socket acks it
             read=False
         )
         
         db.add(new_message)
         db.commit()
         db.refresh(new_message)
+        activity_tracker.record(user.id)
         
         # Prepare message response
         message_response = {
@@ -133,7 +135,7 @@ async def upload_attachment(
             "room_id": room_id,
             "timestamp": new_message.timestamp.isoformat(),
             "time": new_message.timestamp.strftime("%H:%M"),
-            "delivered": True,
+            "delivered": False,
             "read": False,
             "is_group": room.is_group,
             "attachment": {
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 import os
@@ -10,6 +10,8 @@ from pathlib import Path
 from app.database import User, Room, Message
 from app.routers.session import get_db
 from app.routers.websockets import notify_new_message
+from app.routers.activity import activity_tracker
+from app.routers.audio_processing import process_audio_message
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
@@ -19,6 +21,7 @@ MAX_FILE_SIZE = 20 * 1024 * 1024
 @router.post("/audio")
 async def upload_audio_message(
     request: Request,
+    background_tasks: BackgroundTasks,
     audio: UploadFile = File(...),
     room_id: int = Form(...),
     db: Session = Depends(get_db)
@@ -86,13 +89,14 @@ async def upload_audio_message(
             sender_id=user.id,
             room_id=room_id,
             timestamp=datetime.now(),
-            delivered=True,
+            delivered=False,  # Set once a recipient's socket acks it
             read=False
         )
         
         db.add(new_message)
         db.commit()
         db.refresh(new_message)
+        activity_tracker.record(user.id)
         
         # Prepare message response
         message_response = {
@@ -104,7 +108,7 @@ async def upload_audio_message(
             "room_id": room_id,
             "timestamp": new_message.timestamp.isoformat(),
             "time": new_message.timestamp.strftime("%H:%M"),
-            "delivered": True,
+            "delivered": False,
             "read": False,
             "is_group": room.is_group,
             "attachment": {
@@ -121,6 +125,9 @@ async def upload_audio_message(
         except Exception as ws_error:
             print(f"Error notifying about audio message via WebSocket: {str(ws_error)}")
         
+        # Extract duration/waveform and transcode after the response has been sent
+        background_tasks.add_task(process_audio_message, new_message.id, str(file_path), file_url)
+        
         return {
             "success": True, 
             "message": message_response,
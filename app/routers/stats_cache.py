@@ -0,0 +1,118 @@
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from cachetools import TTLCache
+from typing import Callable, Dict, Tuple
+import asyncio
+import time
+import os
+
+from app.database import SessionLocal
+
+# Results are served as is for ADMIN_STATS_CACHE_TTL seconds, then served stale while one
+# background refresh runs, for up to ADMIN_STATS_STALE_TTL more seconds
+ADMIN_STATS_CACHE_TTL = float(os.getenv("ADMIN_STATS_CACHE_TTL", "30"))
+ADMIN_STATS_STALE_TTL = float(os.getenv("ADMIN_STATS_STALE_TTL", "300"))
+# Retention keys include any cohort date an admin asks for, so the number of entries is capped
+ADMIN_STATS_CACHE_SIZE = int(os.getenv("ADMIN_STATS_CACHE_SIZE", "256"))
+
+class StatsCache:
+    """
+    TTL cache with stale-while-revalidate and single-flight for dashboard statistics
+
+    However many admins poll at once, each key is computed by at most one
+    task at a time; everyone else waits for that result or gets the previous one.
+    """
+
+    def __init__(self, ttl: float = ADMIN_STATS_CACHE_TTL, stale_ttl: float = ADMIN_STATS_STALE_TTL,
+                 maxsize: int = ADMIN_STATS_CACHE_SIZE):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (result, time computed, seconds it took); entries past the stale window expire
+        self.entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl, timer=time.monotonic)
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    async def _compute(self, key: str, compute: Callable) -> Tuple[dict, float, float]:
+        def run():
+            db = SessionLocal()
+            try:
+                return compute(db)
+            finally:
+                db.close()
+
+        started = time.monotonic()
+        result = await run_in_threadpool(run)
+        duration = time.monotonic() - started
+        entry = (result, time.monotonic(), duration)
+        # Failures are returned to the waiting callers but never cached
+        if result.get("success", True):
+            self.entries[key] = entry
+        return entry
+
+    def _start(self, key: str, compute: Callable) -> asyncio.Task:
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute))
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self.inflight.pop(key, None)
+        # Background refreshes have no one awaiting them, so report their errors here
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error computing admin stats {key}: {task.exception()}")
+
+    async def get(self, key: str, compute: Callable) -> Tuple[dict, str, float, float]:
+        """
+        Cached result for key, computing it with compute(db) when needed
+
+        Returns:
+            (result, "HIT" / "STALE" / "MISS", age in seconds, compute time in seconds)
+        """
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            result, computed_at, duration = entry
+            age = now - computed_at
+            if age < self.ttl:
+                self.hits += 1
+                return result, "HIT", age, duration
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._start(key, compute)
+                return result, "STALE", age, duration
+
+        self.misses += 1
+        # Shielded so a client disconnecting does not cancel the computation others wait for
+        result, computed_at, duration = await asyncio.shield(self._start(key, compute))
+        return result, "MISS", time.monotonic() - computed_at, duration
+
+    def invalidate(self):
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        self.entries.expire()
+        return {
+            "keys": len(self.entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshing": len(self.inflight)
+        }
+
+stats_cache = StatsCache()
+
+async def cached_stats(response: Response, key: str, compute: Callable) -> dict:
+    """Serve a dashboard statistic from the cache, with cache status and timing headers"""
+    started = time.monotonic()
+    result, cache_status, age, duration = await stats_cache.get(key, compute)
+    response.headers["X-Cache"] = cache_status
+    response.headers["Age"] = str(int(age))
+    response.headers["Server-Timing"] = (
+        f'compute;dur={duration * 1000:.1f};desc="{cache_status}", '
+        f"total;dur={(time.monotonic() - started) * 1000:.1f}"
+    )
+    return result
@@ -0,0 +1,130 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, date
+from typing import Dict, Tuple
+import threading
+import os
+
+from app.routers.background import register_periodic_task
+from app.database import (
+    SessionLocal, User, Message, MessageHourlyRollup, UserDailyRollup, DailyRollup, RollupState
+)
+
+# Rows read from messages/users per batch, and batches per run (bounds the first backfill)
+STATS_ROLLUP_BATCH = int(os.getenv("STATS_ROLLUP_BATCH", "5000"))
+STATS_ROLLUP_MAX_BATCHES = int(os.getenv("STATS_ROLLUP_MAX_BATCHES", "50"))
+STATS_ROLLUP_INTERVAL = int(os.getenv("STATS_ROLLUP_INTERVAL", "60"))  # seconds
+
+# Keeps a run from the periodic task and one triggered elsewhere from double counting
+rollup_lock = threading.Lock()
+
+def get_state(db: Session, name: str) -> RollupState:
+    state = db.query(RollupState).filter(RollupState.name == name).first()
+    if state is None:
+        state = RollupState(name=name, last_id=0)
+        db.add(state)
+    return state
+
+def get_daily(db: Session, days: Dict[date, DailyRollup], day: date) -> DailyRollup:
+    if day not in days:
+        row = db.query(DailyRollup).filter(DailyRollup.day == day).first()
+        if row is None:
+            row = DailyRollup(day=day, message_count=0, active_users=0, registrations=0)
+            db.add(row)
+        days[day] = row
+    return days[day]
+
+def roll_up_messages(db: Session) -> int:
+    """Fold messages written since the last run into the rollups, one batch; returns rows read"""
+    state = get_state(db, "messages")
+    rows = db.query(Message.id, Message.room_id, Message.sender_id, Message.timestamp).filter(
+        Message.id > state.last_id
+    ).order_by(Message.id).limit(STATS_ROLLUP_BATCH).all()
+    if not rows:
+        return 0
+
+    hourly: Dict[Tuple[int, datetime], int] = {}
+    per_user: Dict[Tuple[date, int], int] = {}
+    for _, room_id, sender_id, timestamp in rows:
+        if timestamp is None:
+            continue
+        hour = timestamp.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+        hourly[(room_id, hour)] = hourly.get((room_id, hour), 0) + 1
+        per_user[(hour.date(), sender_id)] = per_user.get((hour.date(), sender_id), 0) + 1
+
+    # A batch covers few distinct hours and days, so the existing rows are loaded in one query each
+    existing_hourly = {
+        (row.room_id, row.hour): row
+        for row in db.query(MessageHourlyRollup).filter(
+            MessageHourlyRollup.hour.in_(list({hour for _, hour in hourly}))
+        ).all()
+    }
+    existing_per_user = {
+        (row.day, row.user_id): row
+        for row in db.query(UserDailyRollup).filter(
+            UserDailyRollup.day.in_(list({day for day, _ in per_user}))
+        ).all()
+    }
+
+    for (room_id, hour), count in hourly.items():
+        row = existing_hourly.get((room_id, hour))
+        if row is None:
+            db.add(MessageHourlyRollup(room_id=room_id, hour=hour, message_count=count))
+        else:
+            row.message_count += count
+
+    days: Dict[date, DailyRollup] = {}
+    for (day, user_id), count in per_user.items():
+        daily = get_daily(db, days, day)
+        daily.message_count += count
+        row = existing_per_user.get((day, user_id))
+        if row is None:
+            # First message of this user on this day
+            db.add(UserDailyRollup(day=day, user_id=user_id, message_count=count))
+            daily.active_users += 1
+        else:
+            row.message_count += count
+
+    state.last_id = rows[-1].id
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    return len(rows)
+
+def roll_up_registrations(db: Session) -> int:
+    """Count users registered since the last run, one batch; returns rows read"""
+    state = get_state(db, "registrations")
+    rows = db.query(User.id, User.registration_date).filter(
+        User.id > state.last_id
+    ).order_by(User.id).limit(STATS_ROLLUP_BATCH).all()
+    if not rows:
+        return 0
+
+    days: Dict[date, DailyRollup] = {}
+    for _, registration_date in rows:
+        if registration_date is not None:
+            get_daily(db, days, registration_date.date()).registrations += 1
+
+    state.last_id = rows[-1].id
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    return len(rows)
+
+def refresh_rollups():
+    """Background job: bring every rollup up to date with the source tables"""
+    if not rollup_lock.acquire(blocking=False):
+        return
+    db = SessionLocal()
+    try:
+        for _ in range(STATS_ROLLUP_MAX_BATCHES):
+            if not roll_up_messages(db):
+                break
+        for _ in range(STATS_ROLLUP_MAX_BATCHES):
+            if not roll_up_registrations(db):
+                break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        rollup_lock.release()
+
+register_periodic_task("refresh_stats_rollups", STATS_ROLLUP_INTERVAL, refresh_rollups)
@@ -0,0 +1,176 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, or_
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import json
+import os
+
+from app.routers.session import get_db, get_current_user
+from app.routers.background import register_periodic_task
+from app.routers.deletion_jobs import hidden_messages_filter
+from app.routers.tombstones import serialize_tombstone
+from app.routers.presence import presence_service
+from app.database import SessionLocal, User, Message, SyncEvent, room_members
+
+SYNC_PAGE_LIMIT = int(os.getenv("SYNC_PAGE_LIMIT", "200"))
+# Cursors older than this get a reset instead of a delta
+SYNC_EVENT_RETENTION_DAYS = int(os.getenv("SYNC_EVENT_RETENTION_DAYS", "14"))
+SYNC_PURGE_INTERVAL = int(os.getenv("SYNC_PURGE_INTERVAL", "3600"))  # seconds
+
+router = APIRouter(prefix="/api")
+
+def record_event(db: Session, type: str, payload: dict, room_id: Optional[int] = None,
+                 user_id: Optional[int] = None, subject_id: Optional[int] = None):
+    """
+    Add a change to the sync feed
+
+    The row is only added to the session - it is committed together with the
+    change it describes, so the feed never gets ahead of the data.
+    """
+    db.add(SyncEvent(
+        type=type,
+        room_id=room_id,
+        user_id=user_id,
+        subject_id=subject_id,
+        payload=json.dumps(payload),
+        created_at=datetime.utcnow()
+    ))
+
+def encode_cursor(message_id: int, event_id: int, issued_at: datetime) -> str:
+    return f"{message_id}.{event_id}.{int(issued_at.timestamp())}"
+
+def decode_cursor(cursor: str) -> Tuple[int, int, datetime]:
+    """Split a cursor into (last message ID, last event ID, time it was issued)"""
+    try:
+        message_id, event_id, issued_at = cursor.split(".")
+        return int(message_id), int(event_id), datetime.fromtimestamp(int(issued_at))
+    except (ValueError, OverflowError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync cursor")
+
+def head_cursor(db: Session) -> str:
+    """Cursor pointing at the current end of the message table and the feed"""
+    last_message_id = db.query(func.max(Message.id)).scalar() or 0
+    last_event_id = db.query(func.max(SyncEvent.id)).scalar() or 0
+    return encode_cursor(last_message_id, last_event_id, datetime.utcnow())
+
+# Everything that changed for the current user since a cursor
+@router.get("/sync")
+async def sync(
+    cursor: Optional[str] = None,
+    limit: int = SYNC_PAGE_LIMIT,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Return new messages, feed events and presence changes since `cursor`
+
+    Without a cursor, or with one older than the retention window, the response
+    has `reset: true` and the client should do a full load before syncing from
+    the returned cursor. While `has_more` is true, call again with `cursor`.
+    """
+    current_user = db.query(User).filter(User.username == username).first()
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    limit = max(1, min(limit, SYNC_PAGE_LIMIT))
+
+    if cursor:
+        last_message_id, last_event_id, since = decode_cursor(cursor)
+    if not cursor or since < datetime.utcnow() - timedelta(days=SYNC_EVENT_RETENTION_DAYS):
+        return {"reset": True, "cursor": head_cursor(db), "has_more": False,
+                "messages": [], "events": [], "presence": []}
+
+    my_room_ids = db.query(room_members.c.room_id).filter(
+        room_members.c.user_id == current_user.id
+    ).scalar_subquery()
+    contact_ids = db.query(room_members.c.user_id).filter(
+        room_members.c.room_id.in_(my_room_ids)
+    ).scalar_subquery()
+
+    # New messages in any of the user's rooms (one extra row tells whether there are more)
+    messages_query = db.query(Message).filter(
+        Message.id > last_message_id,
+        Message.room_id.in_(my_room_ids)
+    )
+    hidden = hidden_messages_filter()
+    if hidden is not None:
+        messages_query = messages_query.filter(hidden)
+    messages = messages_query.order_by(Message.id).limit(limit + 1).all()
+
+    events = db.query(SyncEvent).filter(
+        SyncEvent.id > last_event_id,
+        or_(
+            SyncEvent.room_id.in_(my_room_ids),
+            SyncEvent.user_id == current_user.id,
+            SyncEvent.subject_id.in_(contact_ids)
+        )
+    ).order_by(SyncEvent.id).limit(limit + 1).all()
+
+    has_more = len(messages) > limit or len(events) > limit
+    messages = messages[:limit]
+    events = events[:limit]
+
+    # Contacts whose status changed since the cursor was issued
+    presence = presence_service.changed_since(
+        db, and_(User.id.in_(contact_ids), User.id != current_user.id), since
+    )
+
+    # The presence window only moves forward once the whole delta has been read
+    next_cursor = encode_cursor(
+        messages[-1].id if messages else last_message_id,
+        events[-1].id if events else last_event_id,
+        since if has_more else datetime.utcnow()
+    )
+
+    return {
+        "reset": False,
+        "cursor": next_cursor,
+        "has_more": has_more,
+        "messages": [
+            serialize_tombstone(message) if message.deleted_at is not None else {
+                "id": message.id,
+                "room_id": message.room_id,
+                "sender_id": message.sender_id,
+                "content": message.content,
+                "timestamp": message.timestamp.isoformat(),
+                "delivered": message.delivered,
+                "read": message.read
+            }
+            for message in messages
+        ],
+        "events": [
+            {
+                "id": event.id,
+                "type": event.type,
+                "room_id": event.room_id,
+                "user_id": event.subject_id or event.user_id,
+                "data": json.loads(event.payload),
+                "at": event.created_at.isoformat()
+            }
+            for event in events
+        ],
+        "presence": [
+            {
+                "user_id": user_id,
+                "status": "online" if is_online else "offline",
+                "last_seen": last_seen.isoformat() if last_seen else None
+            }
+            for user_id, (is_online, last_seen) in presence.items()
+        ]
+    }
+
+def purge_sync_events():
+    """Delete feed rows older than the retention window"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(SyncEvent).filter(
+            SyncEvent.created_at < datetime.utcnow() - timedelta(days=SYNC_EVENT_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            print(f"Purged {deleted} sync events")
+    finally:
+        db.close()
+
+register_periodic_task("purge_sync_events", SYNC_PURGE_INTERVAL, purge_sync_events)
@@ -0,0 +1,73 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Set
+import os
+
+from app.routers.background import register_periodic_task
+from app.routers.archive import delete_messages
+from app.routers.deletion_jobs import message_files
+from app.database import SessionLocal, Message, MessageTranslation, AudioMetadata
+
+# Deleted messages stay as tombstones this long, so offline clients and sync cursors
+# still learn about the deletion, then the rows are purged
+MESSAGE_TOMBSTONE_RETENTION_DAYS = int(os.getenv("MESSAGE_TOMBSTONE_RETENTION_DAYS", "30"))
+MESSAGE_TOMBSTONE_PURGE_INTERVAL = int(os.getenv("MESSAGE_TOMBSTONE_PURGE_INTERVAL", "3600"))  # seconds
+MESSAGE_TOMBSTONE_PURGE_BATCH = 500
+
+def soft_delete_message(db: Session, message: Message) -> Set[str]:
+    """
+    Turn a message into a tombstone, without committing
+
+    The content is blanked, which also drops it from the search index through
+    the update trigger. Translations and voice metadata are removed.
+
+    Returns:
+        Upload URLs the message referenced, to be removed once the change is committed
+    """
+    urls = message_files(db, [(message.id, message.content)])
+
+    message.deleted_at = datetime.utcnow()
+    message.content = ""
+    message.original_content = None
+    message.is_translated = False
+    message.translated_at = None
+    message.translated_to = None
+
+    db.query(MessageTranslation).filter(MessageTranslation.message_id == message.id).delete()
+    db.query(AudioMetadata).filter(AudioMetadata.message_id == message.id).delete()
+    return urls
+
+def serialize_tombstone(message: Message) -> dict:
+    """What clients get in place of a deleted message"""
+    return {
+        "id": message.id,
+        "room_id": message.room_id,
+        "sender_id": message.sender_id,
+        "content": None,
+        "timestamp": message.timestamp.isoformat(),
+        "time": message.timestamp.strftime("%H:%M"),
+        "deleted": True,
+        "deleted_at": message.deleted_at.isoformat()
+    }
+
+def purge_tombstones():
+    """Delete tombstones older than the retention window, in batches"""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=MESSAGE_TOMBSTONE_RETENTION_DAYS)
+        purged = 0
+        while True:
+            message_ids = [row.id for row in db.query(Message.id).filter(
+                Message.deleted_at < cutoff
+            ).limit(MESSAGE_TOMBSTONE_PURGE_BATCH).all()]
+            if not message_ids:
+                break
+            delete_messages(db, message_ids)
+            db.commit()
+            purged += len(message_ids)
+        if purged:
+            print(f"Purged {purged} deleted message tombstones")
+    finally:
+        db.close()
+
+register_periodic_task("purge_tombstones", MESSAGE_TOMBSTONE_PURGE_INTERVAL, purge_tombstones)
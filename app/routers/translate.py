@@ -2,24 +2,31 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
-import os
-import httpx
+from typing import Optional, List
 from datetime import datetime
+import os
 
 from app.routers.session import get_db, get_current_user
-from app.database import Message, User
+from app.database import Message, User, MessageTranslation, room_members, upsert
+from app.routers.translation_cache import translation_cache
+from app.routers.translation_client import translation_client, TranslationServiceError
 
 # Create router
 router = APIRouter(prefix="/api")
 
-# Load DeepL API key from environment variable
-DEEPL_API_KEY = os.getenv("DEEPL_API_KEY", "")
-DEEPL_API_URL = "https://api-free.deepl.com/v2/translate"
+# Maximum number of messages accepted by the batch endpoint (DeepL allows 50 texts per request)
+TRANSLATION_BATCH_MAX = int(os.getenv("TRANSLATION_BATCH_MAX", "50"))
+
+# Attachment messages only hold markup, so they are never sent to the provider
+ATTACHMENT_PREFIXES = ("<img-attachment", "<video-attachment", "<audio-attachment", "<doc-attachment")
 
 class TranslateRequest(BaseModel):
     message_id: Optional[int] = None
-    text: str
+    text: str = ""  # Ignored when message_id is given
+    target_lang: str
+
+class BatchTranslateRequest(BaseModel):
+    message_ids: List[int]
     target_lang: str
 
 @router.post("/translate")
@@ -37,80 +44,235 @@ async def translate_text(
             detail="Invalid authentication credentials"
         )
     
-    # Check if text is provided
-    if not request.text or not request.target_lang:
+    if not request.target_lang:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Text and target language are required"
         )
     
-    # Check if DeepL API key is configured
-    if not DEEPL_API_KEY:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Translation service is not configured"
-        )
-    
-    # Check if message_id is provided and message exists
+    # For a stored message the text comes from the message itself, never from the client,
+    # because the result is kept as that message's translation for every viewer
     message = None
     if request.message_id:
-        message = db.query(Message).filter(Message.id == request.message_id).first()
+        message = db.query(Message).filter(
+            Message.id == request.message_id,
+            Message.deleted_at.is_(None)
+        ).first()
         if not message:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Message not found"
             )
+        
+        is_member = db.query(room_members).filter(
+            room_members.c.room_id == message.room_id,
+            room_members.c.user_id == user.id
+        ).first() is not None
+        if not is_member:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not a member of this room"
+            )
+        
+        source_text = message.original_content or message.content
+        if not source_text or source_text.startswith(ATTACHMENT_PREFIXES):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This message has no text to translate"
+            )
+    else:
+        source_text = request.text
+        if not source_text:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Text and target language are required"
+            )
+    
+    target_lang = request.target_lang.upper()
+    
+    # A message already translated to this language for another viewer is reused as is
+    stored_translation = None
+    if message:
+        stored_translation = db.query(MessageTranslation).filter(
+            MessageTranslation.message_id == message.id,
+            MessageTranslation.lang == target_lang
+        ).first()
+    
+    # Serve repeat translations from the cache without calling DeepL
+    if stored_translation:
+        translated_text = stored_translation.translated_text
+    else:
+        translated_text = translation_cache.get(db, source_text, target_lang)
+    from_cache = translated_text is not None
+    
+    # Check if DeepL API key is configured
+    if not from_cache and not translation_client.is_configured:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Translation service is not configured"
+        )
     
     try:
-        # Call DeepL API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                DEEPL_API_URL,
-                data={
-                    "auth_key": DEEPL_API_KEY,
-                    "text": request.text,
-                    "target_lang": request.target_lang
-                }
-            )
-            
-            # Check response
-            if response.status_code != 200:
+        if not from_cache:
+            # Call DeepL API through the shared pooled client
+            try:
+                translated_text = (await translation_client.translate([source_text], target_lang))[0]
+            except TranslationServiceError as e:
                 raise HTTPException(
                     status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail=f"Translation service error: {response.text}"
+                    detail=str(e)
                 )
             
-            # Extract translation from response
-            translation_data = response.json()
-            translated_text = translation_data["translations"][0]["text"]
-            
-            # Update message in database if message_id was provided
-            if message:
-                # Only update if translation is successful
-                if translated_text:
-                    # If this is the first translation, store the original text
-                    if not message.original_content:
-                        message.original_content = message.content
-                    
-                    message.content = translated_text
-                    message.is_translated = True
-                    message.translated_at = datetime.utcnow()
-                    message.translated_to = request.target_lang
-                    db.commit()
-            
-            return {
-                "success": True,
+            if translated_text:
+                translation_cache.set(db, source_text, target_lang, translated_text)
+        
+        # Store the translation next to the message - the message row itself is never rewritten,
+        # so other members keep seeing the original and no write lands on the hot message row
+        if message and translated_text and not stored_translation:
+            upsert(db, MessageTranslation, [{
+                "message_id": message.id,
+                "lang": target_lang,
                 "translated_text": translated_text,
-                "source_text": request.text,
-                "target_lang": request.target_lang
-            }
-            
+                "created_at": datetime.utcnow()
+            }], ["message_id", "lang"])
+            db.commit()
+        
+        return {
+            "success": True,
+            "translated_text": translated_text,
+            "source_text": source_text,
+            "target_lang": request.target_lang,
+            "cached": from_cache
+        }
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Translation failed: {str(e)}"
         )
 
+@router.post("/translate/batch")
+async def translate_messages_batch(
+    request: BatchTranslateRequest,
+    username: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Translate a page of messages with at most one DeepL request"""
+    # Verify the user
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    
+    if not request.message_ids or not request.target_lang:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message IDs and target language are required"
+        )
+    
+    if len(request.message_ids) > TRANSLATION_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {TRANSLATION_BATCH_MAX} messages can be translated at once"
+        )
+    
+    # Only messages from rooms the user belongs to can be translated
+    messages = db.query(Message).join(
+        room_members, room_members.c.room_id == Message.room_id
+    ).filter(
+        Message.id.in_(request.message_ids),
+        Message.deleted_at.is_(None),
+        room_members.c.user_id == user.id
+    ).all()
+    messages_by_id = {message.id: message for message in messages}
+    
+    target_lang = request.target_lang.upper()
+    translations = {}
+    
+    # Translations stored for these messages by earlier viewers
+    stored = db.query(MessageTranslation).filter(
+        MessageTranslation.message_id.in_(list(messages_by_id.keys())),
+        MessageTranslation.lang == target_lang
+    ).all()
+    for row in stored:
+        translations[row.message_id] = {"translated_text": row.translated_text, "cached": True}
+    
+    # Translate the original text even if the message was translated before
+    source_texts = {}
+    for message_id in request.message_ids:
+        message = messages_by_id.get(message_id)
+        if not message or message_id in translations:
+            continue
+        source_text = message.original_content or message.content
+        if source_text and not source_text.startswith(ATTACHMENT_PREFIXES):
+            source_texts[message_id] = source_text
+    
+    # Serve cache hits directly
+    cached = translation_cache.get_many(db, list(set(source_texts.values())), target_lang)
+    
+    pending = {}  # source text -> message IDs waiting for it
+    for message_id, source_text in source_texts.items():
+        if source_text in cached:
+            translations[message_id] = {"translated_text": cached[source_text], "cached": True}
+        else:
+            pending.setdefault(source_text, []).append(message_id)
+    
+    # Send all misses to the provider in one multi-text request
+    upstream_requests = 0
+    if pending:
+        if not translation_client.is_configured:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Translation service is not configured"
+            )
+        
+        texts_to_translate = list(pending.keys())
+        try:
+            upstream_requests = 1
+            translated_texts = await translation_client.translate(texts_to_translate, target_lang)
+        except TranslationServiceError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e)
+            )
+        
+        translation_cache.set_many(db, dict(zip(texts_to_translate, translated_texts)), target_lang)
+        for source_text, translated_text in zip(texts_to_translate, translated_texts):
+            for message_id in pending[source_text]:
+                translations[message_id] = {"translated_text": translated_text, "cached": False}
+    
+    # Keep per-message translations so later viewers skip even the hash lookup; a concurrent
+    # viewer of the same page may have stored them first, in which case theirs is kept
+    new_rows = [
+        {
+            "message_id": message_id,
+            "lang": target_lang,
+            "translated_text": translations[message_id]["translated_text"],
+            "created_at": datetime.utcnow()
+        }
+        for message_id in source_texts
+        if message_id in translations
+    ]
+    if new_rows:
+        upsert(db, MessageTranslation, new_rows, ["message_id", "lang"])
+        db.commit()
+    
+    return {
+        "success": True,
+        "target_lang": request.target_lang,
+        "translations": [
+            {"message_id": message_id, **translations[message_id]}
+            for message_id in request.message_ids
+            if message_id in translations
+        ],
+        "missing": [message_id for message_id in request.message_ids if message_id not in messages_by_id],
+        "upstream_requests": upstream_requests
+    }
+
 @router.post("/translate/restore/{message_id}")
 async def restore_original_text(
     message_id: int,
@@ -127,21 +289,31 @@ async def restore_original_text(
         )
     
     # Find the message
-    message = db.query(Message).filter(Message.id == message_id).first()
+    message = db.query(Message).filter(Message.id == message_id, Message.deleted_at.is_(None)).first()
     if not message:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Message not found"
         )
     
-    # Check if message has been translated
+    # Translations are stored per language now, so the original is simply the message content
     if not message.is_translated or not message.original_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Message has not been translated"
-        )
+        has_translation = db.query(MessageTranslation).filter(
+            MessageTranslation.message_id == message_id
+        ).first() is not None
+        if not has_translation:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Message has not been translated"
+            )
+        
+        return {
+            "success": True,
+            "original_text": message.content,
+            "translated_text": None
+        }
     
-    # Restore original content
+    # Restore original content of messages translated in place by older versions
     translated_content = message.content
     message.content = message.original_content
     message.is_translated = False
@@ -155,3 +327,14 @@ async def restore_original_text(
         "original_text": message.content,
         "translated_text": translated_content
     }
+
+@router.get("/translate/cache/stats")
+async def get_translation_cache_stats(username: str = Depends(get_current_user)):
+    """Get translation cache hit/miss metrics"""
+    return {
+        "success": True,
+        "data": {
+            **translation_cache.get_stats(),
+            "client": translation_client.get_stats()
+        }
+    }
@@ -0,0 +1,146 @@
+from sqlalchemy.orm import Session
+from cachetools import TTLCache
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List
+import hashlib
+import os
+
+from app.routers.background import register_periodic_task
+from app.database import SessionLocal, TranslationCacheEntry, upsert
+
+# In-process tier: bounded LRU with per-entry TTL
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "10000"))
+TRANSLATION_CACHE_MEMORY_TTL = int(os.getenv("TRANSLATION_CACHE_MEMORY_TTL", "3600"))  # 1 hour
+# Persistent tier: rows older than this are treated as misses and removed
+TRANSLATION_CACHE_TTL_DAYS = int(os.getenv("TRANSLATION_CACHE_TTL_DAYS", "30"))
+TRANSLATION_CACHE_PURGE_INTERVAL = int(os.getenv("TRANSLATION_CACHE_PURGE_INTERVAL", "3600"))  # seconds
+
+def hash_text(text: str) -> str:
+    """Hash message text so the cache key does not depend on its length"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class TranslationCache:
+    """Two-tier cache of translations keyed by (text hash, target language)"""
+
+    def __init__(self, maxsize: int = TRANSLATION_CACHE_SIZE, ttl: int = TRANSLATION_CACHE_MEMORY_TTL):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, text: str, target_lang: str) -> Optional[str]:
+        """Return a cached translation or None, checking memory before the database"""
+        key = (hash_text(text), target_lang.upper())
+
+        translated_text = self.memory.get(key)
+        if translated_text is not None:
+            self.memory_hits += 1
+            return translated_text
+
+        entry = db.query(TranslationCacheEntry).filter(
+            TranslationCacheEntry.text_hash == key[0],
+            TranslationCacheEntry.target_lang == key[1]
+        ).first()
+
+        if entry and entry.expires_at > datetime.utcnow():
+            self.db_hits += 1
+            self.memory[key] = entry.translated_text
+            return entry.translated_text
+
+        if entry:
+            # Expired - drop it so the next translation can replace it
+            db.delete(entry)
+            db.commit()
+
+        self.misses += 1
+        return None
+
+    def get_many(self, db: Session, texts: List[str], target_lang: str) -> Dict[str, str]:
+        """Look up several texts at once, with a single query for the persistent tier"""
+        target_lang = target_lang.upper()
+        found = {}
+        missing = {}  # text hash -> text
+
+        for text in texts:
+            translated_text = self.memory.get((hash_text(text), target_lang))
+            if translated_text is not None:
+                self.memory_hits += 1
+                found[text] = translated_text
+            else:
+                missing[hash_text(text)] = text
+
+        if missing:
+            entries = db.query(TranslationCacheEntry).filter(
+                TranslationCacheEntry.text_hash.in_(list(missing.keys())),
+                TranslationCacheEntry.target_lang == target_lang,
+                TranslationCacheEntry.expires_at > datetime.utcnow()
+            ).all()
+            for entry in entries:
+                self.db_hits += 1
+                self.memory[(entry.text_hash, target_lang)] = entry.translated_text
+                found[missing.pop(entry.text_hash)] = entry.translated_text
+
+        self.misses += len(missing)
+        return found
+
+    def set_many(self, db: Session, translations: Dict[str, str], target_lang: str) -> None:
+        """Store several translations with a single upsert and commit"""
+        target_lang = target_lang.upper()
+        now = datetime.utcnow()
+        rows = []
+
+        for text, translated_text in translations.items():
+            text_hash = hash_text(text)
+            self.memory[(text_hash, target_lang)] = translated_text
+            rows.append({
+                "text_hash": text_hash,
+                "target_lang": target_lang,
+                "translated_text": translated_text,
+                "created_at": now,
+                "expires_at": now + timedelta(days=TRANSLATION_CACHE_TTL_DAYS)
+            })
+        # Concurrent misses for the same text both write; the last one wins instead of failing
+        upsert(db, TranslationCacheEntry, rows, ["text_hash", "target_lang"],
+               update=["translated_text", "created_at", "expires_at"])
+        db.commit()
+
+    def set(self, db: Session, text: str, target_lang: str, translated_text: str) -> None:
+        """Store a translation in both tiers"""
+        self.set_many(db, {text: translated_text}, target_lang)
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete expired rows from the persistent tier"""
+        deleted = db.query(TranslationCacheEntry).filter(
+            TranslationCacheEntry.expires_at <= datetime.utcnow()
+        ).delete()
+        db.commit()
+        return deleted
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_capacity": self.memory.maxsize
+        }
+
+# Shared instance used by the translation endpoints
+translation_cache = TranslationCache()
+
+def purge_translation_cache():
+    """Periodic removal of expired persistent cache rows"""
+    db = SessionLocal()
+    try:
+        deleted = translation_cache.purge_expired(db)
+        if deleted:
+            print(f"Purged {deleted} expired translation cache entries")
+    finally:
+        db.close()
+
+register_periodic_task("purge_translation_cache", TRANSLATION_CACHE_PURGE_INTERVAL, purge_translation_cache)
@@ -0,0 +1,173 @@
+from typing import List, Optional
+import asyncio
+import random
+import time
+import os
+import httpx
+
+# DeepL endpoint and key - the URL can point at a local stub server for benchmarks
+DEEPL_API_KEY = os.getenv("DEEPL_API_KEY", "")
+DEEPL_API_URL = os.getenv("DEEPL_API_URL", "https://api-free.deepl.com/v2/translate")
+
+# Connection pool and request limits
+TRANSLATION_TIMEOUT = float(os.getenv("TRANSLATION_TIMEOUT", "10"))               # seconds per request
+TRANSLATION_CONNECT_TIMEOUT = float(os.getenv("TRANSLATION_CONNECT_TIMEOUT", "3"))
+TRANSLATION_MAX_CONNECTIONS = int(os.getenv("TRANSLATION_MAX_CONNECTIONS", "10"))
+TRANSLATION_MAX_CONCURRENCY = int(os.getenv("TRANSLATION_MAX_CONCURRENCY", "8"))
+# Retry policy for transient failures (network errors, 429, 5xx)
+TRANSLATION_MAX_RETRIES = int(os.getenv("TRANSLATION_MAX_RETRIES", "2"))
+TRANSLATION_BACKOFF_BASE = float(os.getenv("TRANSLATION_BACKOFF_BASE", "0.25"))   # seconds
+# Circuit breaker: stop calling the provider after repeated failures
+TRANSLATION_BREAKER_THRESHOLD = int(os.getenv("TRANSLATION_BREAKER_THRESHOLD", "5"))
+TRANSLATION_BREAKER_RESET = float(os.getenv("TRANSLATION_BREAKER_RESET", "30"))   # seconds
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TranslationServiceError(Exception):
+    """Raised when the translation provider cannot return a translation"""
+
+class CircuitOpenError(TranslationServiceError):
+    """Raised when calls are short-circuited because the provider keeps failing"""
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures, half-open after a cooldown"""
+
+    def __init__(self, failure_threshold: int = TRANSLATION_BREAKER_THRESHOLD,
+                 reset_timeout: float = TRANSLATION_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Closed and half-open circuits let requests through"""
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            # Trial request failed or too many failures in a row - (re)open the circuit
+            self.opened_at = time.monotonic()
+
+class TranslationClient:
+    """Application-lifetime DeepL client with keep-alive pooling"""
+
+    def __init__(self, api_url: str = DEEPL_API_URL, api_key: str = DEEPL_API_KEY,
+                 timeout: float = TRANSLATION_TIMEOUT,
+                 max_connections: int = TRANSLATION_MAX_CONNECTIONS,
+                 max_concurrency: int = TRANSLATION_MAX_CONCURRENCY,
+                 max_retries: int = TRANSLATION_MAX_RETRIES,
+                 backoff_base: float = TRANSLATION_BACKOFF_BASE,
+                 breaker: CircuitBreaker = None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout, connect=TRANSLATION_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Counters for monitoring and benchmarks
+        self.requests_sent = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        """
+        Translate one or more texts in a single provider request
+
+        Returns:
+            Translated texts in the same order as the input
+        """
+        if not texts:
+            return []
+
+        # DeepL accepts the "text" field repeated once per text to translate
+        data = {"auth_key": self.api_key, "target_lang": target_lang, "text": list(texts)}
+
+        last_error = None
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                # Checked per attempt so queued requests also fail fast once the circuit opens
+                if not self.breaker.allow_request():
+                    self.failures += 1
+                    raise CircuitOpenError("Translation service is temporarily unavailable")
+
+                if attempt:
+                    self.retries += 1
+                    # Exponential backoff with jitter so retries from many requests spread out
+                    delay = self.backoff_base * (2 ** (attempt - 1))
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+
+                try:
+                    self.requests_sent += 1
+                    response = await self._get_client().post(self.api_url, data=data)
+                except httpx.HTTPError as e:
+                    last_error = f"{type(e).__name__}: {e}"
+                    continue
+
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    continue
+
+                if response.status_code != 200:
+                    # Client errors (bad key, bad language) will not succeed on retry
+                    self.failures += 1
+                    raise TranslationServiceError(f"Translation service error: {response.text[:200]}")
+
+                try:
+                    translations = [item["text"] for item in response.json()["translations"]]
+                except (KeyError, TypeError, ValueError) as e:
+                    last_error = f"Malformed response: {e}"
+                    break
+
+                self.breaker.record_success()
+                return translations
+
+        self.failures += 1
+        self.breaker.record_failure()
+        raise TranslationServiceError(f"Translation service error: {last_error}")
+
+    def get_stats(self) -> dict:
+        return {
+            "requests_sent": self.requests_sent,
+            "retries": self.retries,
+            "failures": self.failures,
+            "circuit_state": self.breaker.state
+        }
+
+    async def close(self):
+        """Close pooled connections (called on application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Shared instance used by the translation endpoints
+translation_client = TranslationClient()
@@ -0,0 +1,178 @@
+from fastapi import HTTPException, status
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from cachetools import TTLCache
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+import base64
+import csv
+import io
+import json
+import os
+
+from app.database import SessionLocal, User
+
+# How long the total of a filtered user list is reused before being counted again
+ADMIN_USER_COUNT_TTL = int(os.getenv("ADMIN_USER_COUNT_TTL", "60"))  # seconds
+ADMIN_USER_EXPORT_BATCH = int(os.getenv("ADMIN_USER_EXPORT_BATCH", "1000"))
+
+user_count_cache = TTLCache(maxsize=256, ttl=ADMIN_USER_COUNT_TTL)
+
+CSV_COLUMNS = ["id", "username", "email", "full_name", "country", "is_online", "last_seen", "registered_date"]
+# Spreadsheets run cells starting with these as formulas
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+class UserFilters:
+    """Filters of the admin user list, shared by the paged list and the CSV export"""
+
+    def __init__(
+        self,
+        search: Optional[str] = None,
+        online: Optional[bool] = None,
+        country: Optional[str] = None,
+        registered_from: Optional[date] = None,
+        registered_to: Optional[date] = None
+    ):
+        self.search = search.strip().lower() if search and search.strip() else None
+        self.online = online
+        self.country = country.strip() if country and country.strip() else None
+        self.registered_from = registered_from
+        self.registered_to = registered_to
+
+    def key(self) -> tuple:
+        return (self.search, self.online, self.country, self.registered_from, self.registered_to)
+
+    def search_condition(self):
+        """
+        Case-insensitive substring match on username or email
+
+        Names that merely start with the search are substring hits too, so "ann"
+        lists both "anna" and "joanne".
+        """
+        return or_(
+            func.lower(User.username).contains(self.search, autoescape=True),
+            func.lower(User.email).contains(self.search, autoescape=True)
+        )
+
+    def apply(self, query):
+        if self.search:
+            query = query.filter(self.search_condition())
+        if self.online is not None:
+            query = query.filter(User.is_online == self.online)
+        if self.country:
+            query = query.filter(User.country == self.country)
+        if self.registered_from:
+            query = query.filter(User.registration_date >= datetime.combine(self.registered_from, datetime.min.time()))
+        if self.registered_to:
+            query = query.filter(
+                User.registration_date < datetime.combine(self.registered_to + timedelta(days=1), datetime.min.time())
+            )
+        return query
+
+def sort_column(sort: str):
+    """
+    Column the list is ordered and paged by
+
+    IDs are assigned in registration order, so "registered" pages by the primary key.
+    Usernames are unique, so neither needs a tie-breaker.
+    """
+    if sort == "registered":
+        return User.id
+    if sort == "username":
+        return User.username
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Sort must be registered or username")
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def validate_sort(sort: str, order: str):
+    sort_column(sort)
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order must be asc or desc")
+
+def ordered(query, sort: str, order: str, after=None):
+    """Order by the sort column, continuing after the given key when paging"""
+    validate_sort(sort, order)
+    column = sort_column(sort)
+    if after is not None:
+        query = query.filter(column > after if order == "asc" else column < after)
+    return query.order_by(column.asc() if order == "asc" else column.desc())
+
+def sort_key(user: User, sort: str):
+    return user.id if sort == "registered" else user.username
+
+def count_users(db: Session, filters: UserFilters) -> int:
+    """Total for the filters, counted at most once per ADMIN_USER_COUNT_TTL"""
+    key = filters.key()
+    total = user_count_cache.get(key)
+    if total is None:
+        total = filters.apply(db.query(func.count(User.id))).scalar() or 0
+        user_count_cache[key] = total
+    return total
+
+def invalidate_user_counts():
+    user_count_cache.clear()
+
+def csv_text(value: Optional[str]) -> str:
+    """A user-supplied cell, quoted so spreadsheets show it as text instead of running it"""
+    if value and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value or ""
+
+def csv_row(user) -> list:
+    return [
+        user.id,
+        csv_text(user.username),
+        csv_text(user.email),
+        csv_text(user.full_name),
+        csv_text(user.country),
+        "yes" if user.is_online else "no",
+        user.last_seen.isoformat() if user.last_seen else "",
+        user.registration_date.isoformat() if user.registration_date else ""
+    ]
+
+def iter_users_csv(filters: UserFilters, sort: str, order: str) -> Iterator[str]:
+    """
+    CSV of every user matching the filters
+
+    Reads keyset batches in short transactions of its own, like the room export,
+    so a large deployment never holds a read transaction for the whole download.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+
+    db = SessionLocal()
+    try:
+        after = None
+        while True:
+            batch = ordered(
+                filters.apply(db.query(
+                    User.id, User.username, User.email, User.full_name, User.country,
+                    User.is_online, User.last_seen, User.registration_date
+                )),
+                sort, order, after
+            ).limit(ADMIN_USER_EXPORT_BATCH).all()
+            db.rollback()
+            if not batch:
+                break
+            for user in batch:
+                writer.writerow(csv_row(user))
+            yield flush()
+            after = sort_key(batch[-1], sort)
+    finally:
+        db.close()
@@ -0,0 +1,109 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from typing import List, Set
+
+from app.database import engine
+
+USER_SEARCH_LIMIT = 10
+
+# SQLite: trigram FTS5 table over users.username/full_name for substring matches,
+# kept in sync by triggers (registration, profile edits, admin changes, deletes)
+SQLITE_USER_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, full_name, content='users', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, full_name) VALUES (new.id, new.username, new.full_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name)
+        VALUES ('delete', old.id, old.username, old.full_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, full_name ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name)
+        VALUES ('delete', old.id, old.username, old.full_name);
+        INSERT INTO users_fts(rowid, username, full_name) VALUES (new.id, new.username, new.full_name);
+    END
+    """,
+]
+
+# PostgreSQL: pg_trgm GIN indexes let ILIKE '%q%' use an index
+POSTGRES_USER_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING GIN (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING GIN (full_name gin_trgm_ops)",
+]
+
+def ensure_user_search_index(bind=engine):
+    """Create the user search index for the current backend, backfilling existing users"""
+    dialect = bind.dialect.name
+    try:
+        with bind.begin() as conn:
+            if dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+                )).first() is not None
+                for statement in SQLITE_USER_SEARCH_DDL:
+                    conn.execute(text(statement))
+                if not exists:
+                    conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                for statement in POSTGRES_USER_SEARCH_DDL:
+                    conn.execute(text(statement))
+    except Exception as e:
+        # Search still works without the index, just slower
+        print(f"User search: could not create search index: {e}")
+
+ensure_user_search_index()
+
+def search_user_ids(db: Session, query: str, exclude_ids: Set[int], limit: int = USER_SEARCH_LIMIT) -> List[int]:
+    """
+    Find users whose username or full name contains the query
+
+    Username prefix matches come first (they use the username index), then
+    substring matches on username or full name from the trigram index.
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    # Over-fetch so excluded users do not leave the page short
+    fetch = limit + len(exclude_ids)
+    found: List[int] = []
+
+    def add(rows):
+        for (user_id,) in rows:
+            if user_id not in exclude_ids and user_id not in found and len(found) < limit:
+                found.append(user_id)
+
+    # Prefix range on the unique username index
+    add(db.execute(text(
+        "SELECT id FROM users WHERE username >= :low AND username < :high ORDER BY username LIMIT :fetch"
+    ), {"low": query, "high": query + "\uffff", "fetch": fetch}))
+    if len(found) >= limit:
+        return found
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and len(query) >= 3:
+        # A quoted phrase is matched as a substring by the trigram tokenizer (case-insensitive)
+        phrase = '"' + query.replace('"', '""') + '"'
+        add(db.execute(text(
+            "SELECT rowid FROM users_fts WHERE users_fts MATCH :phrase LIMIT :fetch"
+        ), {"phrase": phrase, "fetch": fetch + len(found)}))
+    else:
+        # Short queries (or backends without FTS5) - on PostgreSQL pg_trgm serves the ILIKE
+        like = "ILIKE" if dialect == "postgresql" else "LIKE"
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        add(db.execute(text(
+            f"SELECT id FROM users WHERE username {like} :pattern ESCAPE '\\' "
+            f"OR full_name {like} :pattern ESCAPE '\\' LIMIT :fetch"
+        ), {"pattern": pattern, "fetch": fetch + len(found)}))
+
+    return found
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_
 
 # Updated imports to use the new location and updated models
 from app.routers.session import get_db, get_current_user, active_connections, id_to_username
 from app.database import User, Room, Message, GroupChat, room_members
+from app.routers.presence import presence_service
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -41,24 +43,17 @@ async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
         "country": user.country or "Not provided",
         "phone_number": user.phone_number or "Not provided",
         "bio": user.bio or "",
-        "status": "online" if user.is_online else "offline"
+        "status": presence_service.status(user.id)
     }
 
 @router.get("/api/user/{user_id}/status")
-async def get_user_status(user_id: int, db: Session = Depends(get_db)):
-    """Get user's online status"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def get_user_status(user_id: int):
+    """Get user's online status (from the presence service, no database query for known users)"""
+    # Users not seen yet are read from the database, off the event loop
+    user_status = await run_in_threadpool(presence_service.lookup, user_id)
+    if not user_status:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    # Check if user is in active_connections dictionary or in id_to_username mapping
-    is_online = (user.username in active_connections and len(active_connections[user.username]) > 0) or user.is_online
-    
-    return {
-        "user_id": user_id,
-        "username": user.username,
-        "status": "online" if is_online else "offline"
-    }
+    return user_status
 
 @router.get("/chat", response_class=HTMLResponse)
 async def chat_page(request: Request, username: str = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -92,18 +87,20 @@ async def chat_page(request: Request, username: str = Depends(get_current_user),
             
             if other_member:
                 # Check if other user is online
-                connection_status = "online" if other_member.username in active_connections else "offline"
+                connection_status = presence_service.status(other_member.id)
                 
                 # Get last message in room if any
                 last_message = db.query(Message).filter(
-                    Message.room_id == room.id
+                    Message.room_id == room.id,
+                    Message.deleted_at.is_(None)
                 ).order_by(Message.timestamp.desc()).first()
                 
                 # Count unread messages
                 unread_count = db.query(Message).filter(
                     Message.room_id == room.id,
                     Message.sender_id != current_user.id,
-                    Message.read == False
+                    Message.read == False,
+                    Message.deleted_at.is_(None)
                 ).count()
                 
                 room_data = {
@@ -132,14 +129,16 @@ async def chat_page(request: Request, username: str = Depends(get_current_user),
                 
                 # Get last message in group if any
                 last_message = db.query(Message).filter(
-                    Message.room_id == room.id
+                    Message.room_id == room.id,
+                    Message.deleted_at.is_(None)
                 ).order_by(Message.timestamp.desc()).first()
                 
                 # Count unread messages
                 unread_count = db.query(Message).filter(
                     Message.room_id == room.id,
                     Message.sender_id != current_user.id,
-                    Message.read == False
+                    Message.read == False,
+                    Message.deleted_at.is_(None)
                 ).count()
                 
                 room_data = {
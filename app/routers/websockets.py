@@ -1,5 +1,6 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, not_
 from typing import Dict, List, Set, Optional
@@ -14,7 +15,21 @@ from app.routers.session import ConnectionManager
 # Initialize our own manager instance
 manager = ConnectionManager()
 
-from app.database import SessionLocal, User, Room, Message, room_members, GroupChat, BlockedUser
+from app.database import SessionLocal, User, Room, Message, room_members, GroupChat, BlockedUser, MessageTranslation
+from app.routers.sync import record_event
+from app.routers.event_log import deliver_event, replay_events
+from app.routers.delivery import delivery_tracker
+from app.routers.tombstones import soft_delete_message
+from app.routers.activity import activity_tracker
+from app.routers.presence import presence_service
+from app.routers.presence_broadcast import presence_broadcaster
+from app.routers.contact_graph import contact_graph
+from app.routers.deletion_jobs import remove_files
+from app.routers.ws_protocol import (
+    chat_dispatcher, accept_websocket, receive_frame, FrameDecodeError,
+    ChatMessageFrame, SeenFrame, AckFrame, TypingFrame, UpdateMessageFrame, DeleteMessageFrame,
+    CallFrame, CallSdpFrame, IceCandidateFrame
+)
 
 router = APIRouter()
 
@@ -69,9 +84,21 @@ async def notify_new_message(room_id: int, sender_id: int, message_data: dict):
     except Exception as e:
         print(f"Error in notify_new_message: {str(e)}")
 
+async def release_connection(websocket: WebSocket, user: User, db: Session):
+    """Forget a closed socket; the user goes offline once their last socket is gone"""
+    if user.username in active_connections:
+        active_connections[user.username].discard(websocket)
+        if not active_connections[user.username]:
+            del active_connections[user.username]
+
+    # Broadcast offline status once the user's last socket is gone
+    if presence_service.disconnect(user.id, user.username):
+        await broadcast_status(user, "offline", db)
+
 @router.websocket("/ws/chat/{token}")
-async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Depends(get_db)):
-    """WebSocket endpoint for chat messaging"""
+async def websocket_endpoint(websocket: WebSocket, token: str, since: Optional[int] = None, db: Session = Depends(get_db)):
+    """WebSocket endpoint for chat messaging; `since` is the last event sequence number the client saw"""
+    connected = False
     try:
         # Authenticate user from token
         user = await manager.get_user_from_token(token, db)
@@ -79,80 +106,64 @@ async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Dep
             await websocket.close(code=1008)  # Policy violation - invalid token
             return
         
-        # Accept connection
-        await websocket.accept()
+        # Accept connection, in MessagePack if the client asked for it and it is available
+        websocket = await accept_websocket(websocket)
+        
+        # Send the events missed since the client's last sequence number
+        last_sent = await replay_events(websocket, db, user.id, since)
         
         # Store connection
         if user.username not in active_connections:
             active_connections[user.username] = set()
         active_connections[user.username].add(websocket)
+        activity_tracker.record(user.id)
+        came_online = presence_service.connect(user.id, user.username)
+        connected = True
+        
+        # Events logged while the replay was being sent
+        await replay_events(websocket, db, user.id, last_sent)
         
-        # Broadcast user online status to all friends (connected users)
-        await broadcast_status(user, "online", db)
+        # Broadcast user online status to all friends (connected users), unless another tab already did
+        if came_online:
+            await broadcast_status(user, "online", db)
         
         # Process messages
-        try:
-            while True:
-                # Receive message
-                data = await websocket.receive_text()
-                message_data = json.loads(data)
-                
-                # Validate message format
-                if "type" not in message_data:
-                    await websocket.send_json({"error": "Invalid message format"})
-                    continue
-                
-                # Handle different message types
-                if message_data["type"] == "message":
-                    await handle_chat_message(websocket, user, message_data, db)
-                elif message_data["type"] == "seen":
-                    await handle_seen_notification(websocket, user, message_data, db)
-                elif message_data["type"] == "typing":
-                    await handle_typing_notification(websocket, user, message_data, db)
-                elif message_data["type"] == "update_message":
-                    await handle_message_update(websocket, user, message_data, db)
-                elif message_data["type"] == "delete_message":
-                    await handle_message_delete(websocket, user, message_data, db)
-                elif message_data["type"] == "call_offer":
-                    await handle_call_offer(websocket, user, message_data, db)
-                elif message_data["type"] == "call_answer":
-                    await handle_call_answer(websocket, user, message_data, db)
-                elif message_data["type"] == "call_ice_candidate":
-                    await handle_ice_candidate(websocket, user, message_data, db)
-                elif message_data["type"] == "call_end":
-                    await handle_end_call(websocket, user, message_data, db)
-                elif message_data["type"] == "call_decline":
-                    await handle_decline_call(websocket, user, message_data, db)
-                else:
-                    await websocket.send_json({"error": "Unknown message type"})
-        
-        except WebSocketDisconnect:
-            # Handle disconnect
-            if user.username in active_connections:
-                active_connections[user.username].discard(websocket)
-                if not active_connections[user.username]:
-                    del active_connections[user.username]
-            
-            # Remove from room connections
-            for room_id in list(room_connections.keys()):
-                if user.id in room_connections[room_id]:
-                    room_connections[room_id].pop(user.id)
-                    if not room_connections[room_id]:
-                        room_connections.pop(room_id)
-            
-            # Broadcast offline status
-            await broadcast_status(user, "offline", db)
+        while True:
+            # Receive a frame in the negotiated encoding and route it by type
+            try:
+                message_data = await receive_frame(websocket)
+            except FrameDecodeError as e:
+                # A garbled frame is answered like an invalid one, without dropping the connection
+                await websocket.send_json({"error": "Invalid message format", "details": [str(e)]})
+                continue
+            await chat_dispatcher.dispatch(websocket, user, message_data, db)
     
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
         try:
             await websocket.close(code=1011)  # Internal error
         except:
             pass
+    finally:
+        # However the socket ended, release it so presence and the connection maps stay accurate
+        if connected:
+            # Remove from room connections
+            for room_id in list(room_connections.keys()):
+                if user.id in room_connections[room_id]:
+                    room_connections[room_id].pop(user.id)
+                    if not room_connections[room_id]:
+                        room_connections.pop(room_id)
+            try:
+                await release_connection(websocket, user, db)
+            except Exception as e:
+                print(f"Error releasing WebSocket of {user.username}: {e}")
 
 @router.websocket("/ws/presence")
 async def presence_endpoint(websocket: WebSocket, username: str, db: Session = Depends(get_db)):
     """WebSocket endpoint for presence status updates"""
+    connected = False
     try:
         # Authenticate user from username parameter
         user = db.query(User).filter(User.username == username).first()
@@ -168,43 +179,63 @@ async def presence_endpoint(websocket: WebSocket, username: str, db: Session = D
             active_connections[user.username] = set()
         active_connections[user.username].add(websocket)
         
-        # Set user online status in database
-        user.is_online = True
-        user.last_seen = datetime.utcnow()
-        db.commit()
-        
-        # Broadcast user online status to all friends
-        await broadcast_status(user, "online", db)
-        
-        try:
-            while True:
-                # Just keep connection alive and handle "ping" messages
-                data = await websocket.receive_text()
-                if data == "ping":
-                    await websocket.send_text("pong")
-        
-        except WebSocketDisconnect:
-            # Handle disconnect
-            if user.username in active_connections:
-                active_connections[user.username].discard(websocket)
-                if not active_connections[user.username]:
-                    del active_connections[user.username]
-            
-            # Update user status in database
-            user.is_online = False
-            user.last_seen = datetime.utcnow()
-            db.commit()
-            
-            # Broadcast offline status
-            await broadcast_status(user, "offline", db)
+        # Online state lives in the presence service, which writes it to the database in batches
+        came_online = presence_service.connect(user.id, user.username)
+        connected = True
+        if came_online:
+            await broadcast_status(user, "online", db)
+        
+        while True:
+            # Keep the connection alive and handle "ping" and subscription messages
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
+                continue
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message_data, dict) and message_data.get("type") == "presence_subscribe":
+                await handle_presence_subscribe(websocket, user, message_data)
     
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"Presence WebSocket error: {e}")
         try:
             await websocket.close(code=1011)  # Internal error
         except:
             pass
+    finally:
+        presence_broadcaster.unsubscribe(websocket)
+        if connected:
+            try:
+                await release_connection(websocket, user, db)
+            except Exception as e:
+                print(f"Error releasing presence WebSocket of {user.username}: {e}")
+
+async def handle_presence_subscribe(websocket: WebSocket, user: User, message_data: dict):
+    """Watch only the listed users' presence on this socket, starting with a snapshot of their status"""
+    user_ids = message_data.get("user_ids")
+    if not isinstance(user_ids, list):
+        await websocket.send_json({"error": "user_ids must be a list"})
+        return
+    user_ids = [user_id for user_id in user_ids if isinstance(user_id, int)]
+    if not contact_graph.loaded:
+        await run_in_threadpool(contact_graph.ensure_loaded)
+    statuses = presence_broadcaster.subscribe(websocket, user.id, user_ids)
+    await websocket.send_json({
+        "type": "status_batch",
+        "snapshot": True,
+        "statuses": statuses
+    })
+
+@chat_dispatcher.register("ping")
+async def handle_ping(websocket: WebSocket, user: User, message_data: dict, db: Session):
+    """Answer the client's heartbeat"""
+    await websocket.send_json({"type": "pong"})
 
+@chat_dispatcher.register("message", ChatMessageFrame)
 async def handle_chat_message(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle chat message"""
     try:
@@ -272,12 +303,13 @@ async def handle_chat_message(websocket: WebSocket, user: User, message_data: di
             sender_id=user.id,
             room_id=room_id,
             timestamp=datetime.now(pytz.timezone('Asia/Bishkek')),
-            delivered=True,  # Delivered to server
-            read=False       # Not read by recipient(s) yet
+            delivered=False,  # Set once a recipient's socket acks it
+            read=False        # Not read by recipient(s) yet
         )
         db.add(new_message)
         db.commit()
         db.refresh(new_message)
+        activity_tracker.record(user.id)
         
         # Prepare base message response with real sender information
         base_message_response = {
@@ -290,7 +322,7 @@ async def handle_chat_message(websocket: WebSocket, user: User, message_data: di
             "room_id": room_id,
             "timestamp": new_message.timestamp.isoformat(),
             "time": new_message.timestamp.strftime("%H:%M"),
-            "delivered": True,
+            "delivered": False,
             "read": False,
             "is_group": room.is_group
         }
@@ -368,6 +400,7 @@ async def handle_chat_message(websocket: WebSocket, user: User, message_data: di
         print(f"Error handling chat message: {e}")
         await websocket.send_json({"error": "Failed to send message"})
 
+@chat_dispatcher.register("seen", SeenFrame)
 async def handle_seen_notification(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle seen notification"""
     try:
@@ -417,6 +450,9 @@ async def handle_seen_notification(websocket: WebSocket, user: User, message_dat
             read_message_ids.append(message.id)
             senders.add(message.sender_id)
         
+        if read_message_ids:
+            record_event(db, "message_read", {"reader_id": user.id, "message_ids": read_message_ids}, room_id=room_id)
+        
         db.commit()
         
         # Send confirmation to current user
@@ -427,21 +463,30 @@ async def handle_seen_notification(websocket: WebSocket, user: User, message_dat
         })
         
         # Notify senders that their messages were read
-        for sender_id in senders:
-            sender = db.query(User).filter(User.id == sender_id).first()
-            if sender and sender.username in active_connections:
-                for sender_ws in active_connections[sender.username]:
-                    await sender_ws.send_json({
-                        "type": "message_read",
-                        "room_id": room_id,
-                        "reader_id": user.id,
-                        "reader": user.username,
-                        "message_ids": read_message_ids
-                    })
+        if senders:
+            await deliver_event(db, senders, {
+                "type": "message_read",
+                "room_id": room_id,
+                "reader_id": user.id,
+                "reader": user.username,
+                "message_ids": read_message_ids
+            })
     except Exception as e:
         print(f"Error handling seen notification: {e}")
         await websocket.send_json({"error": "Failed to process seen notification"})
 
+@chat_dispatcher.register("ack", AckFrame)
+async def handle_delivery_ack(websocket: WebSocket, user: User, message_data: dict, db: Session):
+    """Handle a recipient's acknowledgement that message frames reached its socket"""
+    message_ids = message_data.get("message_ids")
+    if not isinstance(message_ids, list) or not message_ids:
+        await websocket.send_json({"error": "Invalid ack data"})
+        return
+    
+    # Buffered and written in bulk by the delivery tracker
+    await delivery_tracker.ack(user.id, message_ids[:500])
+
+@chat_dispatcher.register("typing", TypingFrame)
 async def handle_typing_notification(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle typing notification"""
     try:
@@ -499,6 +544,7 @@ async def handle_typing_notification(websocket: WebSocket, user: User, message_d
         print(f"Error handling typing notification: {e}")
         await websocket.send_json({"error": "Failed to process typing notification"})
 
+@chat_dispatcher.register("update_message", UpdateMessageFrame)
 async def handle_message_update(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle message update"""
     try:
@@ -511,10 +557,13 @@ async def handle_message_update(websocket: WebSocket, user: User, message_data:
             return
         
         # Get the message
-        message = db.query(Message).filter(Message.id == message_id).first()
+        message = db.query(Message).filter(Message.id == message_id, Message.deleted_at.is_(None)).first()
         if not message:
             await websocket.send_json({"error": "Message not found"})
             return
+        if message.room_id != room_id:
+            await websocket.send_json({"error": "Message is not in this room"})
+            return
         
         # Check if user is the sender of the message
         if message.sender_id != user.id:
@@ -531,6 +580,13 @@ async def handle_message_update(websocket: WebSocket, user: User, message_data:
         message.content = content
         message.edited = True
         message.edited_at = datetime.utcnow()
+        # Stored translations are of the old text
+        db.query(MessageTranslation).filter(MessageTranslation.message_id == message.id).delete()
+        record_event(db, "message_updated", {
+            "message_id": message.id,
+            "content": content,
+            "edited_at": message.edited_at.isoformat()
+        }, room_id=message.room_id)
         db.commit()
         
         # Send confirmation to sender
@@ -552,22 +608,19 @@ async def handle_message_update(websocket: WebSocket, user: User, message_data:
             )
         ).all()
         
-        for member in members:
-            member_user = db.query(User).filter(User.id == member.id).first()
-            if member_user and member_user.username in active_connections:
-                for member_ws in active_connections[member_user.username]:
-                    await member_ws.send_json({
-                        "type": "message_updated",
-                        "message_id": message_id,
-                        "room_id": room_id,
-                        "content": content,
-                        "edited": True,
-                        "edited_at": message.edited_at.isoformat()
-                    })
+        await deliver_event(db, [member.id for member in members], {
+            "type": "message_updated",
+            "message_id": message_id,
+            "room_id": room_id,
+            "content": content,
+            "edited": True,
+            "edited_at": message.edited_at.isoformat()
+        })
     except Exception as e:
         print(f"Error handling message update: {e}")
         await websocket.send_json({"error": "Failed to update message"})
 
+@chat_dispatcher.register("delete_message", DeleteMessageFrame)
 async def handle_message_delete(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle message delete"""
     try:
@@ -579,10 +632,14 @@ async def handle_message_delete(websocket: WebSocket, user: User, message_data:
             return
         
         # Get the message
-        message = db.query(Message).filter(Message.id == message_id).first()
+        message = db.query(Message).filter(Message.id == message_id, Message.deleted_at.is_(None)).first()
         if not message:
             await websocket.send_json({"error": "Message not found"})
             return
+        # The event, the confirmation and the broadcast all go to the message's own room
+        if message.room_id != room_id:
+            await websocket.send_json({"error": "Message is not in this room"})
+            return
         
         # Check if user is the sender of the message or an admin in a group chat
         is_sender = message.sender_id == user.id
@@ -603,9 +660,11 @@ async def handle_message_delete(websocket: WebSocket, user: User, message_data:
             await websocket.send_json({"error": "You can only delete your own messages or any message if you're a group admin"})
             return
         
-        # Delete the message
-        db.delete(message)
+        # Leave a tombstone, purged after the retention window
+        removed_files = soft_delete_message(db, message)
+        record_event(db, "message_deleted", {"message_id": message_id, "deleted_by": user.username}, room_id=message.room_id)
         db.commit()
+        remove_files(removed_files)
         
         # Send confirmation to the user who deleted the message
         await websocket.send_json({
@@ -624,20 +683,17 @@ async def handle_message_delete(websocket: WebSocket, user: User, message_data:
             )
         ).all()
         
-        for member in members:
-            member_user = db.query(User).filter(User.id == member.id).first()
-            if member_user and member_user.username in active_connections:
-                for member_ws in active_connections[member_user.username]:
-                    await member_ws.send_json({
-                        "type": "message_deleted",
-                        "message_id": message_id,
-                        "room_id": room_id,
-                        "deleted_by": user.username
-                    })
+        await deliver_event(db, [member.id for member in members], {
+            "type": "message_deleted",
+            "message_id": message_id,
+            "room_id": room_id,
+            "deleted_by": user.username
+        })
     except Exception as e:
         print(f"Error handling message delete: {e}")
         await websocket.send_json({"error": "Failed to delete message"})
 
+@chat_dispatcher.register("call_offer", CallSdpFrame)
 async def handle_call_offer(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle WebRTC call offer"""
     try:
@@ -703,6 +759,7 @@ async def handle_call_offer(websocket: WebSocket, user: User, message_data: dict
         print(f"Error handling call offer: {e}")
         await websocket.send_json({"type": "error", "message": "Failed to process call offer"})
 
+@chat_dispatcher.register("call_answer", CallSdpFrame)
 async def handle_call_answer(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle WebRTC call answer"""
     try:
@@ -742,6 +799,7 @@ async def handle_call_answer(websocket: WebSocket, user: User, message_data: dic
         print(f"Error handling call answer: {e}")
         await websocket.send_json({"type": "error", "message": "Failed to process call answer"})
 
+@chat_dispatcher.register("call_ice_candidate", IceCandidateFrame)
 async def handle_ice_candidate(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle ICE candidate exchange for WebRTC"""
     try:
@@ -772,6 +830,7 @@ async def handle_ice_candidate(websocket: WebSocket, user: User, message_data: d
     except Exception as e:
         print(f"Error handling ICE candidate: {e}")
 
+@chat_dispatcher.register("call_end", CallFrame)
 async def handle_end_call(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle WebRTC call end"""
     try:
@@ -799,6 +858,7 @@ async def handle_end_call(websocket: WebSocket, user: User, message_data: dict,
     except Exception as e:
         print(f"Error handling end call: {e}")
 
+@chat_dispatcher.register("call_decline", CallFrame)
 async def handle_decline_call(websocket: WebSocket, user: User, message_data: dict, db: Session):
     """Handle WebRTC call decline"""
     try:
@@ -827,50 +887,17 @@ async def handle_decline_call(websocket: WebSocket, user: User, message_data: di
         print(f"Error handling decline call: {e}")
 
 async def broadcast_status(user: User, status: str, db: Session):
-    """Broadcast user's online/offline status to contacts"""
-    # Find all users who have direct chat rooms with this user
-    rooms_with_user = db.query(Room).join(
-        room_members, Room.id == room_members.c.room_id
-    ).filter(
-        and_(
-            Room.is_group == False,  # Only direct chats
-            room_members.c.user_id == user.id
-        )
-    ).all()
-    
-    room_ids = [room.id for room in rooms_with_user]
-    
-    if not room_ids:
-        return
-    
-    # Find all users who are in these rooms
-    contacts = db.query(User).join(
-        room_members, User.id == room_members.c.user_id
-    ).filter(
-        and_(
-            room_members.c.room_id.in_(room_ids),
-            User.id != user.id  # Exclude the user themselves
-        )
-    ).all()
-    
-    # Send status to all online contacts
-    for contact in contacts:
-        if contact.username in active_connections:
-            status_message = {
-                "type": "status",
-                "user_id": user.id,
-                "username": user.username,
-                "status": status
-            }
-            for ws in active_connections[contact.username]:
-                await ws.send_json(status_message)
+    """Broadcast user's online/offline status to contacts (debounced and batched by the broadcaster)"""
+    if status == "online":
+        presence_broadcaster.online(user.id, user.username)
+    else:
+        presence_broadcaster.offline(user.id, user.username)
 
 async def notify_new_room(room_id: int, target_user_id: int, current_user: User, db: Session):
     """Notify a user about a new room they've been added to"""
     # Get the target user
     target_user = db.query(User).filter(User.id == target_user_id).first()
-    if not target_user or target_user.username not in active_connections:
-        # User not found or not online
+    if not target_user:
         return
         
     # Get the room data to send to the user
@@ -889,15 +916,14 @@ async def notify_new_room(room_id: int, target_user_id: int, current_user: User,
         "last_message": "Click to start chatting!",
         "last_message_time": "Now",
         "unread_count": 0,
-        "status": "online" if current_user.is_online else "offline"
+        "status": presence_service.status(current_user.id)
     }
     
-    # Send the notification to all of the target user's connections
-    for ws in active_connections[target_user.username]:
-        await ws.send_json({
-            "type": "new_room",
-            "room": room_data
-        })
+    # Logged so the target user also gets it after reconnecting
+    await deliver_event(db, [target_user.id], {
+        "type": "new_room",
+        "room": room_data
+    })
 
 async def notify_new_group(room_id: int, target_user_ids: list, db: Session):
     """Notify users about a new group chat they've been added to"""
@@ -923,92 +949,40 @@ async def notify_new_group(room_id: int, target_user_ids: list, db: Session):
         "description": group_info.description
     }
     
-    # Notify each online user
-    for user_id in target_user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user and user.username in active_connections:
-            for ws in active_connections[user.username]:
-                await ws.send_json({
-                    "type": "new_room",
-                    "room": room_data
-                })
+    # Notify each user, online now or later
+    await deliver_event(db, target_user_ids, {
+        "type": "new_room",
+        "room": room_data
+    })
 
 async def notify_group_deleted(room_id: int, target_user_ids: list, db: Session):
     """Notify users that a group chat has been deleted"""
-    # Notify each online user
-    for user_id in target_user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user and user.username in active_connections:
-            for ws in active_connections[user.username]:
-                await ws.send_json({
-                    "type": "group_deleted",
-                    "room_id": room_id
-                })
+    # Notify each user, online now or later
+    await deliver_event(db, target_user_ids, {
+        "type": "group_deleted",
+        "room_id": room_id
+    })
 
 async def broadcast_avatar_update(user_id: int, avatar_url: str):
     """Broadcast avatar update to all connected users who have contact with this user"""
     try:
         db = SessionLocal()
-        # Get all users with direct or group connections to this user
-        connected_users = set()
-        
-        # Find users with direct messages
-        direct_contacts = db.query(User.id).join(
-            room_members, User.id == room_members.c.user_id
-        ).join(
-            Room, room_members.c.room_id == Room.id
-        ).filter(
-            and_(
-                Room.is_group == False,
-                room_members.c.room_id.in_(
-                    db.query(room_members.c.room_id).filter(
-                        room_members.c.user_id == user_id
-                    )
-                ),
-                User.id != user_id
-            )
-        ).all()
-        
-        for contact in direct_contacts:
-            connected_users.add(contact.id)
-        
-        # Find users in shared group chats
-        group_contacts = db.query(User.id).join(
-            room_members, User.id == room_members.c.user_id
-        ).filter(
-            and_(
-                room_members.c.room_id.in_(
-                    db.query(room_members.c.room_id).filter(
-                        and_(
-                            room_members.c.user_id == user_id,
-                            room_members.c.room_id.in_(
-                                db.query(Room.id).filter(Room.is_group == True)
-                            )
-                        )
-                    )
-                ),
-                User.id != user_id
-            )
-        ).all()
-        
-        for contact in group_contacts:
-            connected_users.add(contact.id)
-        
-        # Send update to all connected users
-        for contact_id in connected_users:
-            contact = db.query(User).filter(User.id == contact_id).first()
-            if contact and contact.username in active_connections:
-                for ws in active_connections[contact.username]:
-                    await ws.send_json({
-                        "type": "avatar_update",
-                        "user_id": user_id,
-                        "avatar_url": avatar_url
-                    })
+        # Everyone sharing a direct or group chat with this user
+        if not contact_graph.loaded:
+            await run_in_threadpool(contact_graph.ensure_loaded)
+        connected_users = contact_graph.contacts(user_id)
+        
+        # Send update to all contacts
+        await deliver_event(db, connected_users, {
+            "type": "avatar_update",
+            "user_id": user_id,
+            "avatar_url": avatar_url
+        })
         
         # Also update the user's own connections
-        user = db.query(User).filter(User.id == user_id).first()
-        if user and user.username in active_connections:
-            for ws in active_connections[user.username]:
+        username = presence_service.online_username(user_id)
+        if username and username in active_connections:
+            for ws in active_connections[username]:
                 await ws.send_json({
                     "type": "own_avatar_update",
                     "avatar_url": avatar_url
@@ -1050,19 +1024,8 @@ async def notify_block_status_change(user_id: int, blocked_user_id: int, is_bloc
         
         print(f"DEBUG: Preparing to send block status notification. Blocker: {user.username}, Blocked: {blocked_user.username}, Action: {'block' if is_blocked else 'unblock'}")
         
-        # Send notification to the user who was blocked/unblocked
-        notification_sent = False
-        if blocked_user.username in active_connections:
-            for ws in active_connections[blocked_user.username]:
-                try:
-                    await ws.send_json(notification)
-                    notification_sent = True
-                    print(f"SUCCESS: Sent block status notification to {blocked_user.username}")
-                except Exception as e:
-                    print(f"ERROR: Failed to send notification to {blocked_user.username}: {str(e)}")
-        
-        if not notification_sent:
-            print(f"WARNING: Could not send notification to {blocked_user.username} - no active connections")
+        # Send notification to the user who was blocked/unblocked (logged if they are offline)
+        await deliver_event(db, [blocked_user.id], notification)
         
         # Also send notification to the blocker for confirmation and page refresh
         blocker_notification_sent = False
@@ -0,0 +1,106 @@
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from typing import List
+import os
+
+# uvicorn before 0.35 only has the legacy websockets protocol
+try:
+    from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol as BaseWebSocketProtocol
+except ImportError:
+    from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol as BaseWebSocketProtocol
+
+# permessage-deflate for the chat and presence sockets. Each connection with context
+# takeover keeps its zlib state between messages: about 2^(window bits + 2) + 2^(memLevel + 9)
+# bytes to compress and 2^(window bits) to decompress
+WS_DEFLATE_ENABLED = os.getenv("WS_DEFLATE_ENABLED", "true").lower() == "true"
+WS_DEFLATE_SERVER_WINDOW_BITS = int(os.getenv("WS_DEFLATE_SERVER_WINDOW_BITS", "12"))  # 8-15
+WS_DEFLATE_CLIENT_WINDOW_BITS = int(os.getenv("WS_DEFLATE_CLIENT_WINDOW_BITS", "12"))  # 8-15
+WS_DEFLATE_MEM_LEVEL = int(os.getenv("WS_DEFLATE_MEM_LEVEL", "5"))  # 1-9
+WS_DEFLATE_LEVEL = int(os.getenv("WS_DEFLATE_LEVEL", "6"))  # 1-9, zlib's speed/ratio trade-off
+# Without context takeover nothing is kept between messages, at the cost of compression ratio
+WS_DEFLATE_SERVER_CONTEXT_TAKEOVER = os.getenv("WS_DEFLATE_SERVER_CONTEXT_TAKEOVER", "true").lower() == "true"
+WS_DEFLATE_CLIENT_CONTEXT_TAKEOVER = os.getenv("WS_DEFLATE_CLIENT_CONTEXT_TAKEOVER", "true").lower() == "true"
+# Messages smaller than this are sent uncompressed; typing and pong frames gain nothing
+WS_DEFLATE_MIN_SIZE = int(os.getenv("WS_DEFLATE_MIN_SIZE", "256"))  # bytes
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """
+    permessage-deflate that leaves messages under min_size uncompressed
+
+    RFC 7692 lets each message choose (the RSV1 bit), and skipping one leaves the
+    compression context untouched, so clients need nothing special.
+    """
+
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self.encode_cont_data = False
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        # Continuation frames follow the decision made for the message's first frame
+        if frame.opcode is not frames.OP_CONT:
+            self.encode_cont_data = len(frame.data) >= self.min_size
+        if not self.encode_cont_data:
+            return frame
+        return super().encode(frame)
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate like websockets does, with a ThresholdPerMessageDeflate per connection"""
+
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size
+        )
+
+def deflate_extensions() -> List[ServerPerMessageDeflateFactory]:
+    """Extensions offered to WebSocket clients, from the WS_DEFLATE_* settings"""
+    if not WS_DEFLATE_ENABLED:
+        return []
+    return [ThresholdDeflateFactory(
+        server_no_context_takeover=not WS_DEFLATE_SERVER_CONTEXT_TAKEOVER,
+        client_no_context_takeover=not WS_DEFLATE_CLIENT_CONTEXT_TAKEOVER,
+        server_max_window_bits=WS_DEFLATE_SERVER_WINDOW_BITS,
+        client_max_window_bits=WS_DEFLATE_CLIENT_WINDOW_BITS,
+        compress_settings={"memLevel": WS_DEFLATE_MEM_LEVEL, "level": WS_DEFLATE_LEVEL},
+        min_size=WS_DEFLATE_MIN_SIZE
+    )]
+
+def deflate_memory_per_connection() -> int:
+    """Approximate zlib memory an idle connection holds with the current settings, in bytes"""
+    if not WS_DEFLATE_ENABLED:
+        return 0
+    memory = 0
+    if WS_DEFLATE_SERVER_CONTEXT_TAKEOVER:
+        memory += (1 << (WS_DEFLATE_SERVER_WINDOW_BITS + 2)) + (1 << (WS_DEFLATE_MEM_LEVEL + 9))
+    if WS_DEFLATE_CLIENT_CONTEXT_TAKEOVER:
+        memory += 1 << WS_DEFLATE_CLIENT_WINDOW_BITS
+    return memory
+
+class CompressedWebSocketProtocol(BaseWebSocketProtocol):
+    """
+    uvicorn's WebSocket protocol with the WS_DEFLATE_* compression settings
+
+    uvicorn offers permessage-deflate with fixed parameters; this replaces them.
+    Pass the class as uvicorn's ws option. --no-ws-per-message-deflate still turns
+    compression off.
+    """
+
+    def __init__(self, config, *args, **kwargs):
+        super().__init__(config, *args, **kwargs)
+        extensions = deflate_extensions() if config.ws_per_message_deflate else []
+        if hasattr(self, "conn"):
+            self.conn.available_extensions = extensions
+        else:
+            self.available_extensions = extensions
@@ -0,0 +1,171 @@
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+import json
+import os
+
+# MessagePack is optional: without it every client is served JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_SUBPROTOCOL = "shrekchat.json"
+MSGPACK_SUBPROTOCOL = "shrekchat.msgpack"
+WS_MSGPACK_ENABLED = os.getenv("WS_MSGPACK_ENABLED", "true").lower() == "true"
+
+class FrameDecodeError(ValueError):
+    """A frame that is not valid JSON or MessagePack; the connection stays usable"""
+
+# What the decoders raise for malformed input (most msgpack errors are ValueErrors, but not all)
+DECODE_ERRORS = (ValueError, TypeError) + ((msgpack.UnpackException,) if msgpack is not None else ())
+
+# Schemas of the frames clients send on the chat socket; fields not listed are passed through
+class Frame(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    type: str
+
+class ChatMessageFrame(Frame):
+    room_id: int
+    content: str
+
+class SeenFrame(Frame):
+    room_id: int
+    message_ids: List[int]
+
+class AckFrame(Frame):
+    message_ids: List[int] = Field(min_length=1)
+
+class TypingFrame(Frame):
+    room_id: int
+    status: str
+
+class UpdateMessageFrame(Frame):
+    message_id: int
+    room_id: int
+    content: str
+
+class DeleteMessageFrame(Frame):
+    message_id: int
+    room_id: int
+
+class CallFrame(Frame):
+    room_id: int
+    target_user_id: int
+
+class CallSdpFrame(CallFrame):
+    sdp: Any
+
+class IceCandidateFrame(CallFrame):
+    candidate: Any
+
+Handler = Callable[..., Awaitable[None]]
+
+class WebSocketDispatcher:
+    """
+    Routes incoming frames to the handler registered for their type
+
+    Each frame is validated against its handler's schema first, so handlers get
+    well-typed data and malformed frames are answered with an error instead.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Tuple[Handler, Optional[Type[Frame]]]] = {}
+
+    def register(self, frame_type: str, schema: Optional[Type[Frame]] = None):
+        def decorator(handler: Handler) -> Handler:
+            self.handlers[frame_type] = (handler, schema)
+            return handler
+        return decorator
+
+    async def dispatch(self, websocket: WebSocket, user, message_data: Any, db):
+        frame_type = message_data.get("type") if isinstance(message_data, dict) else None
+        if not isinstance(frame_type, str):
+            await websocket.send_json({"error": "Invalid message format"})
+            return
+
+        entry = self.handlers.get(frame_type)
+        if entry is None:
+            await websocket.send_json({"error": "Unknown message type"})
+            return
+
+        handler, schema = entry
+        if schema is not None:
+            try:
+                message_data = schema.model_validate(message_data).model_dump()
+            except ValidationError as e:
+                await websocket.send_json({
+                    "error": f"Invalid {frame_type} message",
+                    "details": [
+                        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                    ]
+                })
+                return
+        await handler(websocket, user, message_data, db)
+
+# Handlers of the chat socket, registered in websockets.py
+chat_dispatcher = WebSocketDispatcher()
+
+class MsgpackWebSocket:
+    """
+    A WebSocket that negotiated the MessagePack subprotocol
+
+    Frames are sent as binary MessagePack through the usual send_json, so code
+    broadcasting to a mix of sockets does not need to know which is which.
+    Everything else is passed to the wrapped socket.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self._websocket = websocket
+
+    def __getattr__(self, name):
+        return getattr(self._websocket, name)
+
+    async def send_json(self, data: Any, mode: str = "binary"):
+        await self._websocket.send_bytes(msgpack.packb(data))
+
+    async def receive_frame(self) -> Any:
+        message = await self._websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        try:
+            if message.get("bytes") is not None:
+                return msgpack.unpackb(message["bytes"])
+            return json.loads(message["text"])
+        except DECODE_ERRORS as e:
+            raise FrameDecodeError(str(e))
+
+def choose_subprotocol(websocket: WebSocket) -> Optional[str]:
+    offered = websocket.scope.get("subprotocols") or []
+    if MSGPACK_SUBPROTOCOL in offered and msgpack is not None and WS_MSGPACK_ENABLED:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+async def accept_websocket(websocket: WebSocket):
+    """Accept the connection with the best encoding the client offered; returns the socket to use from then on"""
+    subprotocol = choose_subprotocol(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    if subprotocol == MSGPACK_SUBPROTOCOL:
+        return MsgpackWebSocket(websocket)
+    return websocket
+
+async def receive_frame(websocket) -> Any:
+    """
+    Next decoded frame from the client, in whichever encoding was negotiated
+
+    Raises FrameDecodeError for a frame that cannot be decoded, so the caller can
+    answer it with an error and keep reading.
+    """
+    if isinstance(websocket, MsgpackWebSocket):
+        return await websocket.receive_frame()
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("text") is None:
+        raise FrameDecodeError("Expected a JSON text frame")
+    try:
+        return json.loads(message["text"])
+    except ValueError as e:
+        raise FrameDecodeError(str(e))
@@ -4,9 +4,6 @@
  */
 
 document.addEventListener('DOMContentLoaded', function() {
-    // Constants
-    const ADMIN_PASSWORD = "shrek1234"; // Hardcoded password for admin access
-    
     // DOM Elements
     const adminMenuItem = document.getElementById('adminMenuItem');
     const adminPanelPopup = document.getElementById('adminPanelPopup');
@@ -68,9 +65,21 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Admin login button
     if (adminLoginBtn) {
-        adminLoginBtn.addEventListener('click', function() {
-            // Check password
-            if (adminPassword && adminPassword.value === ADMIN_PASSWORD) {
+        adminLoginBtn.addEventListener('click', async function() {
+            // The server checks the password and unlocks the admin API for this session
+            let unlocked = false;
+            try {
+                const response = await fetch('/api/admin/login', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ password: adminPassword ? adminPassword.value : '' })
+                });
+                unlocked = response.ok;
+            } catch (error) {
+                console.error('Error unlocking admin panel:', error);
+            }
+            
+            if (unlocked) {
                 // Hide auth section, show stats section
                 adminAuthSection.style.display = 'none';
                 adminStatsSection.style.display = 'block';
@@ -445,22 +454,50 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Load registered users list
-    function loadRegisteredUsers(page = 1, limit = 10, search = '') {
+    // Filters of the user list, and the cursor of each page visited so Previous can go back
+    const userList = {
+        search: '',
+        online: '',
+        limit: 10,
+        page: 0,
+        cursors: [null]
+    };
+    
+    function userListParams() {
+        const params = new URLSearchParams();
+        if (userList.search) {
+            params.append('search', userList.search);
+        }
+        if (userList.online) {
+            params.append('online', userList.online);
+        }
+        return params;
+    }
+    
+    // Load registered users list (page 0 starts over from the first page)
+    function loadRegisteredUsers(page = 0) {
         const userListContainer = document.getElementById('userListContainer');
         if (!userListContainer) return;
         
         // Show loading state
         userListContainer.innerHTML = '<div class="loading">Loading users...</div>';
         
+        if (page === 0) {
+            userList.cursors = [null];
+        }
+        userList.page = page;
+        
         // Build the query parameters
-        const params = new URLSearchParams({
-            page: page,
-            limit: limit
-        });
+        const params = userListParams();
+        params.append('limit', userList.limit);
+        if (userList.cursors[page]) {
+            params.append('cursor', userList.cursors[page]);
+        }
         
-        if (search) {
-            params.append('search', search);
+        // Keep the export link in sync with the filters
+        const userExportButton = document.getElementById('userExportButton');
+        if (userExportButton) {
+            userExportButton.href = `/api/admin/users/export.csv?${userListParams().toString()}`;
         }
         
         // Fetch user list from API
@@ -545,34 +582,23 @@ document.addEventListener('DOMContentLoaded', function() {
             
             html += '</tbody></table>';
             
+            // Remember where the next page starts
+            userList.cursors[userList.page + 1] = pagination.next_cursor;
+            
             // Add pagination controls
-            if (pagination.pages > 1) {
+            if (userList.page > 0 || pagination.next_cursor) {
                 html += '<div class="pagination">';
                 
                 // Previous button
-                if (pagination.page > 1) {
-                    html += `<button class="pagination-btn" data-page="${pagination.page - 1}">Previous</button>`;
+                if (userList.page > 0) {
+                    html += `<button class="pagination-btn" data-page="${userList.page - 1}">Previous</button>`;
                 }
                 
-                // Page numbers
-                for (let i = 1; i <= pagination.pages; i++) {
-                    if (
-                        i === 1 || 
-                        i === pagination.pages || 
-                        (i >= pagination.page - 1 && i <= pagination.page + 1)
-                    ) {
-                        html += `<button class="pagination-btn ${i === pagination.page ? 'active' : ''}" data-page="${i}">${i}</button>`;
-                    } else if (
-                        i === pagination.page - 2 || 
-                        i === pagination.page + 2
-                    ) {
-                        html += '<span class="pagination-ellipsis">...</span>';
-                    }
-                }
+                html += `<span class="pagination-info">Page ${userList.page + 1} of ${pagination.pages} (${pagination.total} users)</span>`;
                 
                 // Next button
-                if (pagination.page < pagination.pages) {
-                    html += `<button class="pagination-btn" data-page="${pagination.page + 1}">Next</button>`;
+                if (pagination.next_cursor) {
+                    html += `<button class="pagination-btn" data-page="${userList.page + 1}">Next</button>`;
                 }
                 
                 html += '</div>';
@@ -585,8 +611,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const paginationButtons = userListContainer.querySelectorAll('.pagination-btn');
         paginationButtons.forEach(button => {
             button.addEventListener('click', function() {
-                const page = parseInt(this.getAttribute('data-page'));
-                loadRegisteredUsers(page, pagination.limit);
+                loadRegisteredUsers(parseInt(this.getAttribute('data-page')));
             });
         });
         
@@ -671,8 +696,8 @@ document.addEventListener('DOMContentLoaded', function() {
     
     if (userSearchInput && userSearchButton) {
         userSearchButton.addEventListener('click', function() {
-            const search = userSearchInput.value.trim();
-            loadRegisteredUsers(1, 10, search);
+            userList.search = userSearchInput.value.trim();
+            loadRegisteredUsers();
         });
         
         userSearchInput.addEventListener('keyup', function(event) {
@@ -682,6 +707,14 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    const userOnlineFilter = document.getElementById('userOnlineFilter');
+    if (userOnlineFilter) {
+        userOnlineFilter.addEventListener('change', function() {
+            userList.online = this.value;
+            loadRegisteredUsers();
+        });
+    }
+    
     // Show error state for a panel
     function showErrorState(panelId) {
         const panel = document.getElementById(panelId);
@@ -716,6 +716,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     let currentDateStr = '';
                     
                     messages.forEach(message => {
+                        // Deleted messages come back as tombstones, nothing to show
+                        if (message.deleted) return;
+
                         // Determine message date (use timestamp if available, or fall back to created_at or current date)
                         const messageDate = message.timestamp ? new Date(message.timestamp) : 
                                            message.created_at ? new Date(message.created_at) : new Date();
@@ -779,6 +782,46 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Format a duration in seconds as m:ss
+    function formatAudioDuration(seconds) {
+        const total = Math.floor(seconds);
+        return `${Math.floor(total / 60)}:${String(total % 60).padStart(2, '0')}`;
+    }
+
+    // Voice message player with the server-computed duration and waveform, when known
+    function renderAudioAttachment(src, filename, audioInfo) {
+        const duration = audioInfo.duration ? formatAudioDuration(audioInfo.duration) : '';
+        const waveform = (audioInfo.waveform || []).length
+            ? `<div class="audio-waveform">${audioInfo.waveform.map(peak =>
+                `<span style="height: ${Math.max(4, peak)}%"></span>`).join('')}</div>`
+            : '';
+        return `
+            <div class="attachment-preview">
+                <audio src="${src}" controls preload="${audioInfo.duration ? 'none' : 'metadata'}"></audio>
+                ${waveform}
+                <div class="attachment-info">
+                    <span class="attachment-name">${filename}</span>
+                    ${duration ? `<span class="attachment-duration">${duration}</span>` : ''}
+                </div>
+            </div>
+        `;
+    }
+
+    // Swap in the transcoded file, duration and waveform once background processing finishes
+    window.addEventListener('audio-processed', function(e) {
+        const { messageId, audio } = e.detail;
+        const messageElement = document.querySelector(`.message[data-message-id="${messageId}"]`);
+        if (!messageElement || !audio) return;
+
+        const contentElement = messageElement.querySelector('.message-content');
+        const player = contentElement ? contentElement.querySelector('audio') : null;
+        if (!player || !player.paused) return;  // Don't interrupt playback
+
+        const nameElement = contentElement.querySelector('.attachment-name');
+        const filename = nameElement ? nameElement.textContent : '';
+        contentElement.innerHTML = renderAudioAttachment(audio.url || player.getAttribute('src'), filename, audio);
+    });
+
     // Display a message in the chat
     function displayMessage(message) {
         const timestamp = new Date().toISOString();
@@ -846,16 +889,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 }                // Check for audio attachments
                 else if (message.content.includes('<audio-attachment')) {
                     hasAttachment = true;
-                    const src = message.content.match(/src='([^']+)'/)[1];
+                    // Prefer the server-side transcoded copy and metadata when available
+                    const audioInfo = message.audio || {};
+                    const src = audioInfo.url || message.content.match(/src='([^']+)'/)[1];
                     const filename = message.content.match(/filename='([^']+)'/)[1];
-                    attachmentContent = `
-                        <div class="attachment-preview">
-                            <audio src="${src}" controls></audio>
-                            <div class="attachment-info">
-                                <span class="attachment-name">${filename}</span>
-                            </div>
-                        </div>
-                    `;
+                    attachmentContent = renderAudioAttachment(src, filename, audioInfo);
                     messageContent.innerHTML = attachmentContent;
                 }
                 // Check for document attachments
@@ -1056,8 +1094,8 @@ document.addEventListener('DOMContentLoaded', function() {
                                 messageStatusDouble.classList.add('read');
                                 messageStatusSingle.style.display = 'none';
                             } else if (pendingStatus === 'delivered') {
+                                // Keep the read ticks if the message was already read
                                 messageStatusDouble.style.display = 'inline';
-                                messageStatusDouble.classList.remove('read');
                                 messageStatusSingle.style.display = 'none';
                             }
                             delete window.pendingMessageStatuses[message.id];
@@ -263,6 +263,21 @@ function incrementUnreadCount(roomId) {
     }
 }
 
+// Message statuses in the order they happen; a status never moves backwards
+const MESSAGE_STATUS_ORDER = ['sent', 'delivered', 'read'];
+
+// Status currently shown by a message's tick icons
+function shownMessageStatus(messageStatusSingle, messageStatusDouble) {
+    if (messageStatusDouble.classList.contains('read')) return 'read';
+    if (messageStatusDouble.style.display === 'inline') return 'delivered';
+    return 'sent';
+}
+
+// Whether status is later than current; receipts can arrive out of order
+function isStatusAdvance(current, status) {
+    return MESSAGE_STATUS_ORDER.indexOf(status) > MESSAGE_STATUS_ORDER.indexOf(current);
+}
+
 // Update display of message status indicators
 function updateMessageStatus(messageId, status) {
     const messageElement = document.querySelector(`.message[data-message-id="${messageId}"]`);
@@ -271,6 +286,10 @@ function updateMessageStatus(messageId, status) {
         const messageStatusDouble = messageElement.querySelector('.message-status-double');
         
         if (messageStatusSingle && messageStatusDouble) {
+            // A late "delivered" must not clear the read ticks
+            if (!isStatusAdvance(shownMessageStatus(messageStatusSingle, messageStatusDouble), status)) {
+                return;
+            }
             if (status === 'delivered') {
                 messageStatusDouble.style.display = 'inline';
                 messageStatusDouble.classList.remove('read');
@@ -279,9 +298,6 @@ function updateMessageStatus(messageId, status) {
                 messageStatusDouble.style.display = 'inline';
                 messageStatusDouble.classList.add('read');
                 messageStatusSingle.style.display = 'none';
-            } else if (status === 'sent') {
-                messageStatusSingle.style.display = 'inline';
-                messageStatusDouble.style.display = 'none';
             }
         }
     } else {
@@ -290,8 +306,11 @@ function updateMessageStatus(messageId, status) {
         if (!window.pendingMessageStatuses) {
             window.pendingMessageStatuses = {};
         }
-        window.pendingMessageStatuses[messageId] = status;
-        console.log(`Stored pending status update for message ${messageId}: ${status}`);
+        const pendingStatus = window.pendingMessageStatuses[messageId];
+        if (!pendingStatus || isStatusAdvance(pendingStatus, status)) {
+            window.pendingMessageStatuses[messageId] = status;
+            console.log(`Stored pending status update for message ${messageId}: ${status}`);
+        }
     }
 }
 
@@ -9,6 +9,8 @@ let presenceWebSocket = null;
 let currentRoomId = null;
 let currentRoomIsGroup = false;
 let currentUserId = null;
+// Sequence number of the last logged event received, so reconnects resume from it
+let lastEventSeq = null;
 
 // Debug mode - set to true for verbose logging
 const WEBSOCKET_DEBUG = true;
@@ -107,6 +109,8 @@ function connectPresenceWebSocket(retryCount = 0) {
 
         presenceWebSocket.onopen = function() {
             wsLog("Presence WebSocket connection established successfully");
+            // Only the users on screen get status pushes; the reply is a snapshot of them
+            sendPresenceSubscription();
             setInterval(function() {
                 if (presenceWebSocket && presenceWebSocket.readyState === WebSocket.OPEN) {
                     presenceWebSocket.send("ping");
@@ -127,6 +131,9 @@ function connectPresenceWebSocket(retryCount = 0) {
 
                 if (data.type === "status") {
                     handleStatusMessage(data);
+                } else if (data.type === "status_batch") {
+                    // Several contacts' changes, coalesced by the server into one frame
+                    data.statuses.forEach(handleStatusMessage);
                 } else if (data.type === "block_status_change") {
                     // Handle block status notifications in presence WebSocket too
                     handleBlockStatusChange(data);
@@ -156,6 +163,73 @@ function connectPresenceWebSocket(retryCount = 0) {
     }
 }
 
+// Presence subscriptions: the server only pushes the status of the contacts visible
+// in the sidebar and of the user whose chat is open
+const presenceVisibleIds = new Set();
+let presenceObserver = null;
+let presenceSubscribeTimer = null;
+
+function observeContactItems() {
+    if (!('IntersectionObserver' in window)) return;
+    if (!presenceObserver) {
+        presenceObserver = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                const userId = parseInt(entry.target.getAttribute('data-user-id'));
+                if (entry.isIntersecting) {
+                    presenceVisibleIds.add(userId);
+                } else {
+                    presenceVisibleIds.delete(userId);
+                }
+            });
+            schedulePresenceSubscription();
+        });
+
+        // Contacts added later (new chats) are observed as they appear
+        const contactsList = document.getElementById('contactsList');
+        if (contactsList) {
+            new MutationObserver(observeContactItems).observe(contactsList, { childList: true });
+        }
+    }
+    document.querySelectorAll('.contact-item[data-user-id]').forEach(item => {
+        if (!item.dataset.presenceObserved) {
+            item.dataset.presenceObserved = 'true';
+            presenceObserver.observe(item);
+        }
+    });
+}
+
+function presenceSubscriptionIds() {
+    const ids = [];
+    // The open chat first, so it survives the server's subscription limit
+    const openUserId = parseInt(document.getElementById('chatHeader')?.getAttribute('data-user-id'));
+    if (!isNaN(openUserId)) {
+        ids.push(openUserId);
+    }
+    if ('IntersectionObserver' in window) {
+        presenceVisibleIds.forEach(userId => ids.push(userId));
+    } else {
+        document.querySelectorAll('.contact-item[data-user-id]').forEach(item => {
+            ids.push(parseInt(item.getAttribute('data-user-id')));
+        });
+    }
+    return [...new Set(ids.filter(userId => !isNaN(userId)))];
+}
+
+function schedulePresenceSubscription() {
+    clearTimeout(presenceSubscribeTimer);
+    presenceSubscribeTimer = setTimeout(sendPresenceSubscription, 250);
+}
+
+function sendPresenceSubscription() {
+    observeContactItems();
+    if (presenceWebSocket && presenceWebSocket.readyState === WebSocket.OPEN) {
+        presenceWebSocket.send(JSON.stringify({
+            type: "presence_subscribe",
+            user_ids: presenceSubscriptionIds()
+        }));
+    }
+}
+
 // Handle status messages with debouncing
 function handleStatusMessage(data) {
     const validStatus = data.status === 'online' || data.status === 'offline' ? data.status : 'offline';
@@ -173,6 +247,7 @@ function handleStatusMessage(data) {
 function connectChatWebSocket(roomId, onConnectCallback, suppressReload = false, retryCount = 0) {
     wsLog(`Connecting chat WebSocket for room: ${roomId}`);
     currentRoomId = roomId;
+    schedulePresenceSubscription();
 
     if (chatWebSocket) {
         wsLog("Closing existing chat WebSocket");
@@ -206,7 +281,10 @@ function connectChatWebSocket(roomId, onConnectCallback, suppressReload = false,
             wsLog("Chat token received successfully");
 
             const socket_protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = `${socket_protocol}//${window.location.host}/ws/chat/${encodeURIComponent(token)}`;
+            let wsUrl = `${socket_protocol}//${window.location.host}/ws/chat/${encodeURIComponent(token)}`;
+            if (lastEventSeq !== null) {
+                wsUrl += `?since=${lastEventSeq}`;
+            }
 
             wsLog(`Creating chat WebSocket connection: ${wsUrl}`);
             try {
@@ -279,12 +357,36 @@ function setupChatWebSocketEvents(webSocket) {
             const data = JSON.parse(event.data);
             wsLog("ChatSocket message received:", data);
 
+            // Logged events carry a per-user sequence number
+            if (typeof data.seq === 'number') {
+                if (data.type === "event_seq") {
+                    lastEventSeq = data.seq;
+                    return;
+                }
+                if (data.type === "resync_required") {
+                    // Missed more than the server can replay - reload everything
+                    wsLog("Event log gap too large, reloading");
+                    window.location.reload();
+                    return;
+                }
+                if (lastEventSeq !== null && data.seq <= lastEventSeq) {
+                    return; // Already handled (replayed and live copy)
+                }
+                lastEventSeq = data.seq;
+            }
+
             // Create a custom event to propagate WebSocket messages
             const messageEvent = new CustomEvent('websocket_message', { detail: data });
             window.dispatchEvent(messageEvent);
 
             if (data.type === "message") {
                 handleChatMessage(data);
+            } else if (data.type === "message_delivered") {
+                (data.message_ids || []).forEach((id) => {
+                    if (window.shrekChatUtils) {
+                        window.shrekChatUtils.updateMessageStatus(id, "delivered");
+                    }
+                });
             } else if (data.type === "message_read") {
                 const messageIds = Array.isArray(data.message_ids) ? data.message_ids : [data.message_id];
                 messageIds.forEach((id) => {
@@ -302,6 +404,11 @@ function setupChatWebSocketEvents(webSocket) {
                     : { messageId: data.message_id, deletedBy: data.deleted_by };
                 
                 window.dispatchEvent(new CustomEvent(eventName, { detail: eventDetail }));
+            } else if (data.type === "audio_processed") {
+                // Voice message metadata handled by custom events
+                window.dispatchEvent(new CustomEvent("audio-processed", {
+                    detail: { messageId: data.message_id, roomId: data.room_id, audio: data.audio }
+                }));
             } else if (data.type === "new_room") {
                 // Handle new room notification (both direct and group)
                 if (window.shrekChatUtils && window.shrekChatUtils.updateRoomList) {
@@ -527,6 +634,11 @@ function handleChatMessage(data) {
     const isConfirmation = message.sender === "user";
     wsLog("Handling chat message:", message);
 
+    // Tell the server the message reached this client
+    if (!isConfirmation && message.id) {
+        queueDeliveryAck(message.id);
+    }
+
     // Check if this is an attachment message
     const isAttachment = message.content && (
         message.content.includes('<img-attachment') || 
@@ -592,6 +704,24 @@ function handleChatMessage(data) {
     }
 }
 
+// Delivery acks are batched briefly so a burst of messages costs one frame
+let pendingDeliveryAcks = [];
+let deliveryAckTimer = null;
+
+function queueDeliveryAck(messageId) {
+    pendingDeliveryAcks.push(messageId);
+    if (deliveryAckTimer) return;
+
+    deliveryAckTimer = setTimeout(() => {
+        deliveryAckTimer = null;
+        const messageIds = pendingDeliveryAcks;
+        pendingDeliveryAcks = [];
+        if (chatWebSocket && chatWebSocket.readyState === WebSocket.OPEN) {
+            chatWebSocket.send(JSON.stringify({ type: "ack", message_ids: messageIds }));
+        }
+    }, 200);
+}
+
 // Process a confirmed message (sent by current user)
 function processConfirmedMessage(message, isAttachment) {
     const tempMessage = document.querySelector(`.message[data-message-id="${message.temp_id}"]`);
@@ -605,10 +735,16 @@ function processConfirmedMessage(message, isAttachment) {
         const messageStatusDouble = tempMessage.querySelector('.message-status-double');
         
         if (messageStatusSingle && messageStatusDouble) {
-            messageStatusSingle.style.display = 'none';
-            messageStatusDouble.style.display = 'inline';
-            if (message.read) {
-                messageStatusDouble.classList.add('read');
+            if (message.delivered || message.read) {
+                messageStatusSingle.style.display = 'none';
+                messageStatusDouble.style.display = 'inline';
+                if (message.read) {
+                    messageStatusDouble.classList.add('read');
+                }
+            } else {
+                // Stored on the server; the double tick follows with message_delivered
+                messageStatusSingle.style.display = 'inline';
+                messageStatusDouble.style.display = 'none';
             }
         }
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark message search: the FTS index against a LIKE '%term%' scan.
+
+Builds a throwaway SQLite database with a synthetic corpus spread over many
+rooms (the FTS triggers index every row as it is inserted), then times the
+same room-scoped queries through both paths.
+
+Usage:
+    python benchmark_message_search.py [--messages 2000000] [--rooms 5000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "search_benchmark.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy.sql import text
+
+from app.database import SessionLocal, engine
+from app.routers.message_search import search_message_ids
+
+WORDS = [
+    "swamp", "ogre", "donkey", "dragon", "castle", "princess", "waffles", "onion",
+    "layers", "parfait", "farquaad", "gingerbread", "pinocchio", "knight", "tower",
+    "bridge", "lava", "mirror", "fairy", "godmother", "potion", "carriage", "mud",
+]
+FILLER = ["the", "a", "is", "we", "you", "tonight", "later", "really", "so", "and", "ok", "lol"]
+
+def build_corpus(total, rooms, users):
+    """Insert users, rooms, memberships and messages with raw executemany batches"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, username, email, hashed_password) VALUES (:id, :u, :e, 'x')"
+        ), [{"id": i, "u": f"user{i}", "e": f"user{i}@example.com"} for i in range(1, users + 1)])
+        conn.execute(text("INSERT INTO rooms (id, is_group) VALUES (:id, 0)"),
+                     [{"id": i} for i in range(1, rooms + 1)])
+        conn.execute(text("INSERT INTO room_members (room_id, user_id) VALUES (:r, :u)"), [
+            {"r": room_id, "u": user_id}
+            for room_id in range(1, rooms + 1)
+            for user_id in {(room_id % users) + 1, ((room_id * 7) % users) + 1}
+        ])
+
+    rng = random.Random(42)
+    batch = 20000
+    start = time.perf_counter()
+    for offset in range(0, total, batch):
+        rows = []
+        for _ in range(min(batch, total - offset)):
+            words = rng.choices(FILLER, k=rng.randint(3, 10)) + rng.choices(WORDS, k=rng.randint(0, 2))
+            rng.shuffle(words)
+            room_id = rng.randint(1, rooms)
+            rows.append({"room_id": room_id, "sender_id": (room_id % users) + 1, "content": " ".join(words)})
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO messages (room_id, sender_id, content, timestamp) "
+                "VALUES (:room_id, :sender_id, :content, CURRENT_TIMESTAMP)"
+            ), rows)
+    return time.perf_counter() - start
+
+def like_search(db, user_id, term, limit=20):
+    """The pre-index approach: substring scan over every message the user can see"""
+    return [row[0] for row in db.execute(text("""
+        SELECT m.id FROM messages m
+        JOIN room_members rm ON rm.room_id = m.room_id AND rm.user_id = :user_id
+        WHERE m.content LIKE :pattern
+        ORDER BY m.id DESC LIMIT :limit
+    """), {"user_id": user_id, "pattern": f"%{term}%", "limit": limit})]
+
+def time_queries(fn, queries):
+    timings = []
+    for args in queries:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95) - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--rooms", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Building {args.messages} messages in {args.rooms} rooms at {DB_PATH}")
+    elapsed = build_corpus(args.messages, args.rooms, args.users)
+    print(f"Inserted in {elapsed:.1f}s ({args.messages / elapsed:.0f} rows/s with FTS triggers)")
+
+    rng = random.Random(7)
+    # (user, term, one of the user's rooms)
+    queries = []
+    for _ in range(args.queries):
+        room_id = rng.randint(1, args.rooms)
+        queries.append(((room_id % args.users) + 1, rng.choice(WORDS), room_id))
+
+    db = SessionLocal()
+    try:
+        like_p50, like_p95 = time_queries(lambda u, t, r: like_search(db, u, t), queries)
+        fts_p50, fts_p95 = time_queries(lambda u, t, r: search_message_ids(db, u, t), queries)
+        # Scoped to one conversation, the typical "find that message" case
+        room_p50, room_p95 = time_queries(lambda u, t, r: search_message_ids(db, u, t, room_id=r), queries)
+    finally:
+        db.close()
+
+    print(f"{'LIKE scan':<22} p50 {like_p50:9.2f} ms  p95 {like_p95:9.2f} ms")
+    print(f"{'FTS index':<22} p50 {fts_p50:9.2f} ms  p95 {fts_p95:9.2f} ms")
+    print(f"{'FTS index, one room':<22} p50 {room_p50:9.2f} ms  p95 {room_p95:9.2f} ms")
+
+    os.remove(DB_PATH)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pooled translation client against a local DeepL stub server.
+
+No API key or network access is needed: the stub answers DeepL-shaped
+responses with configurable latency and failure rate, so latency, retry
+and circuit breaker behaviour can be measured offline.
+
+Usage:
+    python benchmark_translation.py [--requests 500] [--concurrency 20] [--latency-ms 20]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+
+import httpx
+
+from app.routers.translation_client import TranslationClient, CircuitBreaker, TranslationServiceError
+
+class StubDeepLHandler(BaseHTTPRequestHandler):
+    """Answers POST /v2/translate like DeepL, with injected latency and failures"""
+    latency = 0.02
+    failure_rate = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        time.sleep(self.latency)
+
+        if random.random() < self.failure_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        target_lang = form.get("target_lang", ["EN"])[0]
+        body = json.dumps({
+            "translations": [
+                {"detected_source_language": "EN", "text": f"[{target_lang}] {text}"}
+                for text in form.get("text", [])
+            ]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubDeepLHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v2/translate"
+
+async def run_pooled(url, total, concurrency, breaker_threshold=5):
+    """Send requests through one shared TranslationClient"""
+    client = TranslationClient(
+        api_url=url, api_key="stub", max_concurrency=concurrency,
+        max_connections=concurrency, backoff_base=0.01,
+        breaker=CircuitBreaker(failure_threshold=breaker_threshold, reset_timeout=1.0)
+    )
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await client.translate([f"message {i}"], "DE")
+            latencies.append(time.perf_counter() - start)
+        except TranslationServiceError:
+            errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return latencies, errors, elapsed, client.get_stats()
+
+async def run_per_request(url, total, concurrency):
+    """Previous behaviour: a new AsyncClient (and TCP connection) per translation"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, data={"auth_key": "stub", "text": f"message {i}", "target_lang": "DE"})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start, {}
+
+def report(name, latencies, errors, elapsed, stats, total):
+    if latencies:
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    else:
+        p50 = p95 = p99 = 0.0
+    print(f"{name:<28} {total / elapsed:8.1f} req/s  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+          f"p99 {p99:7.2f} ms  errors {errors:4d}  {stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    server, url = start_stub_server()
+    StubDeepLHandler.latency = args.latency_ms / 1000
+
+    print(f"Stub server at {url}, {args.requests} requests, concurrency {args.concurrency}")
+
+    StubDeepLHandler.failure_rate = 0.0
+    report("client per request", *asyncio.run(run_per_request(url, args.requests, args.concurrency)), args.requests)
+    report("pooled client", *asyncio.run(run_pooled(url, args.requests, args.concurrency)), args.requests)
+
+    StubDeepLHandler.failure_rate = 0.2
+    report("pooled, 20% failures", *asyncio.run(run_pooled(url, args.requests, args.concurrency, breaker_threshold=50)), args.requests)
+
+    StubDeepLHandler.failure_rate = 1.0
+    report("pooled, provider down", *asyncio.run(run_pooled(url, args.requests, args.concurrency)), args.requests)
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
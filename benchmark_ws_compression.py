@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark permessage-deflate settings: bytes on the wire against CPU time and memory.
+
+Replays a synthetic stream of the frames the chat and presence sockets send
+(new messages, history replays, status batches, typing notifications) through
+the server's compressor and a client's decompressor, once per configuration:
+window bits, memLevel, context takeover and the size below which frames are
+sent uncompressed. Reports the share of bytes saved, CPU time per frame on each
+side and the zlib memory a connection holds between messages.
+
+Usage:
+    python benchmark_ws_compression.py [--frames 20000] [--seed 42]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from app.routers.ws_compression import ThresholdPerMessageDeflate
+
+WORDS = [
+    "swamp", "ogre", "donkey", "dragon", "castle", "princess", "waffles", "onion",
+    "layers", "parfait", "farquaad", "gingerbread", "knight", "tower", "bridge",
+    "the", "a", "is", "we", "you", "tonight", "later", "really", "so", "and", "ok", "lol",
+]
+USERS = [("fiona", "Princess Fiona"), ("donkey", "Donkey"), ("shrek", "Shrek"), ("puss", "Puss in Boots")]
+
+# (label, window bits, memLevel, context takeover, uncompressed below this many bytes); None is no compression
+CONFIGS = [
+    ("off", None),
+    ("15 bits, memLevel 8", (15, 8, True, 0)),
+    ("12 bits, memLevel 5", (12, 5, True, 0)),
+    ("12 bits, >= 256 B (default)", (12, 5, True, 256)),
+    ("12 bits, no takeover", (12, 5, False, 0)),
+    ("10 bits, memLevel 3", (10, 3, True, 256)),
+    ("9 bits, memLevel 1", (9, 1, True, 256)),
+]
+
+def chat_message(rng, message_id, when):
+    username, full_name = rng.choice(USERS)
+    return {
+        "id": message_id,
+        "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 25))),
+        "sender_id": USERS.index((username, full_name)) + 1,
+        "sender": username,
+        "sender_name": full_name,
+        "sender_avatar": f"/static/uploads/avatars/{username}.jpg",
+        "room_id": 4182,
+        "timestamp": when.isoformat(),
+        "time": when.strftime("%H:%M"),
+        "delivered": False,
+        "read": False,
+        "is_group": True
+    }
+
+def frame_stream(total, seed):
+    """Encoded frames in roughly the mix a busy group chat socket sees"""
+    rng = random.Random(seed)
+    when = datetime(2024, 6, 1, 18, 0)
+    message_id = 100000
+    stream = []
+    while len(stream) < total:
+        kind = rng.random()
+        when += timedelta(seconds=rng.randint(1, 40))
+        message_id += 1
+        if kind < 0.45:
+            frame = {"type": "message", "message": chat_message(rng, message_id, when), "seq": message_id}
+        elif kind < 0.75:
+            username, _ = rng.choice(USERS)
+            frame = {"type": "typing", "room_id": 4182, "user_id": USERS.index((username, _)) + 1,
+                     "username": username, "status": rng.choice(["typing", "idle"])}
+        elif kind < 0.9:
+            frame = {"type": "status_batch", "statuses": [
+                {"user_id": i, "username": f"user{i}", "status": rng.choice(["online", "offline"])}
+                for i in rng.sample(range(1, 500), rng.randint(1, 12))
+            ]}
+        else:
+            # A page of history replayed after a reconnect
+            frame = {"type": "message_history", "messages": [
+                chat_message(rng, message_id - i, when - timedelta(minutes=i)) for i in range(50)
+            ]}
+        stream.append(json.dumps(frame).encode())
+    return stream
+
+def run_config(stream, settings):
+    """(wire bytes, server µs per frame, client µs per frame, memory per connection, compressed frames)"""
+    if settings is None:
+        return sum(len(data) for data in stream), 0.0, 0.0, 0, 0
+    bits, mem_level, takeover, min_size = settings
+    compress_settings = {"memLevel": mem_level}
+    server = ThresholdPerMessageDeflate(not takeover, not takeover, bits, bits, compress_settings, min_size=min_size)
+    client = PerMessageDeflate(not takeover, not takeover, bits, bits, compress_settings)
+
+    encoded = []
+    start = time.process_time()
+    for data in stream:
+        encoded.append(server.encode(Frame(Opcode.TEXT, data)))
+    server_time = time.process_time() - start
+
+    start = time.process_time()
+    for frame, data in zip(encoded, stream):
+        assert client.decode(frame).data == data
+    client_time = time.process_time() - start
+
+    memory = (1 << (bits + 2)) + (1 << (mem_level + 9)) + (1 << bits) if takeover else 0
+    compressed = sum(1 for frame in encoded if frame.rsv1)
+    return (
+        sum(len(frame.data) for frame in encoded),
+        server_time / len(stream) * 1e6,
+        client_time / len(stream) * 1e6,
+        memory,
+        compressed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    stream = frame_stream(args.frames, args.seed)
+    raw = sum(len(data) for data in stream)
+    print(f"{args.frames} frames, {raw / 1024:.0f} KiB uncompressed, {raw / len(stream):.0f} B average")
+    print(f"{'configuration':<30} {'KiB':>8} {'saved':>7} {'compressed':>11} {'server µs':>10} {'client µs':>10} {'KiB/conn':>9}")
+    for label, settings in CONFIGS:
+        wire, server_us, client_us, memory, compressed = run_config(stream, settings)
+        print(
+            f"{label:<30} {wire / 1024:>8.0f} {1 - wire / raw:>7.1%} {compressed / len(stream):>11.0%} "
+            f"{server_us:>10.1f} {client_us:>10.1f} {memory / 1024:>9.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
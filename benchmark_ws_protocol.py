@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chat WebSocket protocol: frames per second per connection, JSON against MessagePack.
+
+Serves a socket that negotiates its encoding like /ws/chat and routes frames
+through a WebSocketDispatcher with the real frame schemas, echoing each one
+back the way ICE candidates are relayed. One client connection per encoding
+keeps a window of frames in flight; client and server share the event loop, so
+the rate covers both ends' encoding, decoding and validation. MessagePack is
+skipped when the msgpack package is not installed.
+
+Usage:
+    python benchmark_ws_protocol.py [--frames 20000] [--window 64] [--port 8765]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from websockets.asyncio.client import connect
+
+from app.routers.ws_protocol import (
+    WebSocketDispatcher, accept_websocket, receive_frame, msgpack,
+    JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, ChatMessageFrame, IceCandidateFrame, TypingFrame
+)
+
+# Typical frames: a high-rate call signalling frame, a chat message and a typing notification
+FRAMES = {
+    "call_ice_candidate": {
+        "type": "call_ice_candidate",
+        "room_id": 4182,
+        "target_user_id": 917,
+        "candidate": {
+            "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.17 51472 typ srflx "
+                         "raddr 192.168.1.23 rport 51472 generation 0 ufrag EsAw network-cost 999",
+            "sdpMid": "0",
+            "sdpMLineIndex": 0,
+            "usernameFragment": "EsAw"
+        }
+    },
+    "message": {
+        "type": "message",
+        "room_id": 4182,
+        "content": "Better out than in, I always say. Meet at the swamp at eight?",
+        "temp_id": "temp-1718023399123"
+    },
+    "typing": {"type": "typing", "room_id": 4182, "status": "typing"}
+}
+
+dispatcher = WebSocketDispatcher()
+
+async def echo(websocket, user, message_data, db):
+    await websocket.send_json(message_data)
+
+dispatcher.register("call_ice_candidate", IceCandidateFrame)(echo)
+dispatcher.register("message", ChatMessageFrame)(echo)
+dispatcher.register("typing", TypingFrame)(echo)
+
+app = FastAPI()
+
+@app.websocket("/ws")
+async def echo_endpoint(websocket: WebSocket):
+    websocket = await accept_websocket(websocket)
+    try:
+        while True:
+            await dispatcher.dispatch(websocket, None, await receive_frame(websocket), None)
+    except WebSocketDisconnect:
+        pass
+
+def codecs():
+    yield JSON_SUBPROTOCOL, lambda data: json.dumps(data), json.loads
+    if msgpack is not None:
+        yield MSGPACK_SUBPROTOCOL, msgpack.packb, msgpack.unpackb
+
+async def run_connection(port, subprotocol, encode, decode, frame, total, window):
+    """Frames per second echoed over one connection with up to window frames in flight"""
+    payload = encode(frame)
+    async with connect(f"ws://127.0.0.1:{port}/ws", subprotocols=[subprotocol], compression=None) as ws:
+        assert ws.subprotocol == subprotocol, f"server chose {ws.subprotocol}"
+        start = time.perf_counter()
+        sent = received = 0
+        while received < total:
+            while sent < total and sent - received < window:
+                await ws.send(payload)
+                sent += 1
+            reply = decode(await ws.recv())
+            assert reply["type"] == frame["type"], reply
+            received += 1
+        elapsed = time.perf_counter() - start
+    return total / elapsed, len(payload)
+
+async def run(args):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        if msgpack is None:
+            print("msgpack is not installed; measuring JSON only")
+        print(f"{'frame':<20} {'encoding':<20} {'bytes':>7} {'frames/s':>10}")
+        for name, frame in FRAMES.items():
+            for subprotocol, encode, decode in codecs():
+                rate, size = await run_connection(args.port, subprotocol, encode, decode, frame, args.frames, args.window)
+                print(f"{name:<20} {subprotocol:<20} {size:>7} {rate:>10.0f}")
+    finally:
+        server.should_exit = True
+        await serving
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--window", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
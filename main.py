@@ -21,7 +21,19 @@ from app.routers.sendAttach import router as sendAttach_router
 from app.routers.translate import router as translate_router
 from app.routers.block_users import router as block_users_router
 from app.routers.sendAudio import router as sendAudio_router
-from app.routers.admin import router as admin_router
+from app.routers.admin import router as admin_router, login_router as admin_login_router
+from app.routers.message_search import router as message_search_router
+from app.routers.sync import router as sync_router
+from app.routers.archive import router as archive_router
+from app.routers.export import router as export_router
+from app.routers.deletion_jobs import router as deletion_jobs_router
+from app.routers.background import start_periodic_tasks, stop_periodic_tasks
+from app.routers.translation_client import translation_client
+from app.routers.delivery import delivery_tracker
+from app.routers.activity import activity_tracker
+from app.routers.presence import presence_service
+from app.routers.presence_broadcast import presence_broadcaster
+from app.routers.ws_compression import CompressedWebSocketProtocol
 
 app = FastAPI(title="ShrekChat")
 
@@ -53,7 +65,29 @@ app.include_router(sendAttach_router)
 app.include_router(translate_router)
 app.include_router(block_users_router)
 app.include_router(sendAudio_router)
+app.include_router(admin_login_router)
 app.include_router(admin_router)
+app.include_router(message_search_router)
+app.include_router(sync_router)
+app.include_router(archive_router)
+app.include_router(export_router)
+app.include_router(deletion_jobs_router)
+
+# Start periodic maintenance jobs (event log purges etc.)
+@app.on_event("startup")
+async def startup_event():
+    presence_service.reset()
+    start_periodic_tasks()
+
+# Stop maintenance jobs and close pooled outbound connections on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_periodic_tasks()
+    presence_broadcaster.close()
+    presence_service.shutdown()
+    await delivery_tracker.flush()
+    activity_tracker.flush()
+    await translation_client.close()
 
 # Root route redirects to login
 @app.get("/", response_class=HTMLResponse)
@@ -64,4 +98,6 @@ if __name__ == "__main__":
     # Get host and port from environment or use defaults
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run("main:app", host=host, port=port, reload=True)
\ No newline at end of file
+    reload = os.getenv("RELOAD", "true").lower() == "true"
+    # The WebSocket protocol is passed as a class so the WS_DEFLATE_* settings apply
+    uvicorn.run("main:app", host=host, port=port, reload=reload, ws=CompressedWebSocketProtocol)
\ No newline at end of file
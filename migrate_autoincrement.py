@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Migration script to make message and user IDs AUTOINCREMENT on SQLite databases.
+Without it, IDs freed by deletes are handed out again and can hide new rows from
+sync cursors, archive segments, clear-chat watermarks and the stats rollups.
+
+Stop the app before running it: every row of both tables is copied.
+"""
+from sqlalchemy import inspect, select, func
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql import text
+from app.database import engine, Message, User, MessageArchiveSegment, DeletionJob, RollupState, missing_autoincrement
+
+def high_water_mark(conn, *columns) -> int:
+    """Largest value ever stored in any of the given columns (0 when all are empty)"""
+    return max((conn.execute(select(func.max(column))).scalar() or 0) for column in columns)
+
+def rollup_watermark(conn, name: str) -> int:
+    """Last source row ID the named stats rollup has already counted"""
+    return conn.execute(select(RollupState.last_id).where(RollupState.name == name)).scalar() or 0
+
+def rebuild_with_autoincrement(conn, table, high_water: int):
+    """
+    Recreate `table` with AUTOINCREMENT so deleted IDs are never handed out again
+
+    SQLite cannot alter a primary key in place, so the rows are copied into a new table
+    that replaces the old one, and its indexes and triggers are recreated from their stored
+    SQL. The sequence starts after high_water, which covers IDs that were deleted before the
+    rebuild but may still be remembered elsewhere (cursors, watermarks).
+    """
+    if not missing_autoincrement(conn, table):
+        return
+    print(f"Rebuilding {table.name} with AUTOINCREMENT...")
+    dependents = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = :name AND sql IS NOT NULL"
+    ), {"name": table.name}).scalars().all()
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+
+    staging = f"{table.name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {staging} ", 1)))
+    conn.execute(text(f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {table.name}"))
+    for statement in dependents:
+        conn.execute(text(statement))
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {
+        "name": table.name,
+        "seq": max(high_water, conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table.name}")).scalar())
+    })
+
+def main():
+    if engine.dialect.name != "sqlite":
+        print("Only SQLite databases need this migration.")
+        return
+
+    print("Starting migration of message and user IDs...")
+    try:
+        with engine.begin() as conn:
+            # Start after any ID a sync cursor, archive segment, clear-chat watermark or stats rollup may still point at
+            rebuild_with_autoincrement(conn, Message.__table__, max(
+                high_water_mark(conn, Message.id, MessageArchiveSegment.last_message_id, DeletionJob.watermark),
+                rollup_watermark(conn, "messages")
+            ))
+            rebuild_with_autoincrement(conn, User.__table__, rollup_watermark(conn, "registrations"))
+        print("Migration completed successfully!")
+    except Exception as e:
+        print(f"Error during migration: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import itertools
+import os
+import sys
+import tempfile
+
+# The app creates its engine and schema on import, so point it at a throwaway database first
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.database import SessionLocal, User, Room, room_members
+from app.routers.direct_rooms import get_or_create_direct_room
+
+_names = itertools.count(1)
+
+class FakeWebSocket:
+    """Collects what the server sends to a socket"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def make_user(db):
+    """Create a user directly in the database"""
+    def make(**fields):
+        name = fields.pop("username", None) or f"user{next(_names)}"
+        user = User(username=name, email=f"{name}@example.com", hashed_password="x", full_name=name, **fields)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    return make
+
+@pytest.fixture
+def make_room(db):
+    """Create a group room with the given members"""
+    def make(*users, is_group=True):
+        room = Room(name="room", is_group=is_group)
+        db.add(room)
+        db.flush()
+        for user in users:
+            db.execute(room_members.insert().values(room_id=room.id, user_id=user.id))
+        db.commit()
+        return room
+    return make
+
+@pytest.fixture
+def client_for():
+    """A TestClient logged in as a freshly registered user"""
+    def login(name=None):
+        name = name or f"client{next(_names)}"
+        client = TestClient(main.app)
+        client.post("/register", data={
+            "username": name, "email": f"{name}@example.com",
+            "password": "pw123456", "confirm_password": "pw123456"
+        }, follow_redirects=False)
+        response = client.post("/login", data={"username": name, "password": "pw123456"}, follow_redirects=False)
+        assert response.status_code == 303, response.text
+        client.username = name
+        return client
+    return login
+
+@pytest.fixture
+def direct_room(db):
+    """The direct chat between two users, created if needed"""
+    def make(a, b):
+        room_id, _ = get_or_create_direct_room(db, a.id, b.id, f"{a.username} & {b.username}")
+        return room_id
+    return make
@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+import main
+from app.routers import admin
+
+EXPORT = "/api/admin/users/export.csv"
+
+def test_admin_api_requires_a_login():
+    assert TestClient(main.app).get(EXPORT).status_code == 401
+
+def test_admin_api_requires_the_admin_password(client_for):
+    client = client_for()
+    assert client.get(EXPORT).status_code == 403
+    assert client.post("/api/admin/login", json={"password": "not it"}).status_code == 403
+    assert client.get(EXPORT).status_code == 403
+
+def test_admin_session_can_export_users(client_for):
+    client = client_for()
+    assert client.post("/api/admin/login", json={"password": admin.ADMIN_PASSWORD}).status_code == 200
+    response = client.get(EXPORT)
+    assert response.status_code == 200
+    assert client.username in response.text
+
+    client.get("/logout")
+    assert client.get(EXPORT).status_code == 401
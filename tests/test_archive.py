@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import os
+
+import pytest
+
+from app.database import Message, MessageArchiveSegment, RoomRetentionPolicy, User
+from app.routers import archive, attachments
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    """Uploads and archive segments in a temporary directory"""
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(attachments, "UPLOADS_DIR", uploads)
+    monkeypatch.setattr(archive, "MESSAGE_ARCHIVE_DIR", str(tmp_path / "archive"))
+    return uploads
+
+def attachment(uploads, name):
+    (uploads / name).write_bytes(b"swamp")
+    return f"<img-attachment src='/static/uploads/{name}' filename='{name}'>"
+
+def test_archiving_is_off_by_default():
+    if "MESSAGE_ARCHIVE_AFTER_DAYS" not in os.environ:
+        assert archive.MESSAGE_ARCHIVE_AFTER_DAYS == 0
+
+def test_retention_deletes_in_batches_and_removes_files(monkeypatch, db, make_user, make_room, storage):
+    monkeypatch.setattr(archive, "MESSAGE_RETENTION_BATCH", 2)
+    user = make_user()
+    room = make_room(user)
+    old = datetime.utcnow() - timedelta(days=10)
+    expired = [
+        Message(room_id=room.id, sender_id=user.id, content=attachment(storage, f"old{i}.png"), timestamp=old)
+        for i in range(5)
+    ]
+    kept = Message(room_id=room.id, sender_id=user.id, content=attachment(storage, "new.png"))
+    db.add_all(expired + [kept])
+    db.commit()
+
+    policy = RoomRetentionPolicy(room_id=room.id, retention_days=7)
+    assert archive.apply_retention(db, {room.id: policy}, datetime.utcnow()) == 5
+
+    db.expire_all()
+    assert [m.id for m in db.query(Message).filter(Message.room_id == room.id)] == [kept.id]
+    assert sorted(path.name for path in storage.iterdir()) == ["new.png"]
+
+def test_retention_drops_expired_segments_with_their_files(db, make_user, make_room, storage):
+    user = make_user()
+    room = make_room(user)
+    old = datetime.utcnow() - timedelta(days=10)
+    records = [{
+        "id": 1, "content": attachment(storage, "archived.png"), "sender_id": user.id,
+        "timestamp": old.isoformat(), "audio": {"url": "/static/uploads/voice.ogg"}
+    }]
+    (storage / "voice.ogg").write_bytes(b"hee-haw")
+    path = archive.write_segment(room.id, records)
+    db.add(MessageArchiveSegment(
+        room_id=room.id, first_message_id=1, last_message_id=1, message_count=1,
+        oldest_at=old, newest_at=old, path=path, size_bytes=1
+    ))
+    db.commit()
+
+    policy = RoomRetentionPolicy(room_id=room.id, retention_days=7)
+    assert archive.apply_retention(db, {room.id: policy}, datetime.utcnow()) == 1
+
+    assert db.query(MessageArchiveSegment).filter(MessageArchiveSegment.room_id == room.id).count() == 0
+    assert list(storage.iterdir()) == []
+    assert not os.path.exists(os.path.join(archive.MESSAGE_ARCHIVE_DIR, path))
+
+def test_direct_chat_retention_needs_both_members(db, client_for, direct_room):
+    alice, bob = client_for(), client_for()
+    users = {user.username: user for user in db.query(User).filter(User.username.in_([alice.username, bob.username]))}
+    room_id = direct_room(users[alice.username], users[bob.username])
+    url = f"/api/rooms/{room_id}/retention"
+
+    body = alice.put(url, json={"retention_days": 1}).json()
+    assert body["retention_days"] is None
+    assert body["proposal"] == {"proposed_by": users[alice.username].id, "retention_days": 1, "archive_after_days": None}
+
+    # Asking again alone changes nothing; a different answer replaces the proposal
+    assert alice.put(url, json={"retention_days": 1}).json()["retention_days"] is None
+    assert bob.put(url, json={"retention_days": 30}).json()["proposal"]["proposed_by"] == users[bob.username].id
+
+    body = alice.put(url, json={"retention_days": 30}).json()
+    assert body["retention_days"] == 30
+    assert body["proposal"] is None
+    assert bob.get(url).json()["retention_days"] == 30
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+from app.database import Message, AudioMetadata
+from app.routers import audio_processing
+from app.routers.session import active_connections
+from tests.conftest import FakeWebSocket
+
+def test_serialize_prefers_transcoded_copy():
+    metadata = AudioMetadata(
+        message_id=1, duration=61.5, waveform=json.dumps([0, 50, 100]),
+        transcoded_url="/static/uploads/a.ogg", original_size=9000, transcoded_size=3000
+    )
+    assert audio_processing.serialize_audio_metadata(metadata, "/static/uploads/a.webm") == {
+        "duration": 61.5, "waveform": [0, 50, 100], "url": "/static/uploads/a.ogg", "size": 3000
+    }
+
+def test_serialize_without_transcode_falls_back_to_upload():
+    metadata = AudioMetadata(message_id=1, duration=2.0, waveform=None, original_size=9000)
+    serialized = audio_processing.serialize_audio_metadata(metadata, "/static/uploads/a.webm")
+    assert serialized["url"] == "/static/uploads/a.webm"
+    assert serialized["waveform"] == []
+    assert serialized["size"] == 9000
+
+def test_processed_audio_is_stored_and_pushed_to_members(monkeypatch, db, make_user, make_room, tmp_path):
+    sender, member = make_user(), make_user()
+    room = make_room(sender, member)
+    message = Message(room_id=room.id, sender_id=sender.id, content="<audio-attachment src='/a.webm'>")
+    db.add(message)
+    db.commit()
+
+    monkeypatch.setattr(audio_processing, "ffmpeg_available", lambda: True)
+    monkeypatch.setattr(audio_processing, "process_audio_file", lambda path: {
+        "duration": 3.2, "waveform": [10, 100, 40], "original_size": 4000,
+        "transcoded_path": None, "transcoded_size": None
+    })
+    ws = FakeWebSocket()
+    active_connections[member.username] = {ws}
+    try:
+        asyncio.run(audio_processing.process_audio_message(message.id, str(tmp_path / "a.webm"), "/a.webm"))
+    finally:
+        active_connections.pop(member.username, None)
+
+    db.expire_all()
+    stored = db.query(AudioMetadata).filter(AudioMetadata.message_id == message.id).one()
+    assert stored.duration == 3.2
+    assert ws.sent == [{
+        "type": "audio_processed",
+        "message_id": message.id,
+        "room_id": room.id,
+        "audio": {"duration": 3.2, "waveform": [10, 100, 40], "url": "/a.webm", "size": 4000}
+    }]
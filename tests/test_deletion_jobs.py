@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from app.database import (
+    SessionLocal, Message, DeletionJob, BlockedUser, SyncEvent, UserEvent, UserEventCounter, UserDailyRollup,
+    User, room_members
+)
+from app.routers import deletion_jobs
+from app.routers.deletion_jobs import (
+    add_tombstone, claim_job, enqueue_deletion, is_message_hidden, load_tombstones, run_deletion_jobs, tombstones
+)
+
+def add_message(db, room, user, content="ogre"):
+    message = Message(room_id=room.id, sender_id=user.id, content=content)
+    db.add(message)
+    db.commit()
+    return message
+
+def test_readers_get_a_snapshot_of_the_tombstones():
+    add_tombstone(SimpleNamespace(kind="clear_room", target_id=10 ** 6, watermark=5))
+    rooms, senders = tombstones()
+
+    # The job runner thread adds and reloads tombstones while a request iterates its copy
+    add_tombstone(SimpleNamespace(kind="user", target_id=10 ** 6, watermark=0))
+    load_tombstones()
+
+    assert rooms[10 ** 6] == 5
+    assert 10 ** 6 not in senders
+    assert 10 ** 6 not in tombstones()[0]
+
+def test_jobs_queued_by_another_worker_are_hidden_after_a_refresh(make_user, make_room, db):
+    user = make_user()
+    room = make_room(user)
+    message = add_message(db, room, user)
+
+    other_worker = SessionLocal()
+    try:
+        other_worker.add(DeletionJob(kind="clear_room", target_id=room.id, watermark=message.id, status="pending"))
+        other_worker.commit()
+    finally:
+        other_worker.close()
+
+    assert not is_message_hidden(room.id, message.id, user.id)
+    load_tombstones()
+    assert is_message_hidden(room.id, message.id, user.id)
+
+def test_failed_jobs_stay_hidden_across_restarts_and_are_retried(monkeypatch, make_user, make_room, db):
+    user = make_user()
+    room = make_room(user)
+    message = add_message(db, room, user)
+    job = enqueue_deletion(db, "clear_room", room.id)
+    db.commit()
+
+    real_delete_batch = deletion_jobs.delete_batch
+    def flaky_delete_batch(session, running_job):
+        if running_job.id == job.id:
+            raise OSError("disk full")
+        return real_delete_batch(session, running_job)
+    monkeypatch.setattr(deletion_jobs, "delete_batch", flaky_delete_batch)
+    run_deletion_jobs()
+    db.refresh(job)
+    assert job.status == "failed"
+
+    # A restart rebuilds the tombstones from the database
+    deletion_jobs.hidden_rooms.clear()
+    load_tombstones()
+    assert is_message_hidden(room.id, message.id, user.id)
+
+    monkeypatch.setattr(deletion_jobs, "delete_batch", real_delete_batch)
+    monkeypatch.setattr(deletion_jobs, "DELETION_RETRY_DELAY", 0)
+    run_deletion_jobs()
+    db.refresh(job)
+    assert job.status == "done"
+    assert job.error is None
+    assert db.query(Message).filter(Message.room_id == room.id).count() == 0
+    assert not is_message_hidden(room.id, message.id, user.id)
+
+def test_only_one_worker_claims_a_job(db, make_user, make_room):
+    room = make_room(make_user())
+    job = enqueue_deletion(db, "clear_room", room.id)
+    db.commit()
+
+    workers = [SessionLocal(), SessionLocal()]
+    try:
+        assert [claim_job(worker, job.id) for worker in workers] == [True, False]
+    finally:
+        for worker in workers:
+            worker.close()
+    db.refresh(job)
+    assert job.status == "running"
+
+    # The worker that claimed it stopped without finishing; once its lease runs out another one takes over
+    job.lease_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    run_deletion_jobs()
+    db.refresh(job)
+    assert job.status == "done"
+
+def test_deleting_a_user_removes_the_rows_that_refer_to_them(make_user, make_room, db):
+    user, friend = make_user(), make_user()
+    room = make_room(user, friend)
+    add_message(db, room, user)
+    db.add_all([
+        BlockedUser(user_id=friend.id, blocked_user_id=user.id),
+        UserEvent(user_id=user.id, seq=1, type="new_message", payload="{}"),
+        UserEventCounter(user_id=user.id, last_seq=1),
+        SyncEvent(type="profile", subject_id=user.id, payload="{}"),
+        UserDailyRollup(day=date.today(), user_id=user.id, message_count=1),
+    ])
+    db.commit()
+    user_id, friend_id = user.id, friend.id
+
+    enqueue_deletion(db, "user", user_id)
+    db.commit()
+    run_deletion_jobs()
+
+    db.expunge_all()
+    assert db.query(User).filter(User.id == user_id).count() == 0
+    assert db.query(room_members).filter(room_members.c.user_id == user_id).count() == 0
+    for model, column in [
+        (BlockedUser, BlockedUser.blocked_user_id), (UserEvent, UserEvent.user_id),
+        (UserEventCounter, UserEventCounter.user_id), (SyncEvent, SyncEvent.subject_id),
+        (UserDailyRollup, UserDailyRollup.user_id), (Message, Message.sender_id),
+    ]:
+        assert db.query(model).filter(column == user_id).count() == 0, model.__name__
+    assert db.query(room_members).filter(room_members.c.user_id == friend_id).count() == 1
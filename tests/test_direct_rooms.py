@@ -0,0 +1,22 @@
+from app.routers.deletion_jobs import enqueue_deletion, run_deletion_jobs
+from app.routers.direct_rooms import direct_room_cache, get_direct_room_id, pair_key
+
+def test_lookup_is_cached_and_symmetric(db, make_user, direct_room):
+    a, b = make_user(), make_user()
+    room_id = direct_room(a, b)
+    assert direct_room_cache[pair_key(a.id, b.id)] == room_id
+    assert get_direct_room_id(db, b.id, a.id) == room_id
+
+def test_deleted_room_is_evicted_from_the_cache(db, make_user, direct_room):
+    a, b = make_user(), make_user()
+    room_id = direct_room(a, b)
+    enqueue_deletion(db, "room", room_id)
+    db.commit()
+
+    # A lookup while the job is queued caches the pair again from the still-present row
+    assert get_direct_room_id(db, a.id, b.id) == room_id
+    run_deletion_jobs()
+
+    assert pair_key(a.id, b.id) not in direct_room_cache
+    db.expire_all()
+    assert get_direct_room_id(db, a.id, b.id) is None
@@ -0,0 +1,63 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+UTILS_JS = Path(__file__).resolve().parent.parent / "app" / "static" / "js" / "utils.js"
+
+# Just enough of the DOM for updateMessageStatus: one outgoing message with its tick icons
+HARNESS = """
+const fs = require('fs');
+const vm = require('vm');
+function icon(display) {
+    const classes = new Set();
+    return {
+        style: { display },
+        classList: {
+            add: (name) => classes.add(name),
+            remove: (name) => classes.delete(name),
+            contains: (name) => classes.has(name)
+        }
+    };
+}
+const single = icon('inline'), double = icon('none');
+const message = {
+    querySelector: (selector) => selector === '.message-status-single' ? single : double
+};
+const shown = new Set(process.argv[2] === 'rendered' ? ['1'] : []);
+global.window = {};
+global.document = {
+    querySelector: (selector) => shown.has(selector.match(/data-message-id="(\\d+)"/)[1]) ? message : null
+};
+vm.runInThisContext(fs.readFileSync(process.argv[1], 'utf8'));
+for (const status of JSON.parse(process.argv[3])) {
+    window.shrekChatUtils.updateMessageStatus(1, status);
+}
+console.log(JSON.stringify({
+    single: single.style.display,
+    double: double.style.display,
+    read: double.classList.contains('read'),
+    pending: (window.pendingMessageStatuses || {})[1] || null
+}));
+"""
+
+def run_statuses(statuses, rendered=True):
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node is not installed")
+    result = subprocess.run(
+        [node, "-e", HARNESS, str(UTILS_JS), "rendered" if rendered else "hidden", json.dumps(statuses)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_delivered_then_read_shows_read_ticks():
+    assert run_statuses(["delivered", "read"]) == {"single": "none", "double": "inline", "read": True, "pending": None}
+
+def test_late_delivered_receipt_keeps_read_ticks():
+    assert run_statuses(["read", "delivered"]) == {"single": "none", "double": "inline", "read": True, "pending": None}
+
+def test_late_delivered_receipt_keeps_pending_read_status():
+    assert run_statuses(["read", "delivered"], rendered=False)["pending"] == "read"
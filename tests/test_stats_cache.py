@@ -0,0 +1,34 @@
+import asyncio
+
+from app.routers.stats_cache import StatsCache
+
+def compute(db):
+    return {"success": True, "value": 42}
+
+def test_fresh_then_stale_then_expired(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.routers.stats_cache.time.monotonic", lambda: clock[0])
+    cache = StatsCache(ttl=10, stale_ttl=20)
+
+    async def scenario():
+        statuses = [(await cache.get("users", compute))[1]]
+        statuses.append((await cache.get("users", compute))[1])
+        clock[0] += 15
+        statuses.append((await cache.get("users", compute))[1])
+        await asyncio.sleep(0)  # Let the background refresh finish
+        clock[0] += 100
+        statuses.append((await cache.get("users", compute))[1])
+        return statuses
+
+    assert asyncio.run(scenario()) == ["MISS", "HIT", "STALE", "MISS"]
+
+def test_entries_are_bounded():
+    cache = StatsCache(maxsize=3)
+
+    async def scenario():
+        for day in range(10):
+            await cache.get(f"retention:2024-01-{day + 1:02d}:7", compute)
+
+    asyncio.run(scenario())
+    assert len(cache.entries) == 3
+    assert cache.get_stats()["keys"] == 3
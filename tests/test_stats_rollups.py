@@ -0,0 +1,29 @@
+from app.database import User, Message, MessageHourlyRollup
+from app.routers.stats_rollups import refresh_rollups
+
+def room_total(db, room_id):
+    return sum(row.message_count for row in db.query(MessageHourlyRollup).filter(MessageHourlyRollup.room_id == room_id))
+
+def test_messages_after_a_purge_of_the_newest_rows_are_counted(db, make_user, make_room):
+    user = make_user()
+    room = make_room(user)
+    newest = Message(room_id=room.id, sender_id=user.id, content="counted once")
+    db.add(newest)
+    db.commit()
+    refresh_rollups()
+
+    db.delete(newest)
+    db.commit()
+    replacement = Message(room_id=room.id, sender_id=user.id, content="must be counted too")
+    db.add(replacement)
+    db.commit()
+    refresh_rollups()
+
+    db.expire_all()
+    assert room_total(db, room.id) == 2
+
+def test_users_registered_after_a_deletion_get_fresh_ids(db, make_user):
+    deleted = make_user()
+    db.delete(deleted)
+    db.commit()
+    assert make_user().id > deleted.id
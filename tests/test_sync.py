@@ -0,0 +1,89 @@
+from sqlalchemy import create_engine, text
+
+from app.database import Base, User, Message, upgrade_schema
+from migrate_autoincrement import rebuild_with_autoincrement
+
+def test_sync_delivers_messages_after_a_cursor(db, client_for, make_room):
+    alice = client_for()
+    user = db.query(User).filter(User.username == alice.username).one()
+    room = make_room(user)
+    cursor = alice.get("/api/sync").json()["cursor"]
+
+    message = Message(room_id=room.id, sender_id=user.id, content="first")
+    db.add(message)
+    db.commit()
+
+    body = alice.get("/api/sync", params={"cursor": cursor}).json()
+    assert body["reset"] is False
+    assert [m["id"] for m in body["messages"]] == [message.id]
+    assert body["cursor"].split(".")[0] == str(message.id)
+
+def test_deleting_the_newest_message_does_not_hide_the_next_one(db, client_for, make_room):
+    alice = client_for()
+    user = db.query(User).filter(User.username == alice.username).one()
+    room = make_room(user)
+    newest = Message(room_id=room.id, sender_id=user.id, content="soon gone")
+    db.add(newest)
+    db.commit()
+    cursor = alice.get("/api/sync").json()["cursor"]
+    assert cursor.split(".")[0] == str(newest.id)
+
+    # Clearing the chat or purging the newest rows must not let the next message reuse the ID
+    db.delete(newest)
+    db.commit()
+    replacement = Message(room_id=room.id, sender_id=user.id, content="after the purge")
+    db.add(replacement)
+    db.commit()
+
+    assert replacement.id > newest.id
+    body = alice.get("/api/sync", params={"cursor": cursor}).json()
+    assert [m["id"] for m in body["messages"]] == [replacement.id]
+
+def test_legacy_messages_table_is_rebuilt_with_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER NOT NULL PRIMARY KEY, room_id INTEGER NOT NULL, "
+            "sender_id INTEGER NOT NULL, content TEXT NOT NULL, timestamp DATETIME)"
+        ))
+        conn.execute(text("CREATE INDEX ix_messages_room ON messages (room_id)"))
+        conn.execute(text("CREATE TABLE seen (id INTEGER)"))
+        conn.execute(text("INSERT INTO messages (id, room_id, sender_id, content) VALUES (1, 1, 1, 'a'), (2, 1, 1, 'b')"))
+        conn.execute(text("CREATE TRIGGER messages_seen AFTER INSERT ON messages BEGIN INSERT INTO seen VALUES (new.id); END"))
+
+    with engine.begin() as conn:
+        # ID 5 was deleted before the upgrade but a watermark still points at it
+        rebuild_with_autoincrement(conn, Message.__table__, 5)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO messages (room_id, sender_id, content, is_translated) VALUES (1, 1, 'c', 0)"))
+        ids = conn.execute(text("SELECT id FROM messages ORDER BY id")).scalars().all()
+        created = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'messages'")).scalar()
+        names = set(conn.execute(text("SELECT name FROM sqlite_master WHERE tbl_name = 'messages'")).scalars())
+        seen = conn.execute(text("SELECT id FROM seen")).scalars().all()
+
+    assert ids == [1, 2, 6]
+    assert "AUTOINCREMENT" in created
+    assert {"ix_messages_room", "messages_seen"} <= names
+    assert seen == [6]
+    engine.dispose()
+
+def test_startup_leaves_legacy_tables_to_the_migration_script(tmp_path, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE messages"))
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER NOT NULL PRIMARY KEY, room_id INTEGER NOT NULL, "
+            "sender_id INTEGER NOT NULL, content TEXT NOT NULL, timestamp DATETIME, is_translated BOOLEAN)"
+        ))
+        conn.execute(text("INSERT INTO messages (id, room_id, sender_id, content) VALUES (1, 1, 1, 'a')"))
+
+    upgrade_schema(engine)
+    with engine.begin() as conn:
+        created = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'messages'")).scalar()
+        ids = conn.execute(text("SELECT id FROM messages")).scalars().all()
+    engine.dispose()
+
+    assert "AUTOINCREMENT" not in created
+    assert ids == [1]
+    assert "run migrate_autoincrement.py" in capsys.readouterr().out
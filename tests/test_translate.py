@@ -0,0 +1,89 @@
+import itertools
+
+import pytest
+
+from app.database import SessionLocal, User, Message, MessageTranslation
+from app.routers.translation_client import translation_client
+
+_texts = itertools.count(1)
+
+class StubProvider:
+    """Stands in for DeepL: records the texts it was asked for and upper-cases them"""
+
+    def __init__(self):
+        self.requests = []
+        self.hooks = []  # Run during a request, while the endpoint awaits the provider
+
+    async def translate(self, texts, target_lang):
+        self.requests.append(list(texts))
+        for hook in self.hooks:
+            hook()
+        return [text.upper() for text in texts]
+
+@pytest.fixture
+def provider(monkeypatch):
+    stub = StubProvider()
+    monkeypatch.setattr(translation_client, "api_key", "key")
+    monkeypatch.setattr(translation_client, "translate", stub.translate)
+    return stub
+
+@pytest.fixture
+def chat(db, client_for, make_room):
+    """Two logged-in members of a room with one message from the first"""
+    alice, bob = client_for(), client_for()
+    users = [db.query(User).filter(User.username == client.username).one() for client in (alice, bob)]
+    room = make_room(*users)
+    message = Message(room_id=room.id, sender_id=users[0].id, content=f"good morning swamp {next(_texts)}")
+    db.add(message)
+    db.commit()
+    return alice, bob, message
+
+def test_batch_tolerates_a_concurrent_viewer_storing_first(db, chat, provider):
+    alice, bob, message = chat
+
+    def other_viewer_finishes_first():
+        other = SessionLocal()
+        try:
+            other.add(MessageTranslation(message_id=message.id, lang="DE", translated_text="theirs"))
+            other.commit()
+        finally:
+            other.close()
+
+    provider.hooks.append(other_viewer_finishes_first)
+    response = bob.post("/api/translate/batch", json={"message_ids": [message.id], "target_lang": "de"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["translations"][0]["translated_text"] == message.content.upper()
+    db.expire_all()
+    rows = db.query(MessageTranslation).filter(MessageTranslation.message_id == message.id).all()
+    assert [row.translated_text for row in rows] == ["theirs"]
+
+def test_single_translation_uses_the_stored_message_text(db, chat, provider):
+    alice, bob, message = chat
+    response = bob.post("/api/translate", json={
+        "message_id": message.id, "text": "forged text", "target_lang": "fr"
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["translated_text"] == message.content.upper()
+    assert provider.requests == [[message.content]]
+    stored = db.query(MessageTranslation).filter(
+        MessageTranslation.message_id == message.id, MessageTranslation.lang == "FR"
+    ).one()
+    assert stored.translated_text == message.content.upper()
+
+def test_non_members_cannot_translate_a_message(db, chat, client_for, provider):
+    _, _, message = chat
+    outsider = client_for()
+    response = outsider.post("/api/translate", json={
+        "message_id": message.id, "text": "forged text", "target_lang": "it"
+    })
+
+    assert response.status_code == 403
+    assert provider.requests == []
+    assert db.query(MessageTranslation).filter(MessageTranslation.message_id == message.id).count() == 0
+
+def test_free_text_translation_still_works(client_for, provider):
+    response = client_for().post("/api/translate", json={"text": "ogres are like onions", "target_lang": "es"})
+    assert response.status_code == 200
+    assert response.json()["translated_text"] == "OGRES ARE LIKE ONIONS"
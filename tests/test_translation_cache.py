@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from app.database import SessionLocal, TranslationCacheEntry
+from app.routers.background import periodic_tasks
+from app.routers.translation_cache import TranslationCache, hash_text, purge_translation_cache
+
+def test_memory_then_database_tier(db):
+    cache = TranslationCache()
+    cache.set(db, "hello swamp", "de", "hallo Sumpf")
+    assert cache.get(db, "hello swamp", "DE") == "hallo Sumpf"
+    assert cache.memory_hits == 1
+
+    # A fresh process only has the persistent tier
+    assert TranslationCache().get(db, "hello swamp", "de") == "hallo Sumpf"
+
+def test_concurrent_writers_of_the_same_key_do_not_conflict():
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        # Both missed and both translated; neither saw the other's row
+        TranslationCache().set(first, "race", "fr", "course")
+        TranslationCache().set_many(second, {"race": "la course"}, "fr")
+    finally:
+        first.close()
+        second.close()
+
+    db = SessionLocal()
+    try:
+        rows = db.query(TranslationCacheEntry).filter(TranslationCacheEntry.text_hash == hash_text("race")).all()
+        assert [row.translated_text for row in rows] == ["la course"]
+    finally:
+        db.close()
+
+def test_expired_rows_are_purged_periodically(db):
+    db.add(TranslationCacheEntry(
+        text_hash=hash_text("old"), target_lang="ES", translated_text="viejo",
+        expires_at=datetime.utcnow() - timedelta(days=1)
+    ))
+    db.commit()
+
+    purge_translation_cache()
+
+    db.expire_all()
+    assert db.query(TranslationCacheEntry).filter(TranslationCacheEntry.text_hash == hash_text("old")).count() == 0
+    assert "purge_translation_cache" in [name for name, _, _ in periodic_tasks]
@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.routers.translation_client import (
+    CircuitBreaker, CircuitOpenError, TranslationClient, TranslationServiceError
+)
+
+def client_with(handler, **kwargs):
+    client = TranslationClient(api_url="https://deepl.test/v2/translate", api_key="key", backoff_base=0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+def test_retries_transient_errors_then_returns_in_order():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="busy")
+        return httpx.Response(200, json={"translations": [{"text": "eins"}, {"text": "zwei"}]})
+
+    client = client_with(handler)
+    assert asyncio.run(client.translate(["one", "two"], "DE")) == ["eins", "zwei"]
+    assert len(calls) == 2
+    assert client.retries == 1
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(403, text="bad key")
+
+    with pytest.raises(TranslationServiceError):
+        asyncio.run(client_with(handler).translate(["one"], "DE"))
+    assert len(calls) == 1
+
+def test_circuit_opens_after_repeated_failures():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    client = client_with(handler, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(TranslationServiceError):
+            asyncio.run(client.translate(["one"], "DE"))
+    assert client.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.translate(["one"], "DE"))
+    assert len(calls) == 2
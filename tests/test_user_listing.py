@@ -0,0 +1,41 @@
+import csv
+import io
+from types import SimpleNamespace
+
+from app.database import User
+from app.routers.user_listing import UserFilters, csv_row
+
+def usernames(db, search):
+    return {user.username for user in UserFilters(search=search).apply(db.query(User))}
+
+def test_search_is_case_insensitive(db, make_user):
+    fiona = make_user(username="fionaprincess")
+    make_user(username="lordfiona")
+    assert usernames(db, "FIONAP") == {fiona.username}
+
+def test_substring_matches_are_listed_next_to_prefix_matches(db, make_user):
+    make_user(username="annabelle")
+    make_user(username="joanne")
+    make_user(username="gingerbread")
+    assert usernames(db, "ann") == {"annabelle", "joanne"}
+
+def test_substring_match_without_a_prefix_match(db, make_user):
+    make_user(username="donkeyvoice")
+    make_user(username="dragon_donkey2")
+    assert usernames(db, "onkeyvo") == {"donkeyvoice"}
+    assert usernames(db, "n_d") == {"dragon_donkey2"}
+    assert usernames(db, "n%d") == set()
+
+def test_csv_cells_cannot_start_formulas():
+    user = SimpleNamespace(
+        id=1, username="=HYPERLINK(\"http://evil\")", email="a@example.com", full_name="+1 swamp",
+        country="@SUM(A1)", is_online=False, last_seen=None, registration_date=None
+    )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(csv_row(user))
+    row = next(csv.reader(io.StringIO(buffer.getvalue())))
+    assert row[1] == "'=HYPERLINK(\"http://evil\")"
+    assert row[2] == "a@example.com"
+    assert row[3] == "'+1 swamp"
+    assert row[4] == "'@SUM(A1)"
+    assert csv_row(SimpleNamespace(**{**vars(user), "full_name": "-", "country": None}))[3:5] == ["'-", ""]
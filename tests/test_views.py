@@ -0,0 +1,26 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from app.routers.presence import presence_service
+
+def test_user_status_is_looked_up_off_the_event_loop(monkeypatch, make_user):
+    user = make_user()
+    on_loop = []
+    real_lookup = presence_service.lookup
+    def lookup(user_id):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return real_lookup(user_id)
+    monkeypatch.setattr(presence_service, "lookup", lookup)
+
+    client = TestClient(main.app)
+    response = client.get(f"/api/user/{user.id}/status")
+    assert response.status_code == 200
+    assert response.json()["username"] == user.username
+    assert client.get("/api/user/999999999/status").status_code == 404
+    assert on_loop == [False, False]
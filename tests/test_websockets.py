@@ -0,0 +1,78 @@
+import asyncio
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from app.database import Message, SyncEvent
+from app.routers import websockets
+from app.routers.presence import presence_service
+from app.routers.session import ALGORITHM, SECRET_KEY, active_connections
+from tests.conftest import FakeWebSocket
+
+def chat_url(user):
+    return f"/ws/chat/{jwt.encode({'sub': user.username}, SECRET_KEY, algorithm=ALGORITHM)}"
+
+def fail(*args, **kwargs):
+    raise RuntimeError("handler bug")
+
+def assert_released(user):
+    assert user.username not in active_connections
+    assert user.id not in presence_service.sockets
+    assert not presence_service.is_online(user.id)
+
+def test_chat_socket_is_released_after_an_unexpected_error(monkeypatch, make_user):
+    user = make_user()
+    monkeypatch.setattr(websockets.chat_dispatcher, "dispatch", fail)
+    with TestClient(main.app).websocket_connect(chat_url(user)) as ws:
+        ws.send_json({"type": "ping"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                ws.receive_json()
+    assert closed.value.code == 1011
+    assert_released(user)
+
+def test_presence_socket_is_released_after_an_unexpected_error(monkeypatch, make_user):
+    user = make_user()
+    monkeypatch.setattr(websockets, "handle_presence_subscribe", fail)
+    with TestClient(main.app).websocket_connect(f"/ws/presence?username={user.username}") as ws:
+        ws.send_text("ping")
+        assert ws.receive_text() == "pong"
+        ws.send_json({"type": "presence_subscribe", "user_ids": []})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 1011
+    assert_released(user)
+
+def test_refcount_keeps_the_user_online_until_the_last_socket_closes(make_user):
+    user = make_user()
+    client = TestClient(main.app)
+    with client.websocket_connect(f"/ws/presence?username={user.username}"):
+        with client.websocket_connect(f"/ws/presence?username={user.username}"):
+            assert presence_service.sockets[user.id] == 2
+        assert presence_service.is_online(user.id)
+    assert_released(user)
+
+def test_deleting_a_message_with_another_rooms_id_is_rejected(db, make_user, make_room):
+    user, outsider = make_user(), make_user()
+    room = make_room(user)
+    other_room = make_room(user, outsider)
+    message = Message(room_id=room.id, sender_id=user.id, content="mine")
+    db.add(message)
+    db.commit()
+
+    def delete(room_id):
+        ws = FakeWebSocket()
+        frame = {"type": "delete_message", "message_id": message.id, "room_id": room_id}
+        asyncio.run(websockets.chat_dispatcher.dispatch(ws, user, frame, db))
+        return ws.sent
+
+    assert delete(other_room.id) == [{"error": "Message is not in this room"}]
+    db.refresh(message)
+    assert message.deleted_at is None
+
+    assert delete(room.id) == [{"type": "message_deleted", "message_id": message.id, "room_id": room.id}]
+    event = db.query(SyncEvent).filter(SyncEvent.type == "message_deleted").order_by(SyncEvent.id.desc()).first()
+    assert event.room_id == room.id
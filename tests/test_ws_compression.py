@@ -0,0 +1,42 @@
+import socket
+import threading
+import time
+
+import uvicorn
+from websockets import frames
+from websockets.sync.client import connect
+
+import main
+from app.routers.ws_compression import CompressedWebSocketProtocol, ThresholdPerMessageDeflate
+
+def test_small_messages_are_sent_uncompressed():
+    extension = ThresholdPerMessageDeflate(False, False, 12, 12, {"memLevel": 5}, min_size=256)
+    assert not extension.encode(frames.Frame(frames.OP_TEXT, b'{"type":"pong"}')).rsv1
+    large = extension.encode(frames.Frame(frames.OP_TEXT, b'{"content":"swamp"}' * 50))
+    assert large.rsv1
+    assert len(large.data) < 950
+
+def test_server_negotiates_the_configured_deflate_settings(make_user):
+    user = make_user()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        main.app, host="127.0.0.1", port=port, ws=CompressedWebSocketProtocol, log_level="warning", lifespan="off"
+    ))
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    try:
+        for _ in range(100):
+            if server.started:
+                break
+            time.sleep(0.05)
+        with connect(f"ws://127.0.0.1:{port}/ws/presence?username={user.username}") as ws:
+            extensions = ws.response.headers["Sec-WebSocket-Extensions"]
+            ws.send("ping")
+            assert ws.recv() == "pong"
+    finally:
+        server.should_exit = True
+        thread.join()
+    assert "server_max_window_bits=12" in extensions
+    assert "client_max_window_bits=12" in extensions
@@ -0,0 +1,70 @@
+import asyncio
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.routers.session import ALGORITHM, SECRET_KEY
+from app.routers.ws_protocol import ChatMessageFrame, WebSocketDispatcher
+from tests.conftest import FakeWebSocket
+
+def dispatch(dispatcher, data):
+    ws = FakeWebSocket()
+    asyncio.run(dispatcher.dispatch(ws, None, data, None))
+    return ws.sent
+
+def test_dispatcher_routes_validated_frames():
+    dispatcher = WebSocketDispatcher()
+    received = []
+
+    @dispatcher.register("message", ChatMessageFrame)
+    async def handle(websocket, user, message_data, db):
+        received.append(message_data)
+
+    assert dispatch(dispatcher, {"type": "message", "room_id": "7", "content": "hi", "extra": 1}) == []
+    assert received == [{"type": "message", "room_id": 7, "content": "hi", "extra": 1}]
+
+def test_dispatcher_answers_bad_frames_with_errors():
+    dispatcher = WebSocketDispatcher()
+    dispatcher.register("message", ChatMessageFrame)(lambda *args: None)
+
+    assert dispatch(dispatcher, ["not", "a", "dict"]) == [{"error": "Invalid message format"}]
+    assert dispatch(dispatcher, {"type": "shout"}) == [{"error": "Unknown message type"}]
+    [error] = dispatch(dispatcher, {"type": "message", "room_id": "lobby"})
+    assert error["error"] == "Invalid message message"
+    assert any(detail.startswith("room_id:") for detail in error["details"])
+    assert any(detail.startswith("content:") for detail in error["details"])
+
+@pytest.fixture
+def chat_url(make_user):
+    user = make_user()
+    return f"/ws/chat/{jwt.encode({'sub': user.username}, SECRET_KEY, algorithm=ALGORITHM)}"
+
+def receive_until(ws, receive, predicate):
+    while True:
+        frame = receive()
+        if predicate(frame):
+            return frame
+
+def test_malformed_json_frames_keep_the_connection(chat_url):
+    with TestClient(main.app).websocket_connect(chat_url) as ws:
+        ws.send_text("{not json")
+        error = receive_until(ws, ws.receive_json, lambda frame: "error" in frame)
+        assert error["error"] == "Invalid message format"
+
+        ws.send_bytes(b"\x00\x01")
+        assert receive_until(ws, ws.receive_json, lambda frame: "error" in frame)["error"] == "Invalid message format"
+
+        ws.send_json({"type": "ping"})
+        assert receive_until(ws, ws.receive_json, lambda frame: frame.get("type") == "pong")
+
+def test_malformed_msgpack_frames_keep_the_connection(chat_url):
+    msgpack = pytest.importorskip("msgpack")
+    with TestClient(main.app).websocket_connect(chat_url, subprotocols=["shrekchat.msgpack"]) as ws:
+        receive = lambda: msgpack.unpackb(ws.receive_bytes())
+        ws.send_bytes(b"\xc1")  # Never used by the format
+        assert receive_until(ws, receive, lambda frame: "error" in frame)["error"] == "Invalid message format"
+
+        ws.send_bytes(msgpack.packb({"type": "ping"}))
+        assert receive_until(ws, receive, lambda frame: frame.get("type") == "pong")